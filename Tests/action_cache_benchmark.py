@@ -0,0 +1,81 @@
+from time import perf_counter
+import argparse
+import random
+import sys
+import os
+import json
+
+sys.path.append("..")
+from csidh import CSIDH
+from csidh_ct import CSIDH_CT
+from cache import ActionCache
+
+# Measure what an ActionCache saves on a workload where peers come back.
+# A static key pair does handshakes with peers drawn from a fixed set, the most popular peers more often
+# (peer i with weight 1/(i + 1)), and re-derives its own public key before each handshake as a stateless server
+# would. The same requests run once without a cache and once with one of the given size, and the time per
+# handshake, the cost of a hit, and the hit rate are reported for each n.
+
+IMPLEMENTATIONS = {"CSIDH": CSIDH, "CSIDH_CT": CSIDH_CT}
+
+results_dir = "../Results/action_cache"
+
+
+def run(Implementation, n, args):
+    rng = random.Random(args.seed)
+    plain = Implementation(n)
+    static = plain.gen_key(5)
+    peers = [plain.gen_key(5)["public"] for _ in range(args.peers)]
+    requests = rng.choices(peers, weights=[1 / (i + 1) for i in range(args.peers)], k=args.requests)
+
+    cache = ActionCache(args.size)
+    cached = Implementation(n, cache=cache)
+    result = {}
+    for name, instance in (("uncached", plain), ("cached", cached)):
+        times = []
+        for public in requests:
+            start = perf_counter()
+            assert instance.group_action({"public": 0, "private": static["private"]}) == static["public"]
+            instance.group_action({"public": public, "private": static["private"]})
+            times.append(perf_counter() - start)
+        result[name] = sum(times) / len(times)
+    start = perf_counter()
+    cached.group_action({"public": 0, "private": static["private"]})
+    result["hit"] = perf_counter() - start
+    result["stats"] = cache.stats()
+    print(f"n = {n}: {result['uncached'] * 1000:.2f} ms per handshake without a cache, "
+          f"{result['cached'] * 1000:.2f} ms with one, {result['hit'] * 1e6:.1f} us per hit, "
+          f"hit rate {result['stats']['hit_rate']:.2f}")
+    return result
+
+
+def save_data(data, path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+    return path
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Measure the group action cache on repeated handshakes.")
+    parser.add_argument("--implementation", choices=sorted(IMPLEMENTATIONS), default="CSIDH")
+    parser.add_argument("--n", nargs="+", type=int, default=[10, 20, 40], help="numbers of primes")
+    parser.add_argument("--peers", type=int, default=32, help="distinct peer public keys")
+    parser.add_argument("--requests", type=int, default=200, help="handshakes per run")
+    parser.add_argument("--size", type=int, default=16, help="entries the cache keeps")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the order of the peers")
+    parser.add_argument("--output", help="JSON file for the results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data = {str(n): run(IMPLEMENTATIONS[args.implementation], n, args) for n in args.n}
+    output = args.output or os.path.join(results_dir, "action_cache_" + args.implementation + ".json")
+    print("Results saved in: " + save_data(data, output))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-from sage.all import *
 from datetime import datetime
 from time import time
 import json
@@ -0,0 +1,211 @@
+from time import perf_counter_ns
+from datetime import datetime
+import argparse
+import random
+import math
+import sys
+import os
+import json
+
+sys.path.append("..")
+from csidh import CSIDH
+from csidh_ct import CSIDH_CT
+from fields import default_backend
+
+# Benchmark CSIDH and CSIDH_CT with separate timed phases, summary statistics, and regression checks.
+# For each implementation and n, three phases are timed with perf_counter_ns after a number of discarded
+# warmup runs:
+#   setup:  building the instance from its ParameterSet, which params.py loads once per process, so this is the
+#           cost of the field and the per-instance state rather than of a parameter search
+#   keygen: generating a key pair on a fixed instance
+#   action: deriving a shared secret on a fixed instance, from key pairs generated before timing
+# The random number generator is seeded from the seed, the implementation, n, and the phase, so a run is
+# repeatable. Each phase reports its median, mean, percentiles, and 95% confidence intervals for the median
+# and the mean. With --baseline, every median is compared against a stored run and phases that got slower
+# by more than the threshold are flagged as regressions, making the script exit with status 1. A baseline
+# stored with another field backend, or with another CSIDH_CT mode when both runs time CSIDH_CT, is refused
+# before anything is timed. Nothing here needs matplotlib, so it runs headless.
+
+IMPLEMENTATIONS = {"CSIDH": CSIDH, "CSIDH_CT": CSIDH_CT}
+PHASES = ("setup", "keygen", "action")
+PERCENTILES = (5, 25, 75, 95)
+
+results_dir = "../Results/benchmark"
+
+
+# Seed the random number generator for one phase of one case
+def seed_phase(seed, name, n, phase):
+    random.seed(str(seed) + "/" + name + "/" + str(n) + "/" + phase)
+
+
+# Time a function of the run index over warmup + runs calls, discarding the warmup, in nanoseconds
+def time_runs(f, runs, warmup):
+    samples = []
+    for i in range(warmup + runs):
+        start = perf_counter_ns()
+        f(i)
+        end = perf_counter_ns()
+        if i >= warmup:
+            samples.append(end - start)
+    return samples
+
+
+# Get the p-th percentile of sorted samples, interpolating linearly between ranks
+def percentile(ordered, p):
+    rank = (len(ordered) - 1) * p / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+# Summarize samples by their median, mean, spread, percentiles, and 95% confidence intervals
+# The interval for the median is distribution-free, between the order statistics whose ranks are 1.96
+# standard deviations of a Binomial(k, 1/2) around k/2. The interval for the mean uses the normal approximation.
+def summarize(samples):
+    ordered = sorted(samples)
+    k = len(ordered)
+    mean = sum(ordered) / k
+    stdev = math.sqrt(sum((x - mean) ** 2 for x in ordered) / (k - 1)) if k > 1 else 0.0
+    half_width = 1.96 * math.sqrt(k) / 2
+    low = max(math.floor(k / 2 - half_width), 0)
+    high = min(math.ceil(k / 2 + half_width), k - 1)
+    margin = 1.96 * stdev / math.sqrt(k)
+    summary = {
+        "runs": k,
+        "median": percentile(ordered, 50),
+        "mean": mean,
+        "stdev": stdev,
+        "min": ordered[0],
+        "max": ordered[-1],
+        "median_ci": [ordered[low], ordered[high]],
+        "mean_ci": [mean - margin, mean + margin],
+    }
+    for p in PERCENTILES:
+        summary["p" + str(p)] = percentile(ordered, p)
+    return summary
+
+
+# Time every phase for one implementation and n, returning the summary of each phase
+def run_case(name, n, args):
+    Implementation = IMPLEMENTATIONS[name]
+    options = {"backend": args.backend}
+    if name == "CSIDH_CT":
+        options["mode"] = args.mode
+    results = {}
+
+    seed_phase(args.seed, name, n, "setup")
+    samples = time_runs(lambda i: Implementation(n, **options), args.setup_runs, args.warmup)
+    results["setup"] = summarize(samples)
+
+    instance = Implementation(n, **options)
+    seed_phase(args.seed, name, n, "keygen")
+    samples = time_runs(lambda i: instance.gen_key(5), args.runs, args.warmup)
+    results["keygen"] = summarize(samples)
+
+    # Generate the key pairs before timing, so the action phase only times the shared secret derivation
+    seed_phase(args.seed, name, n, "action")
+    pairs = [(instance.gen_key(5), instance.gen_key(5)) for _ in range(args.warmup + args.runs)]
+    samples = time_runs(lambda i: instance.group_action({"public": pairs[i][1]["public"], "private": pairs[i][0]["private"]}),
+                        args.runs, args.warmup)
+    results["action"] = summarize(samples)
+    return results
+
+
+# Check that a baseline was stored with the same backend and, when both runs time CSIDH_CT, the same mode, since
+# their medians are not comparable otherwise
+def check_config(config, baseline_config):
+    keys = ["backend"]
+    if "CSIDH_CT" in config["implementations"] and "CSIDH_CT" in baseline_config.get("implementations", []):
+        keys.append("mode")
+    for key in keys:
+        if baseline_config.get(key) != config[key]:
+            raise ValueError("The baseline was stored with " + key + " " + str(baseline_config.get(key))
+                             + ", not " + str(config[key]))
+
+
+# Compare the medians of a run with a baseline run, returning the phases that are slower by more than threshold
+# A phase is only flagged when the lower end of its median's confidence interval is above the baseline median too,
+# so that noise in a short run does not count as a regression.
+def compare(results, baseline, threshold):
+    regressions = []
+    for key, summary in results.items():
+        if key not in baseline:
+            continue
+        base = baseline[key]["median"]
+        ratio = summary["median"] / base
+        if ratio > 1 + threshold and summary["median_ci"][0] > base:
+            regressions.append({"case": key, "baseline": base, "median": summary["median"], "ratio": ratio})
+    return regressions
+
+
+# Print one line per phase with the median and its interval in milliseconds
+def print_summary(key, summary, baseline):
+    line = f"{key:<28} median {summary['median'] / 1e6:10.3f} ms  [{summary['median_ci'][0] / 1e6:.3f}, " \
+           f"{summary['median_ci'][1] / 1e6:.3f}]  p95 {summary['p95'] / 1e6:10.3f} ms"
+    if key in baseline:
+        line += f"  ({summary['median'] / baseline[key]['median']:.2f}x baseline)"
+    print(line)
+
+
+# Save a run as JSON, returning its path
+def save_data(data, path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+    return path
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the CSIDH group actions by phase.")
+    parser.add_argument("--implementations", nargs="+", choices=sorted(IMPLEMENTATIONS), default=["CSIDH", "CSIDH_CT"])
+    parser.add_argument("--n", nargs="+", type=int, default=[5, 10, 20], help="numbers of primes to benchmark")
+    parser.add_argument("--runs", type=int, default=30, help="timed runs of the keygen and action phases")
+    parser.add_argument("--setup-runs", type=int, default=5, help="timed runs of the setup phase")
+    parser.add_argument("--warmup", type=int, default=3, help="untimed runs before each phase")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random number generator")
+    parser.add_argument("--backend", default=None, help="field backend, see fields.py")
+    parser.add_argument("--mode", default="dummy", choices=CSIDH_CT.modes, help="constant-time mode of CSIDH_CT")
+    parser.add_argument("--baseline", help="JSON file of a stored run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown of a median that is a regression")
+    parser.add_argument("--save-baseline", help="also store this run as a baseline in the given file")
+    parser.add_argument("--output", help="JSON file for this run (default: a timestamped file in " + results_dir + ")")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = {key: value for key, value in vars(args).items() if key not in ("baseline", "save_baseline", "output")}
+    config["backend"] = args.backend or default_backend()
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        check_config(config, stored.get("config", {}))
+        baseline = stored["results"]
+
+    results = {}
+    for name in args.implementations:
+        for n in args.n:
+            case = run_case(name, n, args)
+            for phase in PHASES:
+                key = name + "/n=" + str(n) + "/" + phase
+                results[key] = case[phase]
+                print_summary(key, case[phase], baseline)
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression['case']}: median {regression['median'] / 1e6:.3f} ms vs baseline "
+              f"{regression['baseline'] / 1e6:.3f} ms ({regression['ratio']:.2f}x)")
+
+    data = {"config": config, "results": results, "baseline": args.baseline, "regressions": regressions}
+    output = args.output or os.path.join(results_dir, "benchmark_" + datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".json")
+    print("Results saved in: " + save_data(data, output))
+    if args.save_baseline:
+        save_data({"config": config, "results": results}, args.save_baseline)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
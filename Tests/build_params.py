@@ -0,0 +1,45 @@
+from time import perf_counter
+import argparse
+import sys
+
+sys.path.append("..")
+import params
+from params import PRESETS, build_params, write_cache, read_cache
+
+# Build the cached parameter sets for a range of n and the presets, so that later sweeps, benchmarks, and worker
+# processes only read them. For each set, the time to search and precompute it is compared with the time to read
+# it back from the cache in params.cache_dir (set with the CSIDH_PARAMS_CACHE environment variable).
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Build the parameter set cache.")
+    parser.add_argument("--max-n", type=int, default=100, help="build the sets for n = 1 to max-n")
+    parser.add_argument("--force", action="store_true", help="rebuild sets that are already cached")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("Cache directory: " + params.cache_dir)
+    build_total = load_total = 0.0
+    for key in list(range(1, args.max_n + 1)) + list(PRESETS):
+        if not args.force and read_cache(key) is not None:
+            continue
+        start = perf_counter()
+        parameter_set = build_params(key)
+        built = perf_counter() - start
+        write_cache(key, parameter_set)
+
+        start = perf_counter()
+        if read_cache(key) != parameter_set:
+            raise RuntimeError("The cached parameter set for " + str(key) + " does not read back")
+        loaded = perf_counter() - start
+        build_total += built
+        load_total += loaded
+        print(f"{str(key):>10}: p of {parameter_set.p.bit_length():4} bits, built in {built * 1000:8.2f} ms, "
+              f"read back in {loaded * 1000:6.2f} ms")
+    print(f"Total: built in {build_total:.2f} s, read back in {load_total:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,21 @@
-from sage.all import *
-from time import time
+from time import perf_counter
 import sys
 import matplotlib.pyplot as plt
-from scipy.optimize import curve_fit
-import numpy as np
 import json
 
 sys.path.append("..")
 from csidh import *
+from counters import predict_group_action
 
 N = 100   # Number of trials to average per value of n
 
 # Measure the time taken to derive the shared secret for various parameters
 def get_time(n):
     csidh = CSIDH(n)
-    start_time = time()
-    secret = csidh.group_action({"public":csidh.b_key["public"], "private":csidh.a_key["private"]})
-    end_time = time()
+    key = {"public":csidh.b_key["public"], "private":csidh.a_key["private"]}
+    start_time = perf_counter()
+    secret = csidh.group_action(key)
+    end_time = perf_counter()
     print("Secret: " + str(secret))
     print("Time: " + str(end_time - start_time))
     return (end_time - start_time)
@@ -41,61 +40,47 @@ def plot_averages(n_avgs, save_file=None):
     plt.title('Average Time to Derive Shared Secret with >=n Primes')
     plt.grid(True)
     if save_file:
-        plt.savegif(save_file)
+        plt.savefig(save_file)
     plt.show()
 
-# Fit the data to exponential and polynomial models to estimate the complexity
+# Predict the time per value of n from operation counts and compare the predictions with the measured averages
+# The cost model counts the field operations of a few group actions for each n and prices them with timings of
+# single operations on that n's field (see counters.py); the gap to the measured time is interpreter overhead.
 def estimate_complexity(n_avgs, save_file=None):
-    n_vals = np.array(list(n_avgs.keys()))
-    avg_times = np.array(list(n_avgs.values()))
-
-    # Represent an exponential function
-    def exp_func(x, a, b):
-        return a * np.exp(b * x)
-
-    # Represent a quadratic function
-    def quad_func(x, a, b, c):
-        return a*x**2 + b*x + c
-
-    # Represent a cubic function
-    def cubic_func(x, a, b, c, d):
-        return a*x**3 + b*x**2 + c*x + d
-
-    # Fit the data to different function models
-    exp_params, _ = curve_fit(exp_func, n_vals, avg_times)
-    quad_params, _ = curve_fit(quad_func, n_vals, avg_times)
-    cubic_params, _ = curve_fit(cubic_func, n_vals, avg_times)
-    exp_fit = exp_func(n_vals, *exp_params)
-    quad_fit = quad_func(n_vals, *quad_params)
-    cubic_fit = cubic_func(n_vals, *cubic_params)
+    n_vals = list(n_avgs.keys())
+    avg_times = list(n_avgs.values())
+    predicted = []
+    counts = {}
+    for n in n_vals:
+        n_predicted, shares, n_counts = predict_group_action(CSIDH(n))
+        predicted.append(n_predicted)
+        counts[n] = n_counts.as_dict()
 
-    # Plot the original data and the functions
-    plt.plot(n_vals, avg_times, 'o', label='Data')
-    plt.plot(n_vals, exp_fit, '--', label=f'Exponential fit: y = {exp_params[0]:.3f} * exp({exp_params[1]:.3f} * x)')
-    plt.plot(n_vals, quad_fit, '--', label=f'Quadratic fit: y = {quad_params[0]:.3f}x^2 + {quad_params[1]:.3f}x + {quad_params[2]:.3f}')
-    plt.plot(n_vals, cubic_fit, '--', label=f'Cubic fit: y = {cubic_params[0]:.3f}x^3 + {cubic_params[1]:.3f}x^2 + {cubic_params[2]:.3f}x + {cubic_params[3]:.3f}')
+    # Plot the measured averages and the predictions of the cost model
+    plt.plot(n_vals, avg_times, 'o', label='Measured')
+    plt.plot(n_vals, predicted, '--', label='Cost model')
     plt.xlabel('n')
     plt.ylabel('Average Time (s)')
     plt.legend()
-    plt.title('Exponential vs Polynomial Fits')
+    plt.title('Measured Time vs Cost Model Prediction')
     plt.grid(True)
     if save_file:
         plt.savefig(save_file)
     plt.show()
 
-    # Log-transform the data to check if the growth is linear on a log scale
-    log_avg_times = np.log(avg_times)
-    plt.plot(n_vals, log_avg_times, 'o-', label='Log-transformed Data')
+    # Plot the share of the measured time that the field operations explain
+    ratios = [p / t for p, t in zip(predicted, avg_times)]
+    plt.plot(n_vals, ratios, 'o-')
     plt.xlabel('n')
-    plt.ylabel('log(Average Time)')
-    plt.title('Log-transformed Data for Exponential Check')
+    plt.ylabel('Predicted / Measured Time')
+    plt.title('Share of the Time Spent in Field Operations')
     plt.grid(True)
     if save_file:
-        log_save_file = save_file.replace('.png', '_log.png')
-        plt.savefig(log_save_file)
+        ratio_save_file = save_file.replace('.png', '_ratio.png')
+        plt.savefig(ratio_save_file)
     plt.show()
 
-    return [exp_fit, quad_fit, cubic_fit]
+    return predicted, counts
 
 # Save the results of the analysis
 def save_data(data):
@@ -115,8 +100,8 @@ if __name__ == "__main__":
             n_times[n].append(n_time)
         n_avgs = get_averages(n_times)
 
-    # Plot the averages and time estimated complexity functions
-    functions = estimate_complexity(n_avgs, save_file="average_time_plot.png")
+    # Plot the averages against the predictions of the cost model
+    predicted, counts = estimate_complexity(n_avgs, save_file="average_time_plot.png")
 
     # Save the results of the analyses in a JSON file
-    save_data({"n_times": n_times, "n_avgs": n_avgs, "exp_fit": functions[0].tolist(), "quad_fit": functions[1].tolist(), "cubic_fit": functions[2].tolist()})
+    save_data({"n_times": n_times, "n_avgs": n_avgs, "predicted": predicted, "counts": counts})
@@ -0,0 +1,146 @@
+from time import perf_counter, time
+from multiprocessing import Pool
+import argparse
+import random
+import sys
+import os
+import json
+
+sys.path.append("..")
+from csidh import CSIDH
+from csidh_ct import CSIDH_CT
+from params import load_params
+from prime_search import isogeny_cost
+
+# Run the n-sweeps of the performance tests as cells that can be spread over processes and resumed.
+# A cell is one trial of one implementation for one n: two fresh key pairs are generated, and the two group actions
+# that derive the shared secret are timed and checked against each other. Cells run on a pool of worker processes,
+# each building every parameter set it needs once, and every finished cell is appended to a JSON lines file right
+# away, so a crash only loses the cells that were running. Running again with the same file skips the cells that are
+# already recorded. Cells are handed out from the most expensive (estimated from the isogeny costs of the parameter
+# set and the size of p) to the cheapest, so that the long large-n cells do not all end up at the end of the run.
+# summarize() then reads the file back for fits and plots, such as in performance_comparison.py.
+# Note that worker processes sharing a CPU slow each other down, so timings should use at most one process per CPU.
+
+IMPLEMENTATIONS = {"CSIDH": CSIDH, "CSIDH_CT": CSIDH_CT}
+
+results_dir = "../Results/experiments"
+
+_instances = {}                                     # Instances built by each worker process, by implementation and n
+
+
+# Estimate the relative cost of one trial of an implementation for n primes
+# The isogenies of a CSIDH action average m(m + 1)/(2m + 1) per prime for exponents in [-5, 5], while CSIDH_CT always
+# computes 10, and each field operation costs about the square of the size of p.
+def estimated_cost(name, n):
+    params = load_params(n)
+    isogenies = 10 if name == "CSIDH_CT" else 5 * 6 / 11
+    return isogenies * sum(isogeny_cost(l, n) for l in params.l_primes) * params.p.bit_length() ** 2
+
+
+# Run one cell in a worker process, returning its record
+def run_cell(cell):
+    name, n, trial, seed = cell
+    if (name, n) not in _instances:
+        _instances[(name, n)] = IMPLEMENTATIONS[name](n)
+    cs = _instances[(name, n)]
+    random.seed(str(seed) + "/" + name + "/" + str(n) + "/" + str(trial))
+
+    a_key = cs.gen_key(5)
+    b_key = cs.gen_key(5)
+    start = perf_counter()
+    alice_shared = cs.group_action({"public": b_key["public"], "private": a_key["private"]})
+    middle = perf_counter()
+    bob_shared = cs.group_action({"public": a_key["public"], "private": b_key["private"]})
+    end = perf_counter()
+    if alice_shared != bob_shared:
+        raise ValueError("Mismatch in shared secrets for N = {}.".format(n))
+    return {
+        "implementation": name,
+        "n": n,
+        "trial": trial,
+        "time": ((middle - start) + (end - middle)) / 2.0,
+        "alice": middle - start,
+        "bob": end - middle,
+        "pid": os.getpid(),
+        "finished": time(),
+    }
+
+
+# Read the records of a JSON lines file, skipping a last line that was cut off by a crash
+def read_records(path):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+# Run every cell of the sweep that is not recorded in path yet, appending each record as it finishes
+# Returns the number of cells run.
+def run(path, implementations, n_values, trials, processes=None, seed=0):
+    done = {(r["implementation"], r["n"], r["trial"]) for r in read_records(path)}
+    cells = [(name, n, trial, seed) for name in implementations for n in n_values for trial in range(trials)
+             if (name, n, trial) not in done]
+    if not cells:
+        print("Every cell is already recorded in " + path)
+        return 0
+    costs = {(name, n): estimated_cost(name, n) for name in implementations for n in n_values}
+    cells.sort(key=lambda cell: -costs[cell[:2]])
+    print(f"Running {len(cells)} cells, {len(done)} already recorded")
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with Pool(processes) as pool, open(path, 'a') as f:
+        # Start each record on its own line, even after a line that a crash cut off
+        if f.tell() > 0:
+            with open(path, 'rb') as existing:
+                existing.seek(-1, os.SEEK_END)
+                if existing.read(1) != b"\n":
+                    f.write("\n")
+        for count, record in enumerate(pool.imap_unordered(run_cell, cells), 1):
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            print(f"[{count}/{len(cells)}] {record['implementation']} N = {record['n']} trial {record['trial']}: "
+                  f"{record['time']:.6f} s")
+    return len(cells)
+
+
+# Group the records of a file by implementation and n, returning {implementation: {n: [times]}}
+def summarize(path):
+    summary = {}
+    for record in read_records(path):
+        times = summary.setdefault(record["implementation"], {}).setdefault(record["n"], [])
+        times.append(record["time"])
+    return summary
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run a resumable n-sweep of group action timings.")
+    parser.add_argument("--implementations", nargs="+", choices=sorted(IMPLEMENTATIONS), default=["CSIDH", "CSIDH_CT"])
+    parser.add_argument("--n", nargs="+", type=int, default=list(range(5, 101, 5)), help="numbers of primes")
+    parser.add_argument("--trials", type=int, default=30, help="trials per implementation and n")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the keys of every cell")
+    parser.add_argument("--output", default=os.path.join(results_dir, "sweep.jsonl"),
+                        help="JSON lines file to append to, and to resume from")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    run(args.output, args.implementations, args.n, args.trials, args.processes, args.seed)
+    for name, by_n in summarize(args.output).items():
+        for n in sorted(by_n):
+            print(f"{name} N = {n}: {len(by_n[n])} trials, average {sum(by_n[n]) / len(by_n[n]):.6f} s")
+
+
+if __name__ == "__main__":
+    main()
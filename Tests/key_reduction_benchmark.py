@@ -0,0 +1,92 @@
+from time import perf_counter
+import argparse
+import random
+import sys
+import os
+import json
+
+sys.path.append("..")
+from csidh import CSIDH
+from counters import counting
+
+# Measure how much shorter CSIDH group actions get when private keys are reduced with the class group relation
+# lattice (CSIDH(n, reduce_keys=True), see classgroup.py).
+# For each n, the relation lattice is computed (or read from the parameter cache), and the same random keys with
+# exponents in [-5, 5] are used for actions on the base curve with and without reduction. The results are checked to
+# be equal, and the average number of isogenies and rounds (counted with counters.py), the L1 norm of the
+# exponents, the time of an action, and the time of a reduction are reported for both.
+
+results_dir = "../Results/key_reduction"
+
+
+# Count the isogenies and rounds of one group action and time it
+def measure(instance, private):
+    with counting() as counts:
+        start = perf_counter()
+        public = instance.group_action({"public": 0, "private": private})
+        elapsed = perf_counter() - start
+    isogenies = sum(c["real"] for c in counts.isogenies.values())
+    return public, isogenies, counts.ops["rounds"], elapsed
+
+
+def run(n, args):
+    rng = random.Random(args.seed)
+    start = perf_counter()
+    reduced = CSIDH(n, reduce_keys=True)
+    setup = perf_counter() - start
+    plain = CSIDH(n)
+
+    totals = {"plain": [0, 0, 0, 0.0], "reduced": [0, 0, 0, 0.0]}
+    reduction = 0.0
+    for _ in range(args.keys):
+        private = [rng.randint(-5, 5) for _ in range(plain.n)]
+        start = perf_counter()
+        short = reduced.reducer.reduce(private)
+        reduction += perf_counter() - start
+        results = []
+        for name, instance in (("plain", plain), ("reduced", reduced)):
+            public, isogenies, rounds, elapsed = measure(instance, private)
+            results.append(public)
+            norm = sum(abs(e) for e in (private if name == "plain" else short))
+            for i, value in enumerate((isogenies, rounds, norm, elapsed)):
+                totals[name][i] += value
+        if results[0] != results[1]:
+            raise ValueError("The reduced key gives a different public key for n = {}".format(n))
+
+    result = {"lattice_time": setup, "reduction_time": reduction / args.keys}
+    for name, (isogenies, rounds, norm, elapsed) in totals.items():
+        result[name] = {"isogenies": isogenies / args.keys, "rounds": rounds / args.keys, "l1": norm / args.keys,
+                        "time": elapsed / args.keys}
+    print(f"n = {n}: isogenies {result['plain']['isogenies']:.1f} -> {result['reduced']['isogenies']:.1f}, "
+          f"rounds {result['plain']['rounds']:.1f} -> {result['reduced']['rounds']:.1f}, "
+          f"time {result['plain']['time'] * 1000:.2f} -> {result['reduced']['time'] * 1000:.2f} ms "
+          f"(reduction {result['reduction_time'] * 1e6:.0f} us, lattice {setup:.2f} s)")
+    return result
+
+
+def save_data(data, path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+    return path
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Measure CSIDH group actions with reduced private keys.")
+    parser.add_argument("--n", nargs="+", type=int, default=[5, 8, 10, 12, 15], help="numbers of primes")
+    parser.add_argument("--keys", type=int, default=50, help="random keys per n")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the keys")
+    parser.add_argument("--output", help="JSON file for the results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data = {str(n): run(n, args) for n in args.n}
+    print("Results saved in: " + save_data(data, args.output or os.path.join(results_dir, "key_reduction.json")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+from time import perf_counter
+import argparse
+import random
+import sys
+import os
+import json
+
+sys.path.append("..")
+from csidh import CSIDH
+from keyformat import KeyFormat, KeyStore, write_keys
+
+# Compare storing keys in the binary format of keyformat.py with storing them as JSON.
+# For each n, a file of keys is written both as JSON lines and as a KeyStore file, and the size of each file and the
+# time to write it and to read every key back are reported. The keys have random exponents in [-5, 5] and share one
+# real public key, which is enough to time storage. With --exchange k, the first k keys of the store are then
+# streamed straight from the map into group_action_many, as a batch exchange job would.
+
+results_dir = "../Results/keystore_benchmark"
+
+
+def run(n, args):
+    cs = CSIDH(n)
+    public = int(cs.gen_key(5)["public"])
+    rng = random.Random(args.seed)
+    keys = [{"private": [rng.randint(-5, 5) for _ in range(cs.n)], "public": public} for _ in range(args.keys)]
+    json_path = os.path.join(args.directory, "keys_" + str(n) + ".jsonl")
+    binary_path = os.path.join(args.directory, "keys_" + str(n) + ".cskf")
+    if not os.path.exists(args.directory):
+        os.makedirs(args.directory)
+
+    start = perf_counter()
+    with open(json_path, 'w') as f:
+        for key in keys:
+            f.write(json.dumps(key) + "\n")
+    json_write = perf_counter() - start
+    start = perf_counter()
+    with open(json_path) as f:
+        loaded = [json.loads(line) for line in f]
+    json_read = perf_counter() - start
+
+    start = perf_counter()
+    write_keys(binary_path, KeyFormat.for_instance(cs), keys)
+    binary_write = perf_counter() - start
+    start = perf_counter()
+    with KeyStore(binary_path) as store:
+        count = sum(1 for _ in store)
+        assert store[len(store) - 1] == loaded[-1] == keys[-1]
+    binary_read = perf_counter() - start
+    assert count == len(loaded) == args.keys
+
+    result = {
+        "keys": args.keys,
+        "json": {"bytes": os.path.getsize(json_path), "write": json_write, "read": json_read},
+        "binary": {"bytes": os.path.getsize(binary_path), "write": binary_write, "read": binary_read},
+    }
+    print(f"n = {n}: JSON {result['json']['bytes'] / args.keys:.0f} bytes per key, written in {json_write:.2f} s "
+          f"and read in {json_read:.2f} s; binary {result['binary']['bytes'] / args.keys:.0f} bytes per key, "
+          f"written in {binary_write:.2f} s and read in {binary_read:.2f} s")
+
+    if args.exchange > 0:
+        with KeyStore(binary_path) as store:
+            start = perf_counter()
+            shared = list(cs.group_action_many((store[i] for i in range(args.exchange)), processes=args.processes))
+            result["exchange"] = {"keys": len(shared), "time": perf_counter() - start}
+        print(f"  {len(shared)} group actions streamed from the store in {result['exchange']['time']:.2f} s")
+
+    if not args.keep:
+        os.remove(json_path)
+        os.remove(binary_path)
+    return result
+
+
+def save_data(data, path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+    return path
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Compare the binary key format with JSON.")
+    parser.add_argument("--n", nargs="+", type=int, default=[20, 74], help="numbers of primes")
+    parser.add_argument("--keys", type=int, default=100000, help="keys per file")
+    parser.add_argument("--exchange", type=int, default=0, help="keys to stream into group_action_many")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes for --exchange")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the exponents")
+    parser.add_argument("--directory", default=os.path.join(results_dir, "files"), help="where to write the key files")
+    parser.add_argument("--keep", action="store_true", help="keep the key files")
+    parser.add_argument("--output", help="JSON file for the results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data = {str(n): run(n, args) for n in args.n}
+    print("Results saved in: " + save_data(data, args.output or os.path.join(results_dir, "keystore.json")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+from time import perf_counter_ns
+from datetime import datetime
+from multiprocessing import Pool, Value
+import argparse
+import random
+import math
+import sys
+import os
+import gc
+import json
+
+sys.path.append("..")
+from csidh_ct import CSIDH_CT
+
+# Test whether the runtime of CSIDH_CT.group_action depends on the private key, in the style of dudect.
+# Timings of group actions for one fixed private key and for fresh random private keys are collected in a
+# random interleaved order by worker processes, each pinned to its own CPU, and streamed into running
+# means and variances (Welford's algorithm) so that no sample is kept in memory. The overall statistic is
+# Welch's t-test between the fixed and the random class. For each prime, the random class is also split into
+# keys whose exponent for that prime is below or above the middle of [0, 10], and Welch's t-test between the
+# two halves shows whether the time depends on that exponent in particular.
+# As in dudect, |t| above 4.5 suggests a leak and |t| above 10 is a strong indication of one, for any mode.
+
+N = 10                  # Number of primes in the parameter set
+samples = 1000000       # Total number of timed group actions
+batch_size = 200        # Timed group actions per task sent to a worker
+threshold = 4.5         # |t| above which a leak is reported
+
+results_dir = "../Results/leakage_test"
+
+
+class Moments():
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    # Add one sample
+    def push(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    # Add the samples summarized by other, with the parallel form of Welford's algorithm (Chan et al.)
+    def merge(self, other):
+        n = self.n + other.n
+        if n == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    def state(self):
+        return (self.n, self.mean, self.m2)
+
+
+# Compute Welch's t-statistic between two classes of samples
+def welch_t(a, b):
+    if a.n < 2 or b.n < 2:
+        return 0.0
+    se = math.sqrt(a.variance() / a.n + b.variance() / b.n)
+    return (a.mean - b.mean) / se if se > 0 else 0.0
+
+
+_instance = None                                    # The CSIDH_CT instance of each worker process
+_fixed = None                                       # The fixed private key of each worker process
+
+
+# Build the instance in each worker process and pin the worker to the next CPU that is allowed
+def _init_worker(n, mode, fixed, next_cpu):
+    global _instance, _fixed
+    _instance = CSIDH_CT(n, mode=mode)
+    _fixed = fixed
+    if hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        with next_cpu.get_lock():
+            cpu = cpus[next_cpu.value % len(cpus)]
+            next_cpu.value += 1
+        os.sched_setaffinity(0, {cpu})
+
+
+# Time one batch of group actions in a worker, returning the accumulator states for the batch
+def _measure(task):
+    seed, count = task
+    rng = random.Random(seed)
+    n = _instance.n
+    fixed, other = Moments(), Moments()
+    low = [Moments() for _ in range(n)]
+    high = [Moments() for _ in range(n)]
+
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(count):
+            is_random = rng.random() < 0.5
+            private = [rng.randint(0, 2 * b) for b in _instance.bounds] if is_random else _fixed
+            key = {"public": 0, "private": private}
+            start = perf_counter_ns()
+            _instance.group_action(key)
+            elapsed = perf_counter_ns() - start
+            if not is_random:
+                fixed.push(elapsed)
+                continue
+            other.push(elapsed)
+            for i, e in enumerate(private):
+                if e < _instance.bounds[i]:
+                    low[i].push(elapsed)
+                elif e > _instance.bounds[i]:
+                    high[i].push(elapsed)
+    finally:
+        gc.enable()
+    return fixed.state(), other.state(), [m.state() for m in low], [m.state() for m in high]
+
+
+# Print the overall t-statistic and the per-prime t-statistics with the largest magnitude
+def report(done, fixed, other, low, high, l_primes):
+    overall = welch_t(fixed, other)
+    per_prime = [welch_t(high[i], low[i]) for i in range(len(l_primes))]
+    worst = max(range(len(l_primes)), key=lambda i: abs(per_prime[i]))
+    flag = "  LEAK?" if max(abs(overall), abs(per_prime[worst])) > threshold else ""
+    print(f"{done:>10} samples  fixed {fixed.mean / 1e6:8.3f} ms  random {other.mean / 1e6:8.3f} ms  "
+          f"t = {overall:7.2f}  max per-prime |t| = {abs(per_prime[worst]):5.2f} (l = {l_primes[worst]}){flag}")
+    return overall, per_prime
+
+
+# Save the final statistics
+def save_data(data, path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+    return path
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Fixed-vs-random timing leakage test for CSIDH_CT.")
+    parser.add_argument("--n", type=int, default=N, help="number of primes")
+    parser.add_argument("--mode", default="dummy", choices=CSIDH_CT.modes, help="constant-time mode")
+    parser.add_argument("--samples", type=int, default=samples, help="total number of timed group actions")
+    parser.add_argument("--batch-size", type=int, default=batch_size, help="timed group actions per worker task")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--fixed", default="zero", choices=("zero", "ten", "random"),
+                        help="fixed private key: all exponents 0, all 2m (10 for the default bound m = 5), or one random key")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the keys and the class order")
+    parser.add_argument("--output", help="JSON file for the final statistics")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    instance = CSIDH_CT(args.n, mode=args.mode)
+    bounds = instance.bounds
+    if args.fixed == "zero":
+        fixed_key = [0] * args.n
+    elif args.fixed == "ten":
+        fixed_key = [2 * b for b in bounds]
+    else:
+        fixed_key = [rng.randint(0, 2 * b) for b in bounds]
+    l_primes = instance.l_primes
+
+    fixed, other = Moments(), Moments()
+    low = [Moments() for _ in range(args.n)]
+    high = [Moments() for _ in range(args.n)]
+    tasks = []
+    remaining = args.samples
+    while remaining > 0:
+        tasks.append((rng.getrandbits(64), min(args.batch_size, remaining)))
+        remaining -= args.batch_size
+
+    # Merge the batches as they finish and report the statistics so far, keeping what was collected on Ctrl-C
+    done = 0
+    overall, per_prime = 0.0, [0.0] * args.n
+    next_cpu = Value("i", 0)
+    pool = Pool(args.processes, initializer=_init_worker, initargs=(args.n, args.mode, fixed_key, next_cpu))
+    try:
+        for (task_seed, count), (f, o, lo, hi) in zip(tasks, pool.imap(_measure, tasks)):
+            fixed.merge(Moments(*f))
+            other.merge(Moments(*o))
+            for i in range(args.n):
+                low[i].merge(Moments(*lo[i]))
+                high[i].merge(Moments(*hi[i]))
+            done += count
+            overall, per_prime = report(done, fixed, other, low, high, l_primes)
+    except KeyboardInterrupt:
+        print("Interrupted, saving the statistics so far")
+    finally:
+        pool.terminate()
+        pool.join()
+
+    data = {
+        "n": args.n,
+        "mode": args.mode,
+        "fixed_key": fixed_key,
+        "samples": done,
+        "t": overall,
+        "per_prime_t": dict(zip(map(str, l_primes), per_prime)),
+        "fixed": fixed.state(),
+        "random": other.state(),
+        "leak": max([abs(overall)] + [abs(t) for t in per_prime]) > threshold,
+    }
+    output = args.output or os.path.join(results_dir, "leakage_" + args.mode + "_" + str(args.n) + "_" +
+                                         datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".json")
+    print("Results saved in: " + save_data(data, output))
+
+
+if __name__ == "__main__":
+    main()
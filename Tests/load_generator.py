@@ -0,0 +1,182 @@
+from time import perf_counter
+from datetime import datetime
+from collections import Counter
+import argparse
+import asyncio
+import json
+import sys
+import os
+
+sys.path.append("..")
+from csidh import CSIDH
+from csidh_ct import CSIDH_CT
+from service import ExchangeService, percentile, serve
+
+# Measure the latency and throughput of the key exchange service in service.py on one machine.
+# For each n, a service is started in this process (or an existing one is used with --connect or --unix), a client
+# key and a few peer public keys are generated through it, and then for each concurrency level c, c clients each
+# send exchange requests one after the other for a fixed duration. The client-side latency of every successful
+# request gives p50, p90, and p99, and the successful requests per second give the throughput; requests refused as
+# busy or past their deadline are counted separately. The service's own statistics are saved with each level.
+# With --serve, the script only runs a service until it is interrupted, for other clients to connect to.
+
+IMPLEMENTATIONS = {"CSIDH": CSIDH, "CSIDH_CT": CSIDH_CT}
+
+results_dir = "../Results/load_generator"
+
+
+class Client():
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host=None, port=None, unix=None):
+        if unix:
+            return cls(*await asyncio.open_unix_connection(unix))
+        return cls(*await asyncio.open_connection(host, port))
+
+    # Send one request and wait for its response; a client only has one request in flight
+    async def request(self, **request):
+        self.writer.write((json.dumps(request) + "\n").encode())
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("The service closed the connection")
+        return json.loads(line)
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+# Run one client sending exchange requests until the end time, recording latencies and outcomes
+async def run_client(address, key, peers, end, deadline, latencies, outcomes):
+    client = await Client.connect(*address)
+    try:
+        i = 0
+        while perf_counter() < end:
+            start = perf_counter()
+            response = await client.request(op="exchange", key=key, public=peers[i % len(peers)], deadline=deadline)
+            if response["ok"]:
+                latencies.append(perf_counter() - start)
+                outcomes["ok"] += 1
+            else:
+                outcomes[response["error"]] += 1
+                if response["error"] == "busy":
+                    await asyncio.sleep(0.001)
+            i += 1
+    finally:
+        await client.close()
+
+
+# Measure one concurrency level against a running service
+async def run_level(address, key, peers, concurrency, duration, deadline):
+    latencies = []
+    outcomes = Counter()
+    start = perf_counter()
+    end = start + duration
+    await asyncio.gather(*(run_client(address, key, peers, end, deadline, latencies, outcomes)
+                           for _ in range(concurrency)))
+    elapsed = perf_counter() - start
+
+    client = await Client.connect(*address)
+    stats = await client.request(op="stats")
+    await client.close()
+    ordered = sorted(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": sum(outcomes.values()),
+        "outcomes": dict(outcomes),
+        "throughput": outcomes["ok"] / elapsed,
+        "p50": percentile(ordered, 50),
+        "p90": percentile(ordered, 90),
+        "p99": percentile(ordered, 99),
+        "service": stats,
+    }
+
+
+# Measure every concurrency level for one n, starting a service for it unless an address is given
+async def run_n(Implementation, n, args):
+    service = None
+    if args.connect or args.unix:
+        address = (None, None, args.unix) if args.unix else (*args.connect.rsplit(":", 1), None)
+    else:
+        service = ExchangeService(Implementation, n, processes=args.processes, max_pending=args.max_pending,
+                                  deadline=args.deadline)
+        host, port = await service.start_tcp()
+        address = (host, port, None)
+    try:
+        client = await Client.connect(*address)
+        key = (await client.request(op="keygen"))["key"]
+        peers = []
+        for _ in range(args.peers):
+            peer = await client.request(op="keygen")
+            await client.request(op="release", key=peer["key"])
+            peers.append(peer["public"])
+        await client.close()
+
+        levels = []
+        for concurrency in args.concurrency:
+            level = await run_level(address, key, peers, concurrency, args.duration, args.deadline)
+            levels.append(level)
+            p50, p99 = (level[q] * 1000 if level[q] is not None else float("nan") for q in ("p50", "p99"))
+            print(f"n = {n}, concurrency {concurrency:3}: {level['throughput']:8.2f} exchanges/s, p50 {p50:9.2f} ms, "
+                  f"p99 {p99:9.2f} ms, outcomes {level['outcomes']}")
+        client = await Client.connect(*address)
+        await client.request(op="release", key=key)
+        await client.close()
+        return levels
+    finally:
+        if service is not None:
+            await service.close()
+
+
+def save_data(data, path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+    return path
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Load test the key exchange service.")
+    parser.add_argument("--implementation", choices=sorted(IMPLEMENTATIONS), default="CSIDH")
+    parser.add_argument("--n", nargs="+", default=["10", "20"], help="numbers of primes or parameter set names")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4, 8, 16], help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per concurrency level")
+    parser.add_argument("--peers", type=int, default=4, help="peer public keys to exchange with")
+    parser.add_argument("--deadline", type=float, default=30.0, help="deadline of each request in seconds")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes of the service")
+    parser.add_argument("--max-pending", type=int, default=64, help="group actions the service queues at most")
+    parser.add_argument("--connect", help="host:port of a running service, instead of starting one")
+    parser.add_argument("--unix", help="Unix socket of a running service (with --serve, the socket to listen on)")
+    parser.add_argument("--serve", action="store_true", help="only run a service, on --port or --unix")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port for --serve")
+    parser.add_argument("--output", help="JSON file for the results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    Implementation = IMPLEMENTATIONS[args.implementation]
+    if args.serve:
+        try:
+            asyncio.run(serve(Implementation, args.n[0], port=args.port, unix=args.unix, processes=args.processes,
+                              max_pending=args.max_pending, deadline=args.deadline))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    data = {"implementation": args.implementation, "results": {}}
+    for n in args.n:
+        data["results"][n] = asyncio.run(run_n(Implementation, n, args))
+    output = args.output or os.path.join(results_dir, "load_" + args.implementation + "_" +
+                                         datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".json")
+    print("Results saved in: " + save_data(data, output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+from time import perf_counter
+import random
+import sys
+import os
+import json
+
+sys.path.append("..")
+from csidh_ct import CSIDH_CT
+
+# Compare lockstep batches of constant-time group actions against one action at a time.
+# For each batch size, a batch of random private keys is run through CSIDH_CT.group_action_lockstep, and a
+# sample of the same keys through CSIDH_CT.group_action, checking that both give the same public keys. The
+# time per key of each is saved, so the batch size from which lockstep pays off can be read off.
+
+N = 20                                  # Number of primes in the parameter set
+lane_counts = [64, 256, 1024]           # Batch sizes to time
+single_keys = 16                        # Number of keys to time one at a time
+mode = "dummy"                          # Constant-time mode to time
+
+results_dir = "../Results/lockstep_benchmark"
+
+
+# Time group_action and group_action_lockstep per key for each batch size
+def run_benchmark(n):
+    csidh = CSIDH_CT(n, mode=mode)
+    keys = [{"public": 0, "private": [random.randint(0, 2 * b) for b in csidh.bounds]} for _ in range(max(lane_counts))]
+
+    start = perf_counter()
+    single = [csidh.group_action(key) for key in keys[:single_keys]]
+    single_time = (perf_counter() - start) / single_keys
+    print(f"one at a time: {single_time * 1e3:.2f} ms per key")
+
+    lockstep_times = {}
+    for lanes in lane_counts:
+        start = perf_counter()
+        results = csidh.group_action_lockstep(keys[:lanes], lanes)
+        lockstep_times[lanes] = (perf_counter() - start) / lanes
+        assert results[:single_keys] == single[:lanes]
+        print(f"lockstep, {lanes} lanes: {lockstep_times[lanes] * 1e3:.2f} ms per key")
+    return {"n": n, "mode": mode, "backend": type(csidh.F).__name__, "single": single_time, "lockstep": lockstep_times}
+
+
+# Save the timings
+def save_data(data, n):
+    if not os.path.exists(results_dir):
+        os.makedirs(results_dir)
+    path = os.path.join(results_dir, "lockstep_benchmark_" + str(n) + ".json")
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    save_data(run_benchmark(n), n)
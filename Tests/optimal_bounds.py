@@ -0,0 +1,95 @@
+from time import perf_counter
+import argparse
+import sys
+import os
+import json
+
+sys.path.append("..")
+from csidh_ct import CSIDH_CT
+from bounds import key_space_bits, bounds_cost, degree_costs, round_cost, round_weights, optimal_bounds
+
+# Compute the cost-optimized exponent bounds of CSIDH_CT for the parameter sets of several n.
+# For each n, the cost of one unit of bound of each prime and the fixed cost of a round are counted on the instance,
+# and the cheapest bounds with a key space of at least the target size are printed as a list that can be passed to
+# CSIDH_CT(n, bounds=...). By default, the target is the key space of the same bound for every prime, so the bounds
+# keep the security of the uniform ones. With --runs, group actions with the uniform and the optimal bounds are
+# timed too, interleaved so that both see the same machine load.
+
+results_dir = "../Results/optimal_bounds"
+
+
+# Time group actions with the uniform and the optimal bounds, returning the median time of each in seconds
+def compare(uniform, optimal, runs):
+    times = {"uniform": [], "optimal": []}
+    for _ in range(runs):
+        for name, instance in (("uniform", uniform), ("optimal", optimal)):
+            private = instance.gen_key()["private"]
+            start = perf_counter()
+            instance.group_action({"public": 0, "private": private})
+            times[name].append(perf_counter() - start)
+    return {name: sorted(t)[runs // 2] for name, t in times.items()}
+
+
+# Compute the optimal bounds for one n and report them
+def run(n, args):
+    instance = CSIDH_CT(n, backend=args.backend, mode=args.mode)
+    uniform = [instance.default_bound] * n
+    bits = args.bits if args.bits is not None else key_space_bits(uniform)
+    costs = degree_costs(instance)
+    fixed = round_cost(instance)
+    weights = round_weights(instance.l_primes)
+    bounds = optimal_bounds(costs, bits, fixed, weights, args.max_bound)
+
+    predicted = bounds_cost(bounds, costs, fixed, weights) / bounds_cost(uniform, costs, fixed, weights)
+    print(f"n = {n}, p of {instance.p.bit_length()} bits, key space of {key_space_bits(bounds):.1f} bits "
+          f"(target {bits:.1f}), predicted cost {predicted:.2f}x the uniform bounds")
+    print("bounds = " + str(bounds))
+    result = {
+        "l_primes": instance.l_primes,
+        "bounds": bounds,
+        "key_space_bits": key_space_bits(bounds),
+        "target_bits": bits,
+        "degree_costs": costs,
+        "round_cost": fixed,
+        "predicted_ratio": predicted,
+    }
+    if args.runs > 0:
+        optimal = CSIDH_CT(n, backend=args.backend, mode=args.mode, bounds=bounds)
+        result["measured"] = compare(instance, optimal, args.runs)
+        print(f"median group action: uniform {result['measured']['uniform'] * 1000:.1f} ms, "
+              f"optimal {result['measured']['optimal'] * 1000:.1f} ms")
+    return result
+
+
+# Save the bounds of every n
+def save_data(data, path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+    return path
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Compute cost-optimized exponent bounds for CSIDH_CT.")
+    parser.add_argument("--n", nargs="+", type=int, default=[74], help="numbers of primes")
+    parser.add_argument("--mode", default="dummy", choices=CSIDH_CT.modes, help="constant-time mode")
+    parser.add_argument("--backend", default=None, help="field backend, see fields.py")
+    parser.add_argument("--bits", type=float, default=None,
+                        help="key space size in bits (default: that of bound " + str(CSIDH_CT.default_bound) + " for every prime)")
+    parser.add_argument("--max-bound", type=int, default=20, help="largest bound of any prime")
+    parser.add_argument("--runs", type=int, default=0, help="group actions to time with each kind of bounds")
+    parser.add_argument("--output", help="JSON file for the bounds")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data = {"mode": args.mode, "results": {str(n): run(n, args) for n in args.n}}
+    output = args.output or os.path.join(results_dir, "bounds_" + args.mode + ".json")
+    print("Results saved in: " + save_data(data, output))
+
+
+if __name__ == "__main__":
+    main()
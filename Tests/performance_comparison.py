@@ -1,5 +1,3 @@
-from sage.all import *
-from time import time
 import sys
 import matplotlib.pyplot as plt
 from scipy.optimize import curve_fit
@@ -7,8 +5,7 @@ import numpy as np
 
 # Ensure the parent directory is in the path to import modules
 sys.path.append("..")
-from csidh import CSIDH
-from csidh_ct import CSIDH_CT
+import experiment_runner
 
 # Set up file saving
 import os
@@ -24,46 +21,6 @@ itr = 30            # The number of iterations to use
 N_start = 5         # First value of N to test
 N_stop = 100        # Final valuie of N to test\
 
-# Set the outer loop counter up for later
-i = 0
-
-
-def run_experiment(Implementation, n_val, iterations=50):
-    """
-    Run the group action 50 times for a given implementation and N value.
-    Returns:
-        average_time: average time (in seconds) per group action call (averaging both Alice and Bob calls)
-        times: list of individual average times per iteration.
-    """
-    times = []
-    for n in range(iterations):
-        cs = Implementation(n_val)
-        # Extract public and private keys for both parties
-        A = cs.a_key["public"]
-        B = cs.b_key["public"]
-        A_priv = cs.a_key["private"]
-        B_priv = cs.b_key["private"]
-
-        # Measure Alice's group action
-        start_a = time()
-        alice_shared = cs.group_action({"public": B, "private": A_priv})
-        end_a = time()
-        
-        # Measure Bob's group action
-        start_b = time()
-        bob_shared = cs.group_action({"public": A, "private": B_priv})
-        end_b = time()
-        
-        # Check that both shared secrets match
-        if alice_shared != bob_shared:
-            raise ValueError("Mismatch in shared secrets for N = {}.".format(n_val))
-        
-        # Average the time of the two group actions for this iteration
-        avg_iteration_time = ((end_a - start_a) + (end_b - start_b)) / 2.0
-        times.append(avg_iteration_time)
-
-    average_time = sum(times) / len(times)
-    return average_time, times
 
 def main():
     # List of N values (minimum number of primes)
@@ -72,28 +29,22 @@ def main():
         if N % ivl == 0:
             N_values.append(N)
     print(N_values)
-    iterations = itr
-
-    # To store average times for each N for CSIDH and CSIDH_CT
-    csidh_avg_times = []
-    csidh_ct_avg_times = []
-    
-    # Optionally, store the detailed timings for further analysis
-    csidh_results = {}
-    csidh_ct_results = {}
-
-    for n in N_values:
-        print("Current value of N: " + str(n))
-        # Run experiment for CSIDH
-        avg_time, times = run_experiment(CSIDH, n, iterations)
-        csidh_avg_times.append(avg_time)
-        csidh_results[n] = times
-
-        # Run experiment for CSIDH_CT
-        avg_time_ct, times_ct = run_experiment(CSIDH_CT, n, iterations)
-        csidh_ct_avg_times.append(avg_time_ct)
-        csidh_ct_results[n] = times_ct
 
+    # Time the trials over a process pool, streaming each one to a file that a later run resumes from
+    stream_path = os.path.join(results_dir, "performance_data.jsonl")
+    experiment_runner.run(stream_path, ["CSIDH", "CSIDH_CT"], N_values, itr)
+    plot_results(stream_path)
+
+
+# Fit and plot the average times of the trials recorded in a file written by experiment_runner
+def plot_results(stream_path):
+    summary = experiment_runner.summarize(stream_path)
+    csidh_results = summary["CSIDH"]
+    csidh_ct_results = summary["CSIDH_CT"]
+    N_values = sorted(n for n in csidh_results if n in csidh_ct_results)
+    csidh_avg_times = [sum(csidh_results[n]) / len(csidh_results[n]) for n in N_values]
+    csidh_ct_avg_times = [sum(csidh_ct_results[n]) / len(csidh_ct_results[n]) for n in N_values]
+    for n, avg_time, avg_time_ct in zip(N_values, csidh_avg_times, csidh_ct_avg_times):
         print(f"N = {n}: CSIDH average time = {avg_time:.6f} s, CSIDH_CT average time = {avg_time_ct:.6f} s")
 
     # Exponential model: y = a * exp(b * x)
@@ -139,8 +90,8 @@ def main():
         "N_values": N_values,
         "CSIDH_avg_times": csidh_avg_times,
         "CSIDH_CT_avg_times": csidh_ct_avg_times,
-        "CSIDH_individual_times": csidh_results,
-        "CSIDH_CT_individual_times": csidh_ct_results
+        "CSIDH_individual_times": {n: csidh_results[n] for n in N_values},
+        "CSIDH_CT_individual_times": {n: csidh_ct_results[n] for n in N_values}
     }
 
     # Write the JSON file to the Results folder
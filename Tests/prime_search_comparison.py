@@ -0,0 +1,80 @@
+from time import perf_counter
+import argparse
+import sys
+import os
+import json
+
+sys.path.append("..")
+from csidh import CSIDH
+from prime_search import search_primes, classic_cost
+
+# Compare the parameter sets found by prime_search.search_primes with those of ParameterSet.search.
+# For each n, the search is timed, and the estimated cost of a group action, the largest prime, and the size of p
+# are reported for both. With --runs, CSIDH group actions are timed on both parameter sets too, interleaved so that
+# both see the same machine load. --cofactors also lets the search consider p = 2^k * prod(l_primes) - 1 for other
+# k, which CSIDH cannot use but shows what they would save.
+
+results_dir = "../Results/prime_search"
+
+
+# Time CSIDH group actions on two parameter sets, returning the median time of each in seconds
+def compare(keys, runs):
+    instances = [CSIDH(key) for key in keys]
+    times = [[] for _ in instances]
+    for _ in range(runs):
+        for instance, samples in zip(instances, times):
+            private = instance.gen_key(5)["private"]
+            start = perf_counter()
+            instance.group_action({"public": 0, "private": private})
+            samples.append(perf_counter() - start)
+    return [sorted(samples)[runs // 2] for samples in times]
+
+
+def run(n, args):
+    start = perf_counter()
+    found = search_primes(n, window=args.window, max_drop=args.max_drop, cofactor_exponents=args.cofactors,
+                          processes=args.processes)
+    elapsed = perf_counter() - start
+    l_primes, cost = classic_cost(n)
+    print(f"n = {n}: searched {found['candidates']} candidates ({found['sieved']} sieved out, {found['tested']} tested) "
+          f"in {elapsed:.2f} s")
+    print(f"  classic:   largest prime {max(l_primes):5}, estimated cost {cost:10.0f}")
+    print(f"  optimized: largest prime {max(found['l_primes']):5}, estimated cost {found['cost']:10.0f} "
+          f"({found['cost'] / cost:.2f}x), cofactor 2^{found['k']}")
+    result = {"search_time": elapsed, "classic": {"l_primes": l_primes, "cost": cost}, "optimized": found}
+    if args.runs > 0 and found["k"] == 2:
+        classic, optimized = compare([n, "optimized-" + str(n)], args.runs)
+        result["measured"] = {"classic": classic, "optimized": optimized}
+        print(f"  median group action: classic {classic * 1000:.1f} ms, optimized {optimized * 1000:.1f} ms")
+    return result
+
+
+def save_data(data, path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+    return path
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Compare searched CSIDH primes with the classic parameter sets.")
+    parser.add_argument("--n", nargs="+", type=int, default=[20, 50, 74, 100], help="numbers of primes")
+    parser.add_argument("--window", type=int, default=16, help="number of larger primes to choose from")
+    parser.add_argument("--max-drop", type=int, default=2, help="number of smallest primes that can be left out")
+    parser.add_argument("--cofactors", nargs="+", type=int, default=[2], help="exponents k of the cofactor 2^k")
+    parser.add_argument("--processes", type=int, default=None, help="Miller-Rabin worker processes")
+    parser.add_argument("--runs", type=int, default=0, help="group actions to time on each parameter set")
+    parser.add_argument("--output", help="JSON file for the results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data = {str(n): run(n, args) for n in args.n}
+    print("Results saved in: " + save_data(data, args.output or os.path.join(results_dir, "prime_search.json")))
+
+
+if __name__ == "__main__":
+    main()
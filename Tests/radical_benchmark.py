@@ -0,0 +1,110 @@
+from time import perf_counter
+import argparse
+import random
+import sys
+import os
+import json
+
+sys.path.append("..")
+from csidh import CSIDH
+from csidh_ct import CSIDH_CT
+from counters import counting
+
+# Compare chains of radical isogenies (radical.py) with the per-step path for the degrees 3 and 5.
+# For each n and degree l, random keys with exponents in [-5, 5] get the exponent E for l, for each E of --exponents,
+# and their group actions are computed with radical=None (every isogeny from a kernel point in the rounds) and with
+# radical=[l] (the l-isogenies as one radical chain). The results are checked to be equal, and the average time and
+# field multiplications and squarings (counted with counters.py) of an action are reported for both. With --ct, the
+# same is done for CSIDH_CT in the given mode with the bound E for l and 5 for the other primes.
+# A chain only wins once E is larger than the other exponents, whose rounds would otherwise continue for l alone, and
+# by enough to pay for sampling a point and converting the curve: radical.margins holds the excess over the other
+# exponents from which radical="auto", the default of both classes, uses it.
+
+results_dir = "../Results/radical"
+
+
+# Time one group action and count its field operations
+def measure(instance, private):
+    with counting() as counts:
+        start = perf_counter()
+        public = instance.group_action({"public": 0, "private": private})
+        elapsed = perf_counter() - start
+    return public, counts.ops["mul"] + counts.ops["sqr"], elapsed
+
+
+def compare(plain, radical, keys):
+    totals = {"per_step": [0, 0.0], "radical": [0, 0.0]}
+    for private in keys:
+        results = []
+        for name, instance in (("per_step", plain), ("radical", radical)):
+            public, operations, elapsed = measure(instance, private)
+            results.append(public)
+            totals[name][0] += operations
+            totals[name][1] += elapsed
+        if results[0] != results[1]:
+            raise ValueError("The radical chain gives a different public key")
+    return {name: {"operations": operations / len(keys), "time": elapsed / len(keys)}
+            for name, (operations, elapsed) in totals.items()}
+
+
+def run(n, args):
+    result = {}
+    for l in (3, 5):
+        plain = CSIDH(n, radical=None)
+        if l not in plain.l_primes:
+            continue
+        i = plain.l_primes.index(l)
+        radical = CSIDH(n, radical=[l])
+        rng = random.Random(args.seed)
+        result[str(l)] = {}
+        for E in args.exponents:
+            if args.ct:
+                bounds = [5] * plain.n
+                bounds[i] = E
+                plain_ct = CSIDH_CT(n, mode=args.ct, bounds=bounds, radical=None)
+                radical_ct = CSIDH_CT(n, mode=args.ct, bounds=bounds, radical=[l])
+                keys = [[rng.randint(0, 2 * b) for b in bounds] for _ in range(args.keys)]
+                data = compare(plain_ct, radical_ct, keys)
+            else:
+                keys = [[rng.randint(-5, 5) for _ in range(plain.n)] for _ in range(args.keys)]
+                for private in keys:
+                    private[i] = rng.choice((-E, E))
+                data = compare(plain, radical, keys)
+            result[str(l)][str(E)] = data
+            print(f"n = {n}, l = {l}, E = {E}: per-step {data['per_step']['time'] * 1000:.2f} ms "
+                  f"({data['per_step']['operations']:.0f} operations), radical {data['radical']['time'] * 1000:.2f} ms "
+                  f"({data['radical']['operations']:.0f} operations), "
+                  f"ratio {data['radical']['operations'] / data['per_step']['operations']:.2f}")
+    return result
+
+
+def save_data(data, path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+    return path
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Compare radical isogeny chains with the per-step path.")
+    parser.add_argument("--n", nargs="+", type=int, default=[10, 20, 74], help="numbers of primes")
+    parser.add_argument("--exponents", nargs="+", type=int, default=[2, 5, 6, 7, 8, 10, 15, 20],
+                        help="exponents (or CSIDH_CT bounds) of the radical degree")
+    parser.add_argument("--keys", type=int, default=20, help="random keys per exponent")
+    parser.add_argument("--ct", choices=("dummy", "oayt"), help="benchmark CSIDH_CT in this mode instead of CSIDH")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the keys")
+    parser.add_argument("--output", help="JSON file for the results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data = {str(n): run(n, args) for n in args.n}
+    name = "radical_" + args.ct + ".json" if args.ct else "radical.json"
+    print("Results saved in: " + save_data(data, args.output or os.path.join(results_dir, name)))
+
+
+if __name__ == "__main__":
+    main()
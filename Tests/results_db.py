@@ -0,0 +1,343 @@
+from datetime import datetime
+import subprocess
+import argparse
+import sqlite3
+import hashlib
+import sys
+import os
+import re
+import json
+
+from benchmark import percentile
+
+# Keep the timings of every result file in a SQLite database that can be queried and checked for regressions.
+# ingest walks the Results directory and loads the files it has not seen before:
+#   sweeps:        performance_comparison.py and its older runs (vals_*_data.json, nist_standards_data.json), with
+#                  the individual group action times of each implementation and n
+#   time analysis: csidh_time_analysis_baseline.py, with the group action times of CSIDH for each n
+#   benchmark:     benchmark.py, with the summary of each phase (setup, keygen, action) of each implementation and n
+#   experiments:   JSON lines files of experiment_runner.py, with one group action time per record
+#   basic tests:   basic_test.py and basic_test_ct.py, with the total time of the run, under its largest n
+# Each file becomes a run, dated from the timestamp in its name or its records (or else from the git commit that last
+# changed it, or when it was last modified if it is not committed), and tied to the git revision that added it, or to the current one if it is not committed. A file is recognized by
+# a digest of its content, so renamed copies are skipped and a file that was overwritten becomes a new run. A JSON
+# lines file that grew since it was ingested only has its new lines added, to the same run. Times are in seconds.
+# Other files under Results are ignored.
+#
+# query prints percentiles of the times for each n, over every run or run by run, and regressions compares the
+# median of the latest run of each series, implementation, n, and metric with the median of the medians of the runs
+# before it in the same series, exiting with status 1 when one is slower by more than the threshold, so it can follow ingest in a script.
+
+results_dir = "../Results"
+_timestamp = re.compile(r"(\d{4}-\d{2}-\d{2})[ _T](\d{2})[:-](\d{2})[:-](\d{2})(\.\d+)?")
+database = os.path.join(results_dir, "results.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    date TEXT NOT NULL,
+    revision TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs(id)
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    implementation TEXT NOT NULL,
+    n INTEGER,
+    metric TEXT NOT NULL,
+    statistic TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_date ON runs(date);
+CREATE INDEX IF NOT EXISTS runs_revision ON runs(revision);
+CREATE INDEX IF NOT EXISTS files_digest ON files(digest);
+CREATE INDEX IF NOT EXISTS measurements_case ON measurements(implementation, n, metric);
+CREATE INDEX IF NOT EXISTS measurements_n ON measurements(n);
+CREATE INDEX IF NOT EXISTS measurements_run ON measurements(run_id);
+"""
+
+SUMMARY_STATISTICS = ("median", "mean", "p5", "p25", "p75", "p95", "min", "max")   # Kept from benchmark.py files
+
+
+def connect(path=database):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+# Get the series of a run: its kind and its source with the timestamp taken out of the name, so that only runs of
+# the same test on the same cases are compared
+def series(kind, source):
+    return kind + ":" + _timestamp.sub("", source)
+
+
+# Get the date in a file name such as basic_test_results_2025-03-15 16:40:11.579668.json, or None
+def date_from_name(path):
+    match = _timestamp.search(os.path.basename(path))
+    if match is None:
+        return None
+    return match.group(1) + "T" + ":".join(match.group(2, 3, 4))
+
+
+# Get the date of the git commit that last changed a file, or None if it is not committed or has uncommitted changes
+def git_date(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        def git(*args):
+            return subprocess.run(["git", *args], cwd=directory, capture_output=True, text=True, check=True).stdout.strip()
+        if git("status", "--porcelain", "--", os.path.abspath(path)):
+            return None
+        return git("log", "-1", "--format=%cd", "--date=format-local:%Y-%m-%dT%H:%M:%S", "--",
+                   os.path.abspath(path)) or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Get the git revision that last changed a file, or the current one if the file has uncommitted changes
+def git_revision(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        def git(*args):
+            return subprocess.run(["git", *args], cwd=directory, capture_output=True, text=True, check=True).stdout.strip()
+        if git("status", "--porcelain", "--", os.path.abspath(path)):
+            return git("rev-parse", "HEAD")
+        return git("log", "-1", "--format=%H", "--", os.path.abspath(path)) or git("rev-parse", "HEAD")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Turn the data of a JSON result file into its kind and its measurements, as (implementation, n, metric,
+# statistic, value) rows, or None if it is not a result file with timings
+def parse_json(path, data):
+    if not isinstance(data, dict):
+        return None
+    name = os.path.basename(path)
+    if "N_values" in data:
+        rows = []
+        for implementation in ("CSIDH", "CSIDH_CT"):
+            for n, times in data.get(implementation + "_individual_times", {}).items():
+                rows += [(implementation, int(n), "action", "sample", t) for t in times]
+        return "sweep", rows
+    if "n_times" in data:
+        rows = [("CSIDH", int(n), "action", "sample", t) for n, times in data["n_times"].items() for t in times]
+        return "time_analysis", rows
+    if "config" in data and isinstance(data.get("results"), dict):
+        rows = []
+        for case, summary in data["results"].items():
+            implementation, n, metric = case.split("/")
+            for statistic in SUMMARY_STATISTICS:
+                if statistic in summary:
+                    rows.append((implementation, int(n[len("n="):]), metric, statistic, summary[statistic] / 1e9))
+        return "benchmark", rows
+    if "trials" in data and "time_taken" in data:
+        implementation = "CSIDH_CT" if name.startswith("basic_test_ct") else "CSIDH"
+        return "basic_test", [(implementation, int(data["last_n"]), "total", "sample", float(data["time_taken"]))]
+    return None
+
+
+# Turn the lines of an experiment_runner.py file into measurements, skipping a line cut off by a crash
+def parse_jsonl(lines):
+    rows = []
+    finished = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+            rows.append((record["implementation"], int(record["n"]), "action", "sample", float(record["time"])))
+        except (ValueError, KeyError, TypeError):
+            continue
+        if "finished" in record:
+            finished.append(record["finished"])
+    date = datetime.fromtimestamp(min(finished)).isoformat(timespec="seconds") if finished else None
+    return rows, date
+
+
+def add_measurements(connection, run_id, rows):
+    connection.executemany("INSERT INTO measurements VALUES (?, ?, ?, ?, ?, ?)", [(run_id, *row) for row in rows])
+
+
+def add_run(connection, path, directory, kind, date, rows):
+    if date is None:
+        date = git_date(path)
+    if date is None:
+        date = datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec="seconds")
+    cursor = connection.execute("INSERT INTO runs (source, kind, date, revision) VALUES (?, ?, ?, ?)",
+                                (os.path.relpath(path, directory), kind, date, git_revision(path)))
+    add_measurements(connection, cursor.lastrowid, rows)
+    return cursor.lastrowid
+
+
+# Ingest one file if it is new or changed, returning the number of measurements added
+def ingest_file(connection, path, directory=results_dir):
+    with open(path, 'rb') as f:
+        content = f.read()
+    if path.endswith(".jsonl"):
+        # Leave a last line that is still being written for the next ingest
+        content = content[:content.rfind(b"\n") + 1]
+    digest = hashlib.sha256(content).hexdigest()
+    key = os.path.relpath(path, directory)
+    known = connection.execute("SELECT digest, size, run_id FROM files WHERE path = ?", (key,)).fetchone()
+    if known is not None and known[0] == digest:
+        return 0
+    if known is None and connection.execute("SELECT 1 FROM files WHERE digest = ?", (digest,)).fetchone():
+        return 0
+
+    if path.endswith(".jsonl"):
+        # A file that only grew keeps its run and adds the lines after the part already ingested
+        if known is not None and len(content) > known[1] and \
+                hashlib.sha256(content[:known[1]]).hexdigest() == known[0]:
+            rows, _ = parse_jsonl(content[known[1]:].decode().splitlines())
+            run_id = known[2]
+            add_measurements(connection, run_id, rows)
+        else:
+            rows, date = parse_jsonl(content.decode().splitlines())
+            run_id = add_run(connection, path, directory, "experiments", date, rows)
+    else:
+        try:
+            parsed = parse_json(path, json.loads(content))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            parsed = None
+        if parsed is None:
+            return 0
+        kind, rows = parsed
+        run_id = add_run(connection, path, directory, kind, date_from_name(path), rows)
+    connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (key, digest, len(content), run_id))
+    return len(rows)
+
+
+# Ingest every new or changed result file under the results directory
+def ingest(connection, directory=results_dir):
+    files = measurements = 0
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if name.endswith((".json", ".jsonl")):
+                added = ingest_file(connection, os.path.join(root, name), directory)
+                if added:
+                    files += 1
+                    measurements += added
+    connection.commit()
+    return files, measurements
+
+
+# Get the measurements of a metric as {(implementation, n): {run id: [values]}}, with the run ids in date order
+def measurements(connection, metric, implementation=None, n=None, statistic="sample"):
+    query = "SELECT m.implementation, m.n, m.run_id, m.value FROM measurements m JOIN runs r ON r.id = m.run_id " \
+            "WHERE m.metric = ? AND m.statistic = ?"
+    parameters = [metric, statistic]
+    if implementation:
+        query += " AND m.implementation = ?"
+        parameters.append(implementation)
+    if n is not None:
+        query += " AND m.n = ?"
+        parameters.append(n)
+    cases = {}
+    for name, case_n, run_id, value in connection.execute(query + " ORDER BY r.date, r.id", parameters):
+        cases.setdefault((name, case_n), {}).setdefault(run_id, []).append(value)
+    return cases
+
+
+# Get the median of each run for each series and case, in date order, from the samples or else the stored medians
+def run_medians(connection, metric, implementation=None):
+    runs_series = {run_id: series(kind, source) for run_id, kind, source in
+                   connection.execute("SELECT id, kind, source FROM runs")}
+    medians = {}
+    for statistic in ("sample", "median"):
+        for (name, n), runs in measurements(connection, metric, implementation, statistic=statistic).items():
+            for run_id, values in runs.items():
+                case = (runs_series[run_id], name, n)
+                medians.setdefault(case, {}).setdefault(run_id, percentile(sorted(values), 50))
+    dates = dict(connection.execute("SELECT id, date FROM runs"))
+    return {case: sorted(runs.items(), key=lambda item: (dates[item[0]], item[0])) for case, runs in medians.items()}
+
+
+# Compare the latest run of each series and case with the median of the medians of up to window runs before it
+def regressions(connection, metric="action", implementation=None, window=5, threshold=0.1):
+    found = []
+    for (run_series, name, n), runs in sorted(run_medians(connection, metric, implementation).items(), key=str):
+        if len(runs) < 2:
+            continue
+        latest_run, latest = runs[-1]
+        baseline = percentile(sorted(median for _, median in runs[-1 - window:-1]), 50)
+        ratio = latest / baseline
+        if ratio > 1 + threshold:
+            found.append({"series": run_series, "implementation": name, "n": n, "metric": metric, "run": latest_run, "median": latest,
+                          "baseline": baseline, "ratio": ratio})
+    return found
+
+
+def print_runs(connection):
+    for run_id, source, kind, date, revision, count in connection.execute(
+            "SELECT r.id, r.source, r.kind, r.date, r.revision, COUNT(m.value) FROM runs r "
+            "LEFT JOIN measurements m ON m.run_id = r.id GROUP BY r.id ORDER BY r.date, r.id"):
+        print(f"{run_id:4}  {date}  {(revision or '-')[:10]:10}  {kind:13} {count:6}  {source}")
+
+
+def print_query(connection, args):
+    cases = measurements(connection, args.metric, args.implementation, args.n)
+    for (name, n), runs in sorted(cases.items(), key=str):
+        groups = runs.items() if args.by_run else [("all", [v for values in runs.values() for v in values])]
+        for run, values in groups:
+            ordered = sorted(values)
+            line = f"{name:9} n = {str(n):>4}  run {str(run):>4}  {len(ordered):5} samples"
+            if run == "all":
+                line += f" from {len(runs)} runs"
+            line += "".join(f"  p{p} {percentile(ordered, p) * 1000:10.3f} ms" for p in args.percentiles)
+            print(line)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Ingest, query, and check the stored results.")
+    parser.add_argument("--database", default=database, help="SQLite database file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = commands.add_parser("ingest", help="load the result files that are not in the database yet")
+    ingest_parser.add_argument("--directory", default=results_dir, help="directory of result files")
+    commands.add_parser("runs", help="list the runs in the database")
+    query_parser = commands.add_parser("query", help="print percentiles of the times for each n")
+    query_parser.add_argument("--implementation", help="only this implementation")
+    query_parser.add_argument("--n", type=int, help="only this n")
+    query_parser.add_argument("--metric", default="action", help="action, keygen, setup, or total")
+    query_parser.add_argument("--percentiles", nargs="+", type=float, default=[50, 90, 99])
+    query_parser.add_argument("--by-run", action="store_true", help="one line per run instead of over every run")
+    regression_parser = commands.add_parser("regressions", help="compare the latest runs with the ones before")
+    regression_parser.add_argument("--implementation", help="only this implementation")
+    regression_parser.add_argument("--metric", default="action", help="action, keygen, setup, or total")
+    regression_parser.add_argument("--window", type=int, default=5, help="number of earlier runs in the baseline")
+    regression_parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown of a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    connection = connect(args.database)
+    try:
+        if args.command == "ingest":
+            files, count = ingest(connection, args.directory)
+            print(f"Ingested {count} measurements from {files} new or changed files into {args.database}")
+        elif args.command == "runs":
+            print_runs(connection)
+        elif args.command == "query":
+            print_query(connection, args)
+        else:
+            found = regressions(connection, args.metric, args.implementation, args.window, args.threshold)
+            for regression in found:
+                print(f"REGRESSION {regression['implementation']} n = {regression['n']} {regression['metric']}: "
+                      f"median {regression['median'] * 1000:.3f} ms in run {regression['run']} vs baseline "
+                      f"{regression['baseline'] * 1000:.3f} ms ({regression['ratio']:.2f}x, {regression['series']})")
+            if not found:
+                print("No regressions")
+            return 1 if found else 0
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+from sage.all import *
+import sys
+
+sys.path.append("..")
+from csidh import CSIDH
+from csidh_ct import CSIDH_CT
+
+# Cross-check the Sage-free group actions against the original Sage implementations.
+# The reference actions below are the original Weierstrauss-form group actions of csidh.py and csidh_ct.py,
+# run on the parameters of an instance. For each n, a random private key is applied to the same public key
+# with both the instance's group_action and the reference, and the resulting coefficients must agree.
+# This is the only part of the repository that needs Sage.
+
+start_N = 5
+end_N = 15
+
+
+# Converts a curve of the form y^2 = x^3 + Ax^2 + x to simplified Weierstrauss form
+def convert_to_weierstrauss(F, A):
+    p = F.order()
+    a = (3 - A**2) * pow(3 * 1, -1, p)
+    b = (2 * A**3 - 9*A) * pow(27 * 1, -1, p)
+    return EllipticCurve(F, [a, b])
+
+
+# Converts a curve from simplified Weierstrauss form back to A from the form y^2 = x^3 + Ax^2 + x
+def convert_from_weierstrauss(E):
+    a = E.a4()
+    b = E.a6()
+    F = E.base_field()
+    R = PolynomialRing(F, name="z")
+    z = R.gens()[0]
+    roots = (z**3 + a*z + b).roots()
+    assert len(roots) > 0
+    r = roots[0][0]
+    s = (3*r**2 + a).sqrt() ** (-1)
+    return -3 * (-1)**s.is_square() * r * s
+
+
+# Apply the CSIDH group action using Sage's Weierstrauss curves
+def group_action_reference(csidh, key):
+    # Set up parameters
+    e_list = key["private"].copy()              # List of exponents of prime ideals
+    p = int(csidh.p)                            # The prime to use for the group acton
+    F = GF(p)                                   # Prime field with orer p
+    A = F(key["public"])                        # Coefficient for elliptic curve
+    E = convert_to_weierstrauss(F, A)
+    l_primes = csidh.l_primes                   # List of small primes
+
+    # Return the base curve if each e_i = 0
+    if all(e == 0 for e in e_list):
+        return A
+
+    # Apply the ideal corresponding to each prime l_i and exponent e_i
+    # Uses a loop structure to apply each idela the right number of times until no more exponents remain
+    while True:
+        # If no exponent is positive, then end and return E
+        if all(e == 0 for e in e_list):
+            break
+
+        # Get a non-zero random element of F
+        x = F.random_element()
+        while x.is_zero():
+            x = F.random_element()
+
+        # Set s to the Kronecker symbol of r for p
+        r = F(x**3 + A*x**2 + x)
+        s = kronecker_symbol(r, p)
+        assert (2 * is_square(r)) - 1 == s
+
+        # Create a set of all non-zero indices
+        S = [i for i, e in enumerate(e_list) if sign(e) == s]
+        if len(S) == 0:
+            continue
+        if s == -1:
+            E = E.quadratic_twist()
+
+        # Get a random point on the curve and get the product of all elements
+        while True:
+            y = E.random_element()
+            if not y.is_zero():
+                break
+        x = y.xy()[0]
+        k = prod(l_primes[i] for i in S)
+        P = E.lift_x(x)
+
+        # Ensure that p + 1 divides k and define Q = ((p + 1) / k) * P
+        assert (p + 1) % k == 0
+        Q = ((p + 1) // k) * P
+
+        # Apply the isogeny corresponding to each l_prime power to compute E_B
+        for i in S:
+            assert k % l_primes[i] == 0
+            R = (k // l_primes[i]) * Q
+            if R.is_zero():
+                continue
+            phi = E.isogeny(R)
+            E = phi.codomain()
+            Q = phi(Q)
+            assert k % l_primes[i] == 0
+            k = k // l_primes[i]
+            e_list[i] -= s
+        if s == -1:
+            E = E.quadratic_twist()
+    return convert_from_weierstrauss(E)
+
+
+# Compare both implementations on random keys for each n
+# The dummy isogenies of CSIDH_CT do not change the curve, so its result must match the reference action too
+def test_program():
+    for n in range(start_N, end_N + 1):
+        for Implementation in (CSIDH, CSIDH_CT):
+            csidh = Implementation(n)
+            public = csidh.a_key["public"]
+            private = csidh.b_key["private"]
+            result = csidh.group_action({"public": public, "private": private})
+            reference = group_action_reference(csidh, {"public": public, "private": private})
+            print(Implementation.__name__, n, result, reference)
+            assert int(result) == int(reference)
+
+
+if __name__ == "__main__":
+    test_program()
@@ -0,0 +1,60 @@
+from time import perf_counter
+import random
+import sys
+import os
+import json
+
+sys.path.append("..")
+from csidh import CSIDH
+from csidh_ct import CSIDH_CT
+
+# Compare the throughput of public key validation with the throughput of the group action.
+# For each n, a set of valid public keys is generated, and each key is validated once with an empty cache,
+# once more from the cache, and used in a group action with a random private key. Random coefficients, which
+# are almost never supersingular, are validated too, to time the rejection of bad keys.
+
+n_values = [10, 20, 40, 74]     # Numbers of primes to test
+keys = 10                       # Number of public keys per n
+
+results_dir = "../Results/validation_benchmark"
+
+
+# Time a function over a list of inputs, returning the number of calls per second
+def throughput(f, inputs):
+    start = perf_counter()
+    for x in inputs:
+        f(x)
+    return len(inputs) / (perf_counter() - start)
+
+
+# Measure validation and group action throughput for one implementation and n
+def run_benchmark(Implementation, n):
+    csidh = Implementation(n)
+    public = [csidh.gen_key(5)["public"] for _ in range(keys)]
+    bad = [random.randrange(csidh.p) for _ in range(keys)]
+
+    csidh._validated.clear()
+    uncached = throughput(csidh.validate_public, public)
+    cached = throughput(csidh.validate_public, public)
+    rejected = throughput(csidh.validate_public, bad)
+    actions = throughput(lambda A: csidh.group_action({"public": A, "private": csidh.gen_key(5)["private"]}), public[:3])
+    result = {"validate": uncached, "validate_cached": cached, "reject": rejected, "group_action": actions}
+    print(f"{Implementation.__name__} n = {n}: {uncached:.1f} validations/s, {rejected:.1f} rejections/s, "
+          f"{actions:.2f} group actions/s ({actions / uncached * 100:.1f}% of an action per validation)")
+    return result
+
+
+# Save the throughputs
+def save_data(data):
+    if not os.path.exists(results_dir):
+        os.makedirs(results_dir)
+    path = os.path.join(results_dir, "validation_benchmark.json")
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+
+
+if __name__ == "__main__":
+    data = {}
+    for Implementation in (CSIDH, CSIDH_CT):
+        data[Implementation.__name__] = {n: run_benchmark(Implementation, n) for n in n_values}
+    save_data(data)
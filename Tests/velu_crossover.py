@@ -0,0 +1,80 @@
+from time import perf_counter
+import sys
+import os
+import json
+
+sys.path.append("..")
+from csidh import CSIDH
+from montgomery import curve_from_a, is_infinity, xMUL, xISOG, random_x
+from velusqrt import xISOG_sqrt
+
+# Compare classic Velu against square-root Velu for every prime of a parameter set.
+# For each l in l_primes a kernel point of order l is sampled on a supersingular curve and both formulas
+# compute the codomain and push one point through the isogeny. The crossover is the smallest l from which
+# square-root Velu stays faster for every larger prime, and is a good value for sqrt_velu_threshold.
+
+N = 100             # Number of primes in the parameter set
+reps = 20           # Number of timed repetitions per prime and formula
+
+results_dir = "../Results/velu_crossover"
+
+
+# Sample a point of order l on the curve
+def kernel_point(curve, l, p):
+    while True:
+        K = xMUL((random_x(p), 1), (p + 1) // l, curve, p)
+        if not is_infinity(K, p):
+            return K
+
+
+# Time an isogeny formula by its median over several repetitions
+def time_isogeny(isogeny, curve, K, l, p):
+    times = []
+    P = (random_x(p), 1)
+    for _ in range(reps):
+        start = perf_counter()
+        isogeny(curve, K, l, [P], p)
+        times.append(perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2]
+
+
+# Measure both formulas for each prime and find the crossover
+def find_crossover(n):
+    csidh = CSIDH(n)
+    p = csidh.p
+    curve = curve_from_a(0, p)
+    timings = {}
+    for l in csidh.l_primes:
+        if l < 5:
+            continue
+        K = kernel_point(curve, l, p)
+        classic = time_isogeny(xISOG, curve, K, l, p)
+        sqrt = time_isogeny(xISOG_sqrt, curve, K, l, p)
+        timings[l] = {"classic": classic, "sqrt": sqrt}
+        print(f"l = {l}: classic = {classic * 1e3:.3f} ms, sqrt = {sqrt * 1e3:.3f} ms")
+
+    # The crossover is the first prime after the last one where classic Velu still wins
+    crossover = None
+    for l in timings:
+        if timings[l]["classic"] <= timings[l]["sqrt"]:
+            crossover = None
+        elif crossover is None:
+            crossover = l
+    return timings, crossover
+
+
+# Save the timings and the crossover point
+def save_data(data, n):
+    if not os.path.exists(results_dir):
+        os.makedirs(results_dir)
+    path = os.path.join(results_dir, "velu_crossover_" + str(n) + ".json")
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    timings, crossover = find_crossover(n)
+    print("Crossover: " + str(crossover))
+    save_data({"n": n, "timings": timings, "crossover": crossover}, n)
@@ -0,0 +1,39 @@
+from multiprocessing import Pool
+
+# Run many independent group actions over a process pool
+#
+# The instance is sent to each worker once, through the pool initializer, so a task only carries the key
+# itself: a list of exponents and the public coefficient as a plain integer. Results come back as plain
+# integers, like the results of group_action.
+
+_instance = None                                    # The instance shared with each worker process
+
+
+# Receive the shared instance once per worker process
+def _init_worker(instance):
+    global _instance
+    _instance = instance
+
+
+# Apply the group action for one key in a worker process
+def _group_action(key):
+    return int(_instance.group_action(key))
+
+
+# Apply the group action for one indexed key, keeping the index so unordered results can be matched up
+def _indexed_group_action(item):
+    index, key = item
+    return index, int(_instance.group_action(key))
+
+
+# Apply the group action of instance to every key in keys using a pool of worker processes.
+# Yields the results in the order of keys, or (index, result) pairs as they finish when ordered is False.
+def group_action_many(instance, keys, processes=None, chunksize=1, ordered=True):
+    tasks = ({"public": int(key["public"]), "private": list(key["private"])} for key in keys)
+    with Pool(processes, initializer=_init_worker, initargs=(instance,)) as pool:
+        if ordered:
+            for result in pool.imap(_group_action, tasks, chunksize):
+                yield result
+        else:
+            for index, result in pool.imap_unordered(_indexed_group_action, enumerate(tasks), chunksize):
+                yield index, result
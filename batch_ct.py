@@ -0,0 +1,250 @@
+import numpy as np
+from math import prod
+from montgomery import curve_from_a, normalize, xMUL, elligator
+from strategy import strategy_walk
+
+# Run many constant-time group actions in lockstep, one NumPy operation per field operation for the whole batch
+#
+# The operations of a constant-time action do not depend on the private key, so B actions can share one
+# sequence of operations. A batch of B field elements is stored as a Lanes object holding an (L, B) array of
+# limbs of up to 28 bits in Montgomery form, one column per action, and Lanes supports the same +, -, *, % and
+# three-argument pow as the integers of fields.py. The formulas in montgomery.py, velusqrt.py and strategy.py
+# therefore run unchanged on a whole batch, and each multiplication costs O(L) NumPy calls instead of B
+# Python big-integer operations. Wherever the actions of a batch must differ, the result is chosen lane by
+# lane with a mask. Only the Elligator 2 sampling at the start of each round, which is random rather than
+# secret, is done lane by lane on plain integers.
+
+class LimbField():
+    # The prime field F_p for a batch of the given number of lanes
+    # Limbs are kept below 2^(radix + 1) rather than fully normalized, and the radix is the largest for which the
+    # schoolbook sums of a multiplication still fit in an int64
+    def __init__(self, p, lanes):
+        self.p = int(p)
+        self.lanes = lanes
+        for radix in range(28, 15, -1):
+            limbs = (self.p.bit_length() + 2) // radix + 1          # Makes R = 2^(radix * limbs) larger than 4p
+            if 6 * limbs << (2 * radix) <= 1 << 63:
+                break
+        self.radix = radix
+        self.mask = (1 << radix) - 1
+        self.limbs = limbs
+        self.R = 1 << (radix * limbs)
+        self.p_inv = -pow(self.p, -1, 1 << radix) % (1 << radix)
+        self.p_limbs = self.split([self.p])
+        self.constants = {}
+        self.carry_rounds = 1                                       # Rounds of partial_carry to go below 2^(radix + 1)
+        bits = 63
+        while bits - radix >= radix:
+            bits -= radix
+            self.carry_rounds += 1
+
+    # Split a list of non-negative integers below R into an (L, B) array of limbs
+    def split(self, values):
+        values = np.array([int(v) for v in values], dtype=object)
+        return np.array([(values >> (self.radix * j)) & self.mask for j in range(self.limbs)], dtype=np.int64)
+
+    # Convert a list of one integer per lane into a batch
+    def __call__(self, values):
+        return Lanes(self, self.split([int(v) * self.R % self.p for v in values]))
+
+    # The same integer in every lane, cached since the formulas use a handful of small constants
+    def constant(self, c):
+        c = int(c) % self.p
+        if c not in self.constants:
+            self.constants[c] = self([c] * self.lanes)
+        return self.constants[c]
+
+    # Convert a batch back into a list of one integer per lane
+    def to_ints(self, x):
+        limbs = self.canonical(self.mul(x.limbs, self.split([1] * self.lanes)))
+        values = np.zeros(self.lanes, dtype=object)
+        for j in reversed(range(self.limbs)):
+            values = (values << self.radix) + limbs[j].astype(object)
+        return [int(v) for v in values]
+
+    # Propagate the carries of x from each limb to the next in place, fully normalizing every limb
+    def carry(self, x):
+        for j in range(len(x) - 1):
+            x[j + 1] += x[j] >> self.radix
+            x[j] &= self.mask
+        return x
+
+    # Propagate the carries of a non-negative x from every limb at once, a few times, which leaves each limb below
+    # 2^(radix + 1) with far fewer NumPy calls than a full carry
+    def partial_carry(self, x):
+        for _ in range(self.carry_rounds):
+            c = x[:-1] >> self.radix
+            x[:-1] &= self.mask
+            x[1:] += c
+        return x
+
+    # Subtract m * p from the lanes of x whose value is at least m * p, normalizing the limbs of the result
+    def subtract(self, x, m):
+        x = self.carry(x)
+        y = self.carry(x - m * self.p_limbs)
+        return np.where(y[-1] < 0, x, y)
+
+    # Values are kept in [0, 2p), which Montgomery multiplication preserves since R > 4p, and only brought
+    # into [0, p) when they are compared or converted back
+    def canonical(self, x):
+        return self.subtract(x.copy(), 1)
+
+    def add(self, x, y):
+        return self.subtract(x + y, 2)
+
+    def sub(self, x, y):
+        return self.subtract(x - y + 2 * self.p_limbs, 2)
+
+    # Montgomery multiplication x * y / R, with schoolbook products and word-by-word reduction over all lanes
+    def mul(self, x, y):
+        L = self.limbs
+        t = np.zeros((2 * L + 1, max(x.shape[1], y.shape[1])), dtype=np.int64)
+        for i in range(L):
+            t[i:i + L] += x[i] * y
+        for i in range(L):
+            m = (t[i] & self.mask) * self.p_inv & self.mask
+            t[i:i + L] += m * self.p_limbs
+            t[i + 1] += t[i] >> self.radix
+        return self.partial_carry(t[L:])[:L]
+
+
+class Lanes():
+    __slots__ = ("field", "limbs")
+    __hash__ = None
+
+    def __init__(self, field, limbs):
+        self.field = field
+        self.limbs = limbs
+
+    # Convert the other operand of an arithmetic operation to a batch
+    def coerce(self, other):
+        if isinstance(other, Lanes):
+            return other
+        return self.field.constant(other)
+
+    def __add__(self, other):
+        return Lanes(self.field, self.field.add(self.limbs, self.coerce(other).limbs))
+
+    def __radd__(self, other):
+        return self + other
+
+    def __sub__(self, other):
+        return Lanes(self.field, self.field.sub(self.limbs, self.coerce(other).limbs))
+
+    def __rsub__(self, other):
+        return self.coerce(other) - self
+
+    def __neg__(self):
+        return 0 - self
+
+    def __mul__(self, other):
+        return Lanes(self.field, self.field.mul(self.limbs, self.coerce(other).limbs))
+
+    def __rmul__(self, other):
+        return self * other
+
+    # Elements are always kept below 2p, so reducing modulo p does nothing
+    def __mod__(self, p):
+        return self
+
+    # Square and multiply, with negative exponents through Fermat's little theorem
+    def __pow__(self, e, mod=None):
+        e = int(e)
+        if e < 0:
+            e = e % (self.field.p - 1)
+        if e == 0:
+            return self.field.constant(1)
+        result = self
+        for bit in bin(e)[3:]:
+            result = result * result
+            if bit == "1":
+                result = result * self
+        return result
+
+    # A batch equals a value only when every lane does, so a branch on a comparison is taken for the whole batch
+    def __eq__(self, other):
+        return bool(np.all(self.field.canonical(self.limbs) == self.field.canonical(self.coerce(other).limbs)))
+
+    def __bool__(self):
+        return not self == 0
+
+    # The lanes that are zero, as a boolean array
+    def is_zero(self):
+        return np.all(self.field.canonical(self.limbs) == 0, axis=0)
+
+
+# Choose the lanes of x where mask is set and the lanes of y elsewhere, for pairs of batches such as points and curves
+def select(mask, x, y):
+    return tuple(Lanes(a.field, np.where(mask, a.limbs, b.limbs)) for a, b in zip(x, y))
+
+
+# Apply the group action of a CSIDH_CT instance to every key in keys, in lockstep batches of at most lanes keys
+# Gives the same results, in the same order, as calling instance.group_action on each key, and refuses the same keys
+def group_action_lockstep(instance, keys, lanes=256):
+    keys = list(keys)
+    for key in keys:
+        instance.check_private(key["private"])
+        if not instance.validate_public(key["public"]):
+            raise ValueError("The public key is not a supersingular curve")
+    results = []
+    for start in range(0, len(keys), lanes):
+        results += _group_action_batch(instance, keys[start:start + lanes])
+    return results
+
+
+# Apply the group action to one batch of keys, following CSIDH_CT.group_action_two_point in every lane
+# The dummy mode is the special case with no isogenies on the twist, which only needs the point on the curve.
+def _group_action_batch(instance, keys):
+    p = instance.p
+    l_primes = instance.l_primes
+    F = LimbField(p, len(keys))
+    e = np.array([key["private"] for key in keys], dtype=np.int64).T
+    b = np.array(instance.bounds, dtype=np.int64)[:, None]
+    if instance.mode == "dummy":
+        plus, minus, dummy = e, np.zeros_like(e), 2*b - e
+    elif instance.mode == "oayt":
+        plus, minus, dummy = np.maximum(e - b, 0), np.maximum(b - e, 0), b - np.abs(e - b)
+    else:
+        plus, minus, dummy = e, 2*b - e, np.zeros_like(e)
+    two_point = instance.mode != "dummy"
+    k = 4 * prod(l for l, m in zip(l_primes, instance.bounds) if m == 0)
+
+    curves = [curve_from_a(instance.F(key["public"]), p) for key in keys]
+    curve = (F([a for a, _ in curves]), F([d for _, d in curves]))
+    while True:
+        # Continue while any lane still has isogenies to apply
+        S = [i for i in range(len(l_primes)) if np.any(plus[i] + minus[i] + dummy[i] > 0)]
+        if len(S) == 0:
+            break
+
+        # Sample a point on each curve and its twist, lane by lane, and remove the primes every lane is done with
+        points = [elligator(lane, instance.F) for lane in zip(F.to_ints(curve[0]), F.to_ints(curve[1]))]
+        T = []
+        for side in range(2 if two_point else 1):
+            P = (F([P[side][0] for P in points]), F([P[side][1] for P in points]))
+            T.append(xMUL(P, k, curve, p))
+
+        # Compute one isogeny for the whole batch at each leaf, keeping it only in the lanes where it is real
+        def leaf(curve, i, K, carried):
+            l = l_primes[i]
+            real = plus[i] + minus[i] > 0
+            twist = (plus[i] == 0) & (minus[i] > 0)
+            K = select(twist, K[1], K[0]) if two_point else K[0]
+            step = ~K[1].is_zero() & (plus[i] + minus[i] + dummy[i] > 0)
+            codomain, images = instance.isogeny(curve, K, l, carried)
+            curve = select(step & real, codomain, curve)
+            carried = [select(step & real, image, Q) for Q, image in zip(carried, images)]
+            carried = [xMUL(Q, l, curve, p) for Q in carried]
+            plus[i] -= step & real & ~twist
+            minus[i] -= step & real & twist
+            dummy[i] -= step & ~real
+            return curve, carried
+
+        curve, _ = strategy_walk(curve, tuple(T), S, [], instance.strategies, l_primes, p, leaf)
+
+        # Primes that every lane is done with no longer need to be kept in the points
+        for i in S:
+            if not np.any(plus[i] + minus[i] + dummy[i] > 0):
+                k = k * l_primes[i]
+
+    return [int(normalize(lane, p)) for lane in zip(F.to_ints(curve[0]), F.to_ints(curve[1]))]
@@ -0,0 +1,131 @@
+import heapq
+import math
+
+from montgomery import curve_from_a, is_infinity, xMUL, elligator
+from counters import counting
+
+# Per-prime exponent bounds for CSIDH_CT
+#
+# A private key of CSIDH_CT has an exponent in [0, 2 m_i] for the prime l_i, so the key space has prod(2 m_i + 1)
+# keys, and every action computes a number of real and dummy isogenies of degree l_i that only depends on m_i:
+# 2 m_i in the "dummy" and "dummy_free" modes and m_i in the "oayt" mode, over about as many rounds as the largest
+# bound. With the same bound for every prime, the largest degrees get as many isogenies as the smallest ones,
+# although an isogeny of degree l costs O(l) field operations (O(sqrt(l)) with square-root Velu). As suggested by
+# Meyer, Campos, and Reith, optimal_bounds instead finds the bounds that reach a key space of a given size at the
+# lowest total cost, from the field multiplications and squarings of each degree counted on the formulas the instance
+# runs. Counts do not depend on the machine or the load, so every instance of a parameter set and mode gets the same
+# bounds, and a private key gives the same public key on each of them. Tests/optimal_bounds.py prints them.
+
+
+# Get the size in bits of the key space of a list of bounds
+def key_space_bits(bounds):
+    return sum(math.log2(2 * m + 1) for m in bounds)
+
+
+# Get the expected number of rounds per unit of bound of each prime
+# A round only finds a kernel point of order l with probability 1 - 1/l, so small primes need the most rounds.
+def round_weights(l_primes):
+    return [l / (l - 1) for l in l_primes]
+
+
+# Estimate the cost of an action with the given bounds, up to the factor 2 of the "dummy" and "dummy_free" modes
+def bounds_cost(bounds, costs, round_cost=0.0, weights=None):
+    if weights is None:
+        weights = [1] * len(bounds)
+    return sum(c * m for c, m in zip(costs, bounds)) + round_cost * max((w * m for w, m in zip(weights, bounds)), default=0)
+
+
+# Count the field multiplications and squarings of a function
+def _operations(f):
+    with counting() as counts:
+        f()
+    return counts.ops["mul"] + counts.ops["sqr"]
+
+
+# Find a point of order l on the curve
+def _kernel_point(curve, l, F):
+    p = F.p
+    while True:
+        P, _ = elligator(curve, F)
+        K = xMUL(P, (p + 1) // l, curve, p)
+        if not is_infinity(K, p):
+            return K
+
+
+# Count the field operations of one unit of bound for each prime of a CSIDH_CT instance
+# One unit is one isogeny of degree l_i pushing the points of a round through it and multiplying them by l_i, plus
+# the multiplications by l_i along the strategy in every round while the prime is active, which happen about once
+# per level of the strategy.
+def degree_costs(instance):
+    p = instance.p
+    curve = curve_from_a(instance.F(0), p)
+    width = 1 if instance.mode == "dummy" else 2
+    depth = math.log2(instance.n)
+    costs = []
+    for l, w in zip(instance.l_primes, round_weights(instance.l_primes)):
+        K = _kernel_point(curve, l, instance.F)
+        isogeny = _operations(lambda: [xMUL(Q, l, curve, p) for Q in instance.isogeny(curve, K, l, [K] * width)[1]])
+        multiplication = _operations(lambda: xMUL(K, l, curve, p))
+        costs.append(isogeny + w * width * depth * multiplication)
+    return costs
+
+
+# Count the field operations of the fixed work of a round of a CSIDH_CT instance: sampling the points and clearing a cofactor
+# of about half the bits of p from each of them
+def round_cost(instance):
+    p = instance.p
+    curve = curve_from_a(instance.F(0), p)
+    width = 1 if instance.mode == "dummy" else 2
+    cofactor = 4 * math.prod(instance.l_primes[:instance.n // 2])
+    return _operations(lambda: [xMUL(elligator(curve, instance.F)[0], cofactor, curve, p) for _ in range(width)])
+
+
+# Find the bounds with a key space of at least bits bits that minimize bounds_cost, with no bound above max_bound
+# For each number of rounds R, the bound of each prime is capped at R divided by its round weight, and bounds are
+# raised one at a time on the prime that adds the most bits per unit of cost, which is optimal for a key space that
+# grows concavely in each bound; they are then lowered again on the most expensive primes while the key space stays
+# large enough. Bounds of 0 leave a prime out of the key entirely.
+def optimal_bounds(costs, bits, round_cost=0.0, weights=None, max_bound=20):
+    n = len(costs)
+    if weights is None:
+        weights = [1] * n
+    best, best_cost = None, None
+    for R in range(1, 2 * max_bound + 1):
+        caps = [min(int(R / w), max_bound) for w in weights]
+        if key_space_bits(caps) < bits - 1e-9:
+            continue
+        bounds = [0] * n
+        total = 0.0
+        heap = [(-math.log2(3) / costs[i], i) for i in range(n) if caps[i] > 0]
+        heapq.heapify(heap)
+        while total < bits - 1e-9:
+            _, i = heapq.heappop(heap)
+            total += math.log2(2 * bounds[i] + 3) - math.log2(2 * bounds[i] + 1)
+            bounds[i] += 1
+            if bounds[i] < caps[i]:
+                gain = math.log2(2 * bounds[i] + 3) - math.log2(2 * bounds[i] + 1)
+                heapq.heappush(heap, (-gain / costs[i], i))
+
+        # Give back any units that the last steps made unnecessary, starting from the most expensive primes
+        for i in sorted(range(n), key=lambda i: -costs[i]):
+            while bounds[i] > 0:
+                loss = math.log2(2 * bounds[i] + 1) - math.log2(2 * bounds[i] - 1)
+                if total - loss < bits - 1e-9:
+                    break
+                total -= loss
+                bounds[i] -= 1
+
+        cost = bounds_cost(bounds, costs, round_cost, weights)
+        if best_cost is None or cost < best_cost:
+            best, best_cost = bounds, cost
+    if best is None:
+        raise ValueError("No bounds up to " + str(max_bound) + " reach a key space of " + str(bits) + " bits")
+    return best
+
+
+# Find the optimal bounds for a CSIDH_CT instance, by default for the key space of the same bound for every prime
+def optimize_bounds(instance, bits=None, max_bound=20):
+    if bits is None:
+        bits = key_space_bits([instance.default_bound] * instance.n)
+    costs = degree_costs(instance)
+    return optimal_bounds(costs, bits, round_cost(instance), round_weights(instance.l_primes), max_bound)
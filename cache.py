@@ -0,0 +1,144 @@
+from collections import OrderedDict
+import hashlib
+import secrets
+import json
+import os
+
+# A bounded cache of group action results, for workloads that see the same keys again
+#
+# CSIDH and CSIDH_CT take an ActionCache with cache=..., and then look up every group action before computing it:
+# static keys re-derived with the base curve 0 and handshakes with peers seen before come back in microseconds.
+# Entries are indexed by the context of the instance (its class, parameter set and, for CSIDH_CT, mode and
+# bounds, hashed by context()), the coefficient A acted on, and a keyed BLAKE2b digest of the exponents, so the
+# index never holds a private key in plaintext. The digest key is random per cache unless the cache is persistent.
+# The least recently used entry is evicted beyond maxsize entries, and hits, misses and evictions are counted.
+#
+# With a path, derived public keys (actions on the base curve 0) are also appended to a JSON lines file and read
+# back by the next cache with the same path, so static keys survive restarts. The digest key of a persistent cache
+# is kept next to it in path + ".key", readable only by its owner; without it the file cannot be matched to any
+# private key, and the shared secrets of other actions are never written to disk.
+
+
+# Hash the parts that decide the result of a group action for a given key into a short identifier
+def context(*parts):
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+class ActionCache():
+    def __init__(self, maxsize=4096, path=None, secret=None):
+        self.maxsize = maxsize                      # Largest number of entries kept in memory
+        self.path = path                            # JSON lines file of derived public keys, or None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()               # Results by (context, A, digest), least recently used first
+        if secret is None:
+            secret = self._read_secret() if path else secrets.token_bytes(32)
+        self._secret = secret                       # Key of the exponent digests
+        if path:
+            self._load()
+
+    # Read the digest key of a persistent cache, creating it on first use
+    # The key is written to a temporary file and linked into place, so a process never reads a partly written key,
+    # and when two processes create it at once the one that loses the race reads the key of the other.
+    def _read_secret(self):
+        key_path = self.path + ".key"
+        try:
+            with open(key_path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        secret = secrets.token_bytes(32)
+        directory = os.path.dirname(key_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = key_path + "." + str(os.getpid()) + ".tmp"
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(secret)
+        try:
+            os.link(temporary, key_path)
+        except FileExistsError:
+            with open(key_path, 'rb') as f:
+                secret = f.read()
+        finally:
+            os.unlink(temporary)
+        return secret
+
+    # Read the derived public keys of a persistent cache, keeping the latest maxsize and compacting the file when
+    # most of it would be thrown away
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    entry = (record["context"], 0, record["digest"])
+                    public = int(record["public"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                lines += 1
+                self._entries[entry] = public
+                self._entries.move_to_end(entry)
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        if lines > 2 * len(self._entries):
+            tmp = self.path + ".tmp"
+            with open(tmp, 'w') as f:
+                for (ctx, _, digest), public in self._entries.items():
+                    f.write(json.dumps({"context": ctx, "digest": digest, "public": public}) + "\n")
+            os.replace(tmp, self.path)
+
+    # Digest a list of exponents with the key of the cache
+    def digest(self, private):
+        data = ",".join(str(int(e)) for e in private).encode()
+        return hashlib.blake2b(data, key=self._secret, digest_size=16).hexdigest()
+
+    # Get the result of the action of private on A in the given context, or None if it is not cached
+    def get(self, ctx, A, private):
+        entry = (ctx, int(A), self.digest(private))
+        result = self._entries.get(entry)
+        if result is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(entry)
+        self.hits += 1
+        return result
+
+    # Remember the result of the action of private on A in the given context
+    def put(self, ctx, A, private, result):
+        entry = (ctx, int(A), self.digest(private))
+        if entry in self._entries:
+            self._entries.move_to_end(entry)
+            return
+        self._entries[entry] = int(result)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        if self.path and entry[1] == 0:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            # One write per line in append mode, so that worker processes sharing the file do not mix lines
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({"context": ctx, "digest": entry[2], "public": int(result)}) + "\n")
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Report the size of the cache and its hits, misses, and evictions so far
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,333 @@
+from math import isqrt, pi
+
+from fields import jacobi, primes_first_n
+from prime_search import isogeny_cost, round_cost
+
+# The relation lattice of the class group acted on by CSIDH, and the reduction of private keys with it
+#
+# The curves of CSIDH have endomorphism ring Z[sqrt(-p)], whose class group is that of the binary quadratic forms of
+# discriminant D = -4p. The ideal (l, sqrt(-p) - 1) that a positive exponent of l acts with is the form
+# (l, 2, (p + 1)/l), so the exponent vectors e with prod l_i^e_i = 1 form a lattice of rank n, and two keys that
+# differ by a vector of this lattice give the same public key. relation_lattice finds it as in CSI-FiSh, but with
+# baby-step giant-step instead of a subexponential class group computation, which is fine for p up to about
+# max_bits:
+#   1. The order of the class of l_1 is found among the multiples near the class number, which the analytic class
+#      number formula estimates to a few percent, and the orders of the other classes are found from it.
+#   2. The class of largest order E is taken as a base, and the discrete logarithm of each other class, or of its
+#      smallest power in the group generated by the classes before it when the group is not cyclic, gives one
+#      relation, so the relations form a triangular basis.
+#   3. This basis is reduced with LLL.
+# A KeyReducer then moves each private key to a short key of the same class: Babai's nearest plane algorithm finds a
+# nearby lattice vector, and adding or subtracting basis vectors while that lowers the estimated cost of the action
+# (the cost of the isogenies of each degree plus a cost per round) finishes the reduction. The reduced keys have
+# about log2(E)/n bits of spread per prime instead of log2(11) for exponents in [-5, 5], so the action gets much
+# shorter for small n, where E is far smaller than 11^n.
+
+max_bits = 80                                       # Largest p whose class group relation_lattice computes
+
+
+# Reduce the positive definite form (a, b, c): |b| <= a <= c, with b >= 0 if |b| = a or a = c
+def reduce_form(a, b, c):
+    while True:
+        if not -a < b <= a:
+            k = (a - b) // (2 * a)
+            b, c = b + 2 * a * k, a * k * k + b * k + c
+        if a > c:
+            a, b, c = c, -b, a
+            continue
+        if a == c and b < 0:
+            b = -b
+        return (a, b, c)
+
+
+# Compose two reduced forms of the same discriminant (Cohen, Algorithm 5.4.7)
+def compose(f1, f2):
+    if f1[0] > f2[0]:
+        f1, f2 = f2, f1
+    a1, b1, _ = f1
+    a2, b2, c2 = f2
+    s = (b1 + b2) // 2
+    n = b2 - s
+    if a2 % a1 == 0:
+        y1, d = 0, a1
+    else:
+        d, y1, _ = _xgcd(a2, a1)
+    if s % d == 0:
+        x2, y2, d1 = 0, -1, d
+    else:
+        d1, x2, y2 = _xgcd(s, d)
+        y2 = -y2
+    v1 = a1 // d1
+    v2 = a2 // d1
+    r = (y1 * y2 * n - x2 * c2) % v1
+    b3 = b2 + 2 * v2 * r
+    a3 = v1 * v2
+    c3 = (c2 * d1 + r * (b2 + v2 * r)) // v1
+    return reduce_form(a3, b3, c3)
+
+
+# Get (g, x, y) with x a + y b = g = gcd(a, b)
+def _xgcd(a, b):
+    x0, y0, x1, y1 = 1, 0, 0, 1
+    while b:
+        q, a, b = a // b, b, a % b
+        x0, x1 = x1, x0 - q * x1
+        y0, y1 = y1, y0 - q * y1
+    return a, x0, y0
+
+
+def inverse(f):
+    return reduce_form(f[0], -f[1], f[2])
+
+
+# Raise a form to the power k >= 0 with square-and-multiply, given the identity of its discriminant
+def power(f, k, one):
+    result = one
+    while k:
+        if k & 1:
+            result = compose(result, f)
+        f = compose(f, f)
+        k >>= 1
+    return result
+
+
+class ClassGroup():
+    def __init__(self, p):
+        self.p = p
+        self.D = -4 * p                             # Discriminant of Z[sqrt(-p)]
+        self.one = (1, 0, p)                        # Principal form
+
+    # Get the form of the ideal (l, sqrt(-p) - 1), for a prime l dividing p + 1
+    def prime_form(self, l):
+        return reduce_form(l, 2, (self.p + 1) // l)
+
+    # Estimate the class number with the analytic class number formula, h = sqrt(|D|) L(1, chi_D) / pi, taking the
+    # Euler product of L(1, chi_D) over the first count odd primes
+    def estimate(self, count=4000):
+        L = 1.0
+        for q in primes_first_n(count)[1:]:
+            L /= 1 - jacobi(self.D % q, q) / q
+        return isqrt(-self.D) * L / pi
+
+    # Find the order of f with a multiple of it in the window [low, high] of exponents, or None if there is none
+    # Baby steps f^-j for j < s are matched against giant steps f^(low + s i), so the first match is the smallest
+    # multiple m = low + s i + j in the window, which is then stripped of the factors that it does not need.
+    def order_in_window(self, f, low, high):
+        s = isqrt(high - low) + 1
+        baby = {}
+        g = self.one
+        step = inverse(f)
+        for j in range(s):
+            if j > 0 and g == self.one:
+                return j
+            baby.setdefault(g, j)
+            g = compose(g, step)
+        giant = power(f, s, self.one)
+        g = power(f, low, self.one)
+        for i in range((high - low) // s + 1):
+            if g in baby:
+                return self.exact_order(f, low + s * i + baby[g])
+            g = compose(g, giant)
+        return None
+
+    # Reduce a multiple m of the order of f to the order
+    def exact_order(self, f, m):
+        for q, _ in factor(m):
+            while m % q == 0 and power(f, m // q, self.one) == self.one:
+                m //= q
+        return m
+
+    # Find the order of f, widening the window around the estimated class number until it holds a multiple
+    def order(self, f, estimate):
+        width = 0.05
+        while True:
+            low = max(int(estimate * (1 - width)), 1)
+            high = int(estimate * (1 + width)) + 1
+            m = self.order_in_window(f, low, high)
+            if m is not None:
+                return m
+            if low == 1:
+                raise ValueError("No multiple of the order found below " + str(high))
+            width *= 2
+
+    # Make a function finding discrete logarithms to the base g of order E, or None for forms outside of <g>, with
+    # baby steps for about queries logarithms shared between them
+    def logarithm(self, g, E, queries=1):
+        s = isqrt(E * queries) + 1
+        baby = {}
+        h = self.one
+        for j in range(s):
+            baby.setdefault(h, j)
+            h = compose(h, g)
+        giant = inverse(power(g, s, self.one))
+
+        def log(f):
+            for i in range(E // s + 1):
+                if f in baby:
+                    return (s * i + baby[f]) % E
+                f = compose(f, giant)
+            return None
+        return log
+
+
+# Factor m by trial division, returning (prime, exponent) pairs
+def factor(m):
+    factors = []
+    q = 2
+    while q * q <= m:
+        if m % q == 0:
+            k = 0
+            while m % q == 0:
+                m //= q
+                k += 1
+            factors.append((q, k))
+        q += 1 if q == 2 else 2
+    if m > 1:
+        factors.append((m, 1))
+    return factors
+
+
+# Compute a basis of the lattice of exponent vectors e with prod l_i^e_i = 1 in the class group of Z[sqrt(-p)],
+# reduced with LLL
+# The class group is cyclic more often than not, but not always (it can have 3-rank 2), so the lattice is built one
+# prime at a time: with g the class of largest order E and H the group generated by g and the classes before l_i,
+# t_i is the smallest exponent with l_i^t_i in H, found as g^x times one of the |H|/E elements of H/<g>. This gives a
+# triangular basis, of determinant E * prod t_i, the order of the group generated by every class.
+def relation_lattice(l_primes, p):
+    if p.bit_length() > max_bits:
+        raise ValueError("The class group of a prime of " + str(p.bit_length()) + " bits is too large to compute")
+    group = ClassGroup(p)
+    forms = [group.prime_form(l) for l in l_primes]
+    estimate = group.estimate()
+
+    # Order of each class, from a multiple near the class number or from the largest order found so far
+    orders = []
+    for f in forms:
+        largest = max(orders, default=0)
+        if largest and power(f, largest, group.one) == group.one:
+            orders.append(group.exact_order(f, largest))
+        else:
+            orders.append(group.order(f, estimate))
+    k = orders.index(max(orders))
+    E = orders[k]
+    log = group.logarithm(forms[k], E, len(forms))
+
+    n = len(l_primes)
+    basis = [[E if j == k else 0 for j in range(n)]]
+    cosets = [(group.one, [0] * n)]                 # Elements of H/<g> with the exponents that give them
+    for i in range(n):
+        if i == k:
+            continue
+        t = 1
+        y = forms[i]
+        while True:
+            for w, exponents in cosets:
+                x = log(compose(y, inverse(w)))
+                if x is not None:
+                    break
+            if x is not None:
+                break
+            t += 1
+            y = compose(y, forms[i])
+        row = [-c for c in exponents]
+        row[i] += t
+        row[k] -= x
+        basis.append(row)
+        if t > 1:
+            power_i = group.one
+            grown = []
+            for r in range(t):
+                grown += [(compose(w, power_i), [c + (r if j == i else 0) for j, c in enumerate(exponents)])
+                          for w, exponents in cosets]
+                power_i = compose(power_i, forms[i])
+            cosets = grown
+    return lll(basis)
+
+
+def _dot(u, v):
+    return sum(x * y for x, y in zip(u, v))
+
+
+# Compute the Gram-Schmidt vectors of a basis in floating point, with their squared norms
+def gram_schmidt(basis):
+    vectors = []
+    norms = []
+    for b in basis:
+        v = [float(x) for x in b]
+        for w, norm in zip(vectors, norms):
+            mu = _dot(b, w) / norm
+            v = [x - mu * y for x, y in zip(v, w)]
+        vectors.append(v)
+        norms.append(_dot(v, v))
+    return vectors, norms
+
+
+# Reduce a basis with the LLL algorithm, with the Gram-Schmidt coefficients in floating point
+# Only integral row operations change the basis, so rounding can only make the reduction weaker, never wrong.
+def lll(basis, delta=0.99):
+    basis = [list(b) for b in basis]
+    vectors, norms = gram_schmidt(basis)
+    k = 1
+    while k < len(basis):
+        for j in range(k - 1, -1, -1):
+            q = round(_dot(basis[k], vectors[j]) / norms[j])
+            if q:
+                basis[k] = [x - q * y for x, y in zip(basis[k], basis[j])]
+        vectors, norms = gram_schmidt(basis)
+        mu = _dot(basis[k], vectors[k - 1]) / norms[k - 1]
+        if norms[k] >= (delta - mu * mu) * norms[k - 1]:
+            k += 1
+        else:
+            basis[k - 1], basis[k] = basis[k], basis[k - 1]
+            vectors, norms = gram_schmidt(basis)
+            k = max(k - 1, 1)
+    return basis
+
+
+class KeyReducer():
+    def __init__(self, basis, weights, round_weight=0.0):
+        self.basis = [list(b) for b in basis]       # Reduced basis of the relation lattice
+        self.weights = list(weights)                # Estimated cost of one isogeny of each degree
+        self.round_weight = round_weight            # Estimated cost of a round, paid max |e_i| times
+        self._vectors, self._norms = gram_schmidt(self.basis)
+        self._steps = self.basis + [[-x for x in b] for b in self.basis]
+
+    # Make the reducer for a parameter set with its relation lattice, weighing exponents by the counted cost of
+    # the isogenies of each degree and of a round (see prime_search.py)
+    @classmethod
+    def for_params(cls, params):
+        return cls(params.relations, [isogeny_cost(l, params.n) for l in params.l_primes],
+                   round_cost(params.p.bit_length()))
+
+    # Estimate the cost of the group action of the exponents e
+    def cost(self, e):
+        return sum(w * abs(x) for w, x in zip(self.weights, e)) + self.round_weight * max(abs(x) for x in e)
+
+    # Get a short key in the same class as e: Babai's nearest plane, then basis steps while they lower the cost
+    def reduce(self, e):
+        e = [int(x) for x in e]
+        for b, v, norm in zip(reversed(self.basis), reversed(self._vectors), reversed(self._norms)):
+            q = round(_dot(e, v) / norm)
+            if q:
+                e = [x - q * y for x, y in zip(e, b)]
+        cost = self.cost(e)
+        improved = True
+        while improved:
+            improved = False
+            for b in self._steps:
+                candidate = [x + y for x, y in zip(e, b)]
+                candidate_cost = self.cost(candidate)
+                if candidate_cost < cost:
+                    e, cost, improved = candidate, candidate_cost, True
+        return e
+
+
+# Check that e and f are in the same class, for testing reductions
+def same_class(l_primes, p, e, f):
+    group = ClassGroup(p)
+    total = group.one
+    for l, x, y in zip(l_primes, e, f):
+        g = group.prime_form(l)
+        d = x - y
+        total = compose(total, power(g if d >= 0 else inverse(g), abs(d), group.one))
+    return total == group.one
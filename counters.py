@@ -0,0 +1,169 @@
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+import random as rand
+
+# Operation counters and a cost model for the group actions
+#
+# Counting is off by default: active is None, and the instrumented functions in montgomery.py, velusqrt.py,
+# csidh.py and csidh_ct.py only check that before doing anything. Inside a counting() block, every group
+# action of CSIDH and CSIDH_CT adds to one OpCounts:
+#   ops:        field multiplications ("mul"), squarings ("sqr"), inversions ("inv") and Legendre symbols
+#               ("legendre"), as well as rounds ("rounds"), rounds that computed no isogeny ("idle_rounds"), and
+#               primes whose kernel point was the point at infinity ("kernel_skips")
+#   scalars:    scalar multiplications by the bit length of the scalar
+#   isogenies:  isogenies per degree, split into real and dummy ones
+#   times:      seconds spent in each phase of the actions ("validation", "sampling", "cofactor", "isogenies",
+#               "normalize")
+# Field operation counts follow the formulas as written, so a constant-time dummy isogeny costs as much as a
+# real one. Group actions run in worker processes (batch.py, keypool.py) are not counted.
+#
+# A CostModel turns counts into a predicted runtime from timings of single field operations on the field of a
+# parameter set, so the runtime of an action can be explained in terms of what it did.
+
+active = None                                       # The OpCounts receiving counts, or None when counting is off
+
+
+class OpCounts():
+    def __init__(self):
+        self.ops = Counter()
+        self.scalars = Counter()
+        self.isogenies = {}
+        self.times = Counter()
+
+    # Count field operations
+    def field(self, mul=0, sqr=0, inv=0):
+        self.ops["mul"] += mul
+        self.ops["sqr"] += sqr
+        self.ops["inv"] += inv
+
+    # Count the squarings and multiplications of a square-and-multiply exponentiation by e
+    def power(self, e):
+        self.ops["sqr"] += e.bit_length() - 1
+        self.ops["mul"] += bin(e).count("1") - 1
+
+    def event(self, name, k=1):
+        self.ops[name] += k
+
+    def scalar(self, k):
+        self.scalars[k.bit_length()] += 1
+
+    def isogeny(self, l, real=True):
+        if l not in self.isogenies:
+            self.isogenies[l] = Counter()
+        self.isogenies[l]["real" if real else "dummy"] += 1
+
+    # Add the counts of another OpCounts, for example to total several actions
+    def merge(self, other):
+        self.ops.update(other.ops)
+        self.scalars.update(other.scalars)
+        for l, counts in other.isogenies.items():
+            if l not in self.isogenies:
+                self.isogenies[l] = Counter()
+            self.isogenies[l].update(counts)
+        self.times.update(other.times)
+
+    # Divide every count by k, for example to average several actions
+    def scaled(self, k):
+        result = OpCounts()
+        result.ops = Counter({name: v / k for name, v in self.ops.items()})
+        result.scalars = Counter({bits: v / k for bits, v in self.scalars.items()})
+        result.isogenies = {l: Counter({kind: v / k for kind, v in c.items()}) for l, c in self.isogenies.items()}
+        result.times = Counter({name: v / k for name, v in self.times.items()})
+        return result
+
+    # Convert to plain dictionaries, for example to save as JSON
+    def as_dict(self):
+        return {
+            "ops": dict(self.ops),
+            "scalars": {str(bits): v for bits, v in sorted(self.scalars.items())},
+            "isogenies": {str(l): dict(c) for l, c in sorted(self.isogenies.items())},
+            "times": dict(self.times),
+        }
+
+
+# Count the operations of every group action inside the block, yielding the OpCounts
+# If callback is given, it is called with the OpCounts when the block ends
+@contextmanager
+def counting(callback=None):
+    global active
+    previous = active
+    counts = OpCounts()
+    active = counts
+    try:
+        yield counts
+    finally:
+        active = previous
+        if callback is not None:
+            callback(counts)
+
+
+class _Phase():
+    def __init__(self, counts, name):
+        self.counts = counts
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exc):
+        self.counts.times[self.name] += perf_counter() - self.start
+        return False
+
+
+# Time the block as part of the named phase when counting is on
+def phase(name):
+    if active is None:
+        return nullcontext()
+    return _Phase(active, name)
+
+
+class CostModel():
+    def __init__(self, costs):
+        self.costs = costs                          # Seconds per "mul", "sqr", "inv" and "legendre"
+
+    # Time each field operation on random elements of the field F, by the median over several batches
+    @classmethod
+    def calibrate(cls, F, reps=2000, batches=5):
+        p = F.p
+        xs = [F(rand.randrange(1, p)) for _ in range(reps)]
+        ys = [F(rand.randrange(1, p)) for _ in range(reps)]
+        operations = {
+            "mul": lambda: [x * y % p for x, y in zip(xs, ys)],
+            "sqr": lambda: [x * x % p for x in xs],
+            "inv": lambda: [F.inverse(x) for x in xs],
+            "legendre": lambda: [F.legendre(x) for x in xs],
+        }
+        costs = {}
+        for name, operation in operations.items():
+            times = []
+            for _ in range(batches):
+                start = perf_counter()
+                operation()
+                times.append((perf_counter() - start) / reps)
+            costs[name] = sorted(times)[batches // 2]
+        return cls(costs)
+
+    # Predict the runtime in seconds of the counted operations, and the share of each kind of operation
+    def predict(self, counts):
+        shares = {name: counts.ops[name] * cost for name, cost in self.costs.items()}
+        return sum(shares.values()), shares
+
+
+# Count the operations of instance.group_action averaged over the actions that generate several key pairs
+def average_counts(instance, keys=8):
+    total = OpCounts()
+    for _ in range(keys):
+        with counting() as counts:
+            instance.gen_key(5)
+        total.merge(counts)
+    return total.scaled(keys)
+
+
+# Predict the runtime of one group action for a parameter set from its average operation counts
+def predict_group_action(instance, keys=8, model=None):
+    if model is None:
+        model = CostModel.calibrate(instance.F)
+    counts = average_counts(instance, keys)
+    predicted, shares = model.predict(counts)
+    return predicted, shares, counts
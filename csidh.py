@@ -1,24 +1,67 @@
-from sage.all import *
 import random as rand
 
+from fields import GF
+from montgomery import curve_from_a, normalize, xMUL, xISOG, elligator
+from velusqrt import xISOG_sqrt
+from strategy import strategy_walk
+from params import load_params, load_relations
+from validation import is_supersingular
+from cache import context
+from classgroup import KeyReducer
+from radical import radical_indices, radical_walk, margins
+import batch
+import counters
+
 class CSIDH():
-    def __init__(self, n):
-        self.n = n
-        self.l_primes, self.p, self.F = self.gen_params(n)
-        self.a_key = self.gen_key(5)
-        self.b_key = self.gen_key(5)
-
-    # Generate the parameters l_primes, p, and F_p for the key exchange
-    def gen_params(self, n):
-        l_primes = primes_first_n(n + 1)[1:]
-        p = 4 * prod(l_primes) - 1
-        while not is_prime(p):
-            x = next_prime(l_primes[-1] + 1)
-            l_primes[-1] = x
-            p = 4 * prod(l_primes) - 1
-
-        F = GF(p)
-        return l_primes, p, F
+    sqrt_velu_threshold = 260                       # Isogenies of larger degree use square-root Velu
+    validation_cache_size = 1024                    # Number of public keys whose validity is remembered
+
+    def __init__(self, n, a_key=None, b_key=None, backend=None, cache=None, reduce_keys=False,
+                 radical="auto"):
+        self.params = load_params(n)                # Parameter set for n primes or a preset name, see params.py
+        self.n = self.params.n
+        self.backend = backend                      # Field arithmetic backend, see fields.py
+        self.l_primes, self.p, self.F = self.gen_params()
+        self.strategies = self.params.strategies
+        self.chains = self.params.chains            # Differential addition chain of each prime, see xMUL_dac
+        self._a_key = a_key
+        self._b_key = b_key
+        self._validated = {0: True}                 # Validity of recently seen public keys, oldest first
+        self.cache = cache                          # ActionCache of group action results, or None, see cache.py
+        self.cache_context = context("CSIDH", self.p)
+        self.reducer = None                         # KeyReducer shortening private keys, see classgroup.py
+        if reduce_keys:
+            load_relations(self.params)
+            self.reducer = KeyReducer.for_params(self.params)
+        self.radical = radical_indices(self.l_primes, radical)     # Primes walked with radical isogenies
+        self.radical_auto = radical == "auto"       # Only walk the exponents that would need extra rounds
+
+    # Alice's key pair, generated on first use so that building an instance only costs the parameter search
+    @property
+    def a_key(self):
+        if self._a_key is None:
+            self._a_key = self.gen_key(5)
+        return self._a_key
+
+    @a_key.setter
+    def a_key(self, key):
+        self._a_key = key
+
+    # Bob's key pair, generated on first use
+    @property
+    def b_key(self):
+        if self._b_key is None:
+            self._b_key = self.gen_key(5)
+        return self._b_key
+
+    @b_key.setter
+    def b_key(self, key):
+        self._b_key = key
+
+    # Get the parameters l_primes, p, and F_p for the key exchange from the parameter set
+    def gen_params(self):
+        F = GF(self.params.p, self.backend)
+        return list(self.params.l_primes), F.p, F
 
     # Generate the private and public keys for the key exchange
     def gen_key(self, m):
@@ -29,88 +72,121 @@ class CSIDH():
             "public": public
         }
 
-    # Converts a curve of the form y^2 = x^3 + Ax^2 + x to simplified Weierstrauss form
-    def convert_to_weierstrauss(self, A):
-        a = (3 - A**2) * pow(3 * 1, -1, self.p)
-        b = (2 * A**3 - 9*A) * pow(27 * 1, -1, self.p)
-        return EllipticCurve(self.F, [a, b])
-
-    # Converts a curve from simplified Weierstrauss form back to A from the form y^2 = x^3 + Ax^2 + x
-    def convert_from_weierstrauss(self, E):
-        a = E.a4()
-        b = E.a6()
-        F = E.base_field()
-        R = PolynomialRing(F, name="z")
-        z = R.gens()[0]
-        roots = (z**3 + a*z + b).roots()
-        assert len(roots) > 0
-        r = roots[0][0]
-        s = (3*r**2 + a).sqrt() ** (-1)
-        return -3 * (-1)**s.is_square() * r * s
-
-    # Apply the CSIDH group action
+    # Check that the public key A is a supersingular curve, remembering the answer for recently seen keys
+    def validate_public(self, A):
+        A = int(A)
+        if A in self._validated:
+            return self._validated[A]
+        valid = is_supersingular(A, self.F, self.l_primes)
+        if len(self._validated) >= self.validation_cache_size:
+            del self._validated[next(iter(self._validated))]
+        self._validated[A] = valid
+        return valid
+
+    # Compute the isogeny with kernel generated by K, switching to square-root Velu for large degrees
+    def isogeny(self, curve, K, l, points):
+        if l > self.sqrt_velu_threshold:
+            return xISOG_sqrt(curve, K, l, points, self.p)
+        return xISOG(curve, K, l, points, self.p)
+
+    # Apply the CSIDH group action with x-only arithmetic on the Montgomery curve
     def group_action(self, key):
         # Set up parameters
         e_list = key["private"].copy()              # List of exponents of prime ideals
         A = key["public"]                           # Coefficient for elliptic curve
-        E = self.convert_to_weierstrauss(A)
         p = self.p                                  # The prime to use for the group acton
-        F = self.F                                  # Prime field with orer p
         l_primes = self.l_primes                    # List of small primes
-        
+
+        # Return the result of an action seen before
+        if self.cache is not None:
+            shared = self.cache.get(self.cache_context, A, e_list)
+            if shared is not None:
+                return shared
+
+        # Refuse public keys that are not supersingular curves before doing any work on them
+        with counters.phase("validation"):
+            if not self.validate_public(A):
+                raise ValueError("The public key is not a supersingular curve")
+
+        # Replace the exponents with a shorter vector of the same class
+        if self.reducer is not None:
+            e_list = self.reducer.reduce(e_list)
+
+        # Walk chains of radical isogenies first, on the affine coefficient (see radical.py); with radical="auto"
+        # only for exponents that exceed every other by the margin of their degree, since a chain only beats the
+        # rounds that they would add
+        if self.radical:
+            rounds = max((abs(e) for i, e in enumerate(e_list) if i not in self.radical), default=0)
+            for i in self.radical:
+                if abs(e_list[i]) >= rounds + margins[l_primes[i]] or not self.radical_auto:
+                    A = radical_walk(A, l_primes[i], e_list[i], self.F)
+                    e_list[i] = 0
+
         # Return the base curve if each e_i = 0
         if all(e == 0 for e in e_list):
             return A
 
-        # Apply the ideal corresponding to each prime l_i and exponent e_i
-        # Uses a loop structure to apply each idela the right number of times until no more exponents remain
+        # Track the curve projectively so that no inversions are needed until the end
+        curve = curve_from_a(self.F(A), p)
         while True:
-            # If no exponent is positive, then end and return E
+            # If no exponent is non-zero, then end and return the curve
             if all(e == 0 for e in e_list):
                 break
+            if counters.active is not None:
+                counters.active.event("rounds")
+            steps = 0
+
+            # Get a point on the curve (s = 1) and a point on its twist (s = -1) for a single Legendre symbol
+            with counters.phase("sampling"):
+                P_plus, P_minus = elligator(curve, self.F)
+            points = {1: P_plus, -1: P_minus}
 
-            # Get a non-zero random element of F
-            x = F.random_element()
-            while x.is_zero():
-                x = F.random_element()
-
-            # Set s to the Kronecker symbol of r for p
-            r = F(x**3 + A*x**2 + x)
-            s = kronecker_symbol(r, p)
-            assert (2 * is_square(r)) - 1 == s
-
-            # Create a set of all non-zero indices
-            S = [i for i, e in enumerate(e_list) if sign(e) == s]
-            if len(S) == 0:
-                continue
-            if s == -1:
-                E = E.quadratic_twist()
-            
-            # Get a random point on the curve and get the product of all elements
-            while True:
-                y = E.random_element()
-                if not y.is_zero():
-                    break
-            x = y.xy()[0]
-            k = prod(l_primes[i] for i in S)
-            P = E.lift_x(x)
-
-            # Ensure that p + 1 divides k and define Q = ((p + 1) / k) * P
-            assert (p + 1) % k == 0
-            Q = ((p + 1) // k) * P
-
-            # Apply the isogeny corresponding to each l_prime power to compute E_B
-            for i in S:
-                assert k % l_primes[i] == 0
-                R = (k // l_primes[i]) * Q
-                if R.is_zero():
+            # Create a set of the indices whose exponents point in each direction
+            S = {s: [i for i, e in enumerate(e_list) if (e > 0) - (e < 0) == s] for s in (1, -1)}
+
+            # Clear the cofactors so that each point has order dividing the product of its primes, skipping directions
+            # with no exponents left
+            with counters.phase("cofactor"):
+                for s in (1, -1):
+                    if len(S[s]) == 0:
+                        continue
+                    k = 1
+                    for i in S[s]:
+                        k *= l_primes[i]
+                    assert (p + 1) % k == 0
+                    points[s] = xMUL(points[s], (p + 1) // k, curve, p)
+
+            # Apply the isogeny corresponding to each l_prime power, first with kernels on the curve and then on the
+            # twist (which give the inverse ideal), pushing the twist point through the first set of isogenies
+            for s in (1, -1):
+                if len(S[s]) == 0:
                     continue
-                phi = E.isogeny(R)
-                E = phi.codomain()
-                Q = phi(Q)
-                assert k % l_primes[i] == 0
-                k = k // l_primes[i]
-                e_list[i] -= s
-            if s == -1:
-                E = E.quadratic_twist()
-        return self.convert_from_weierstrauss(E)
+
+                # Compute one isogeny at a leaf of the strategy, decreasing the exponent if it was not skipped
+                def leaf(curve, i, R, carried):
+                    nonlocal steps
+                    curve, carried = self.isogeny(curve, R[0], l_primes[i], carried)
+                    e_list[i] -= s
+                    steps += 1
+                    if counters.active is not None:
+                        counters.active.isogeny(l_primes[i])
+                    return curve, carried
+
+                carried = [points[-1]] if s == 1 and len(S[-1]) > 0 else []
+                with counters.phase("isogenies"):
+                    curve, carried = strategy_walk(curve, (points[s],), S[s], carried, self.strategies, l_primes, p, leaf,
+                                                   self.chains)
+                if carried:
+                    points[-1] = carried[0]
+            if steps == 0 and counters.active is not None:
+                counters.active.event("idle_rounds")
+        with counters.phase("normalize"):
+            result = int(normalize(curve, p))
+        if self.cache is not None:
+            self.cache.put(self.cache_context, key["public"], key["private"], result)
+        return result
+
+    # Apply the group action to many keys over a pool of worker processes that share this parameter set
+    # Yields results in order, or (index, result) pairs as they finish when ordered is False
+    def group_action_many(self, keys, processes=None, chunksize=1, ordered=True):
+        return batch.group_action_many(self, keys, processes, chunksize, ordered)
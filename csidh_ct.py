@@ -1,81 +1,194 @@
-from sage.all import *
 import random as rand
 
+from fields import GF, prod
+from montgomery import curve_from_a, normalize, is_infinity, cswap, xMUL, xMUL_dac, xISOG, elligator
+from velusqrt import xISOG_sqrt
+from strategy import strategy_walk
+from params import load_params
+from validation import is_supersingular
+from bounds import optimize_bounds
+from radical import radical_indices, radical_walk_ct, margins
+from cache import context
+import batch
+import counters
+
 class CSIDH_CT():
-    def __init__(self, n):
-        self.n = n
-        self.l_primes, self.p, self.F = self.gen_params(n)
-        self.a_key = self.gen_key(5)
-        self.b_key = self.gen_key(5)
-
-    # Generate the parameters l_primes, p, and F_p for the key exchange
-    def gen_params(self, n):
-        l_primes = primes_first_n(n + 1)[1:]
-        p = 4 * prod(l_primes) - 1
-        while not is_prime(p):
-            x = next_prime(l_primes[-1] + 1)
-            l_primes[-1] = x
-            p = 4 * prod(l_primes) - 1
-
-        F = GF(p)
-        return l_primes, p, F
+    sqrt_velu_threshold = 260                       # Isogenies of larger degree use square-root Velu
+    validation_cache_size = 1024                    # Number of public keys whose validity is remembered
+    modes = ("dummy", "oayt", "dummy_free")         # Available constant-time strategies, see group_action
+    default_bound = 5                               # Exponent bound of every prime when no bounds are given
+
+    def __init__(self, n, a_key=None, b_key=None, backend=None, mode="dummy", bounds=None, cache=None,
+                 radical="auto"):
+        if mode not in self.modes:
+            raise ValueError("Unknown constant-time mode: " + str(mode))
+        self.params = load_params(n)                # Parameter set for n primes or a preset name, see params.py
+        self.n = self.params.n
+        self.backend = backend                      # Field arithmetic backend, see fields.py
+        self.mode = mode                            # Constant-time strategy used by group_action
+        self.l_primes, self.p, self.F = self.gen_params()
+        self.strategies = self.params.strategies
+        self.chains = self.params.chains            # Differential addition chain of each prime, see xMUL_dac
+        self.bounds = self.gen_bounds(bounds)       # Exponent bound m_i of each prime, see gen_key
+        self.radical = self.gen_radical(radical)    # Primes walked with radical isogenies, see radical.py
+        self._a_key = a_key
+        self._b_key = b_key
+        self._validated = {0: True}                 # Validity of recently seen public keys, oldest first
+        self.cache = cache                          # ActionCache of group action results, or None, see cache.py
+        self.cache_context = context("CSIDH_CT", self.p, self.mode, self.bounds)
+
+    # Alice's key pair, generated on first use so that building an instance only costs the parameter search
+    @property
+    def a_key(self):
+        if self._a_key is None:
+            self._a_key = self.gen_key(5)
+        return self._a_key
+
+    @a_key.setter
+    def a_key(self, key):
+        self._a_key = key
+
+    # Bob's key pair, generated on first use
+    @property
+    def b_key(self):
+        if self._b_key is None:
+            self._b_key = self.gen_key(5)
+        return self._b_key
+
+    @b_key.setter
+    def b_key(self, key):
+        self._b_key = key
+
+    # Get the parameters l_primes, p, and F_p for the key exchange from the parameter set
+    def gen_params(self):
+        F = GF(self.params.p, self.backend)
+        return list(self.params.l_primes), F.p, F
+
+    # Get the exponent bound of each prime from the bounds argument of the constructor
+    # None gives default_bound for every prime, "optimal" the cheapest bounds for the same key space (see bounds.py),
+    # and a list gives the bound of each prime.
+    def gen_bounds(self, bounds):
+        if bounds is None:
+            return [self.default_bound] * self.n
+        if bounds == "optimal":
+            return optimize_bounds(self)
+        bounds = [int(m) for m in bounds]
+        if len(bounds) != self.n or any(m < 0 for m in bounds):
+            raise ValueError("Expected one non-negative exponent bound per prime")
+        return bounds
+
+    # Get the primes to walk with chains of radical isogenies from the radical argument of the constructor
+    # A chain takes the same number of steps for every key, with dummy steps, so the dummy_free mode has none. With
+    # "auto", only primes whose bound exceeds every other by the margin of their degree are walked, since a chain
+    # only beats the rounds that they would add.
+    def gen_radical(self, radical):
+        if self.mode == "dummy_free":
+            if radical not in (None, "auto"):
+                raise ValueError("The dummy_free mode cannot use radical isogenies")
+            return []
+        indices = radical_indices(self.l_primes, radical)
+        if radical == "auto":
+            rounds = max((b for i, b in enumerate(self.bounds) if i not in indices), default=0)
+            indices = [i for i in indices if self.bounds[i] >= rounds + margins[self.l_primes[i]]]
+        return indices
 
     # Generate the private and public keys for the key exchange
-    def gen_key(self, m):
-        private = [rand.randint(0, 2*m) for _ in range(self.n)]
+    # The exponent for l_primes[i] is drawn from [0, 2 bounds[i]]; m is ignored and only kept so that CSIDH and
+    # CSIDH_CT keys are generated with the same call
+    def gen_key(self, m=None):
+        private = [rand.randint(0, 2*b) for b in self.bounds]
         public = self.group_action({"public": 0, "private": private})
         return {
             "private": private,
             "public": public
         }
 
-    # Converts a curve of the form y^2 = x^3 + Ax^2 + x to simplified Weierstrauss form
-    def convert_to_weierstrauss(self, A):
-        a = (3 - A**2) * pow(3 * 1, -1, self.p)
-        b = (2 * A**3 - 9*A) * pow(27 * 1, -1, self.p)
-        return EllipticCurve(self.F, [a, b])
-
-    # Converts a curve from simplified Weierstrauss form back to A from the form y^2 = x^3 + Ax^2 + x
-    def convert_from_weierstrauss(self, E):
-        a = E.a4()
-        b = E.a6()
-        F = E.base_field()
-        R = PolynomialRing(F, name="z")
-        z = R.gens()[0]
-        roots = (z**3 + a*z + b).roots()
-        assert len(roots) > 0
-        r = roots[0][0]
-        s = (3*r**2 + a).sqrt() ** (-1)
-        return -3 * (-1)**s.is_square() * r * s
-
-    # Apply the CSIDH group action
+    # Check that a private key has one exponent in [0, 2 bounds[i]] for each prime, since the isogeny counts of an
+    # exponent outside of it never reach zero
+    def check_private(self, private):
+        if len(private) != self.n:
+            raise ValueError("Expected " + str(self.n) + " exponents")
+        for e, b in zip(private, self.bounds):
+            if not 0 <= e <= 2*b:
+                raise ValueError("Exponent " + str(e) + " outside of [0, " + str(2*b) + "]")
+
+    # Check that the public key A is a supersingular curve, remembering the answer for recently seen keys
+    def validate_public(self, A):
+        A = int(A)
+        if A in self._validated:
+            return self._validated[A]
+        valid = is_supersingular(A, self.F, self.l_primes)
+        if len(self._validated) >= self.validation_cache_size:
+            del self._validated[next(iter(self._validated))]
+        self._validated[A] = valid
+        return valid
+
+    # Compute the isogeny with kernel generated by K, switching to square-root Velu for large degrees
+    def isogeny(self, curve, K, l, points):
+        if l > self.sqrt_velu_threshold:
+            return xISOG_sqrt(curve, K, l, points, self.p)
+        return xISOG(curve, K, l, points, self.p)
+
+    # Apply the CSIDH group action for a private key with exponents e in [0, 2m], where m is the bound of each prime,
+    # using the instance's mode:
+    #   "dummy":      2m isogenies per prime on the curve, e real and 2m - e dummy (Meyer, Campos, and Reith)
+    #   "oayt":       the exponent e - m in [-m, m], m isogenies per prime on the curve or its twist, |e - m| real
+    #                 and m - |e - m| dummy, keeping one point on each (Onuki, Aikawa, Yamazaki, and Takagi)
+    #   "dummy_free": the exponent 2e - 2m in [-2m, 2m], as e real isogenies on the curve and 2m - e real
+    #                 isogenies on the twist with no dummies (Cervantes-Vazquez et al.)
+    # Each mode gives the same number of keys, but the modes give different public keys for the same private key.
+    # Public keys that are not supersingular curves and exponents outside of the bounds are refused with a ValueError
+    # before doing any work on them. With a cache, an action seen before returns its cached result at once, which
+    # gives away by its timing that the key was used before; the computation itself stays constant-time.
     def group_action(self, key):
+        self.check_private(key["private"])
+        if self.cache is not None:
+            shared = self.cache.get(self.cache_context, key["public"], key["private"])
+            if shared is not None:
+                return shared
+        with counters.phase("validation"):
+            if not self.validate_public(key["public"]):
+                raise ValueError("The public key is not a supersingular curve")
+        if self.mode == "dummy":
+            result = self.group_action_dummy(key)
+        else:
+            result = self.group_action_two_point(key)
+        if self.cache is not None:
+            self.cache.put(self.cache_context, key["public"], key["private"], result)
+        return result
+
+    # Apply the group action with dummy isogenies, using x-only arithmetic on the Montgomery curve
+    def group_action_dummy(self, key):
         # Set up parameters
         e_list = key["private"].copy()              # List of exponents of prime ideals
         f_list = []                                 # List of dummy isogenies to compute for each degree
-        for e in e_list:
-            f_list.append(10 - e)
+        for e, b in zip(e_list, self.bounds):
+            f_list.append(2*b - e)
         A = key["public"]                           # Coefficient for elliptic curve
-        E = self.convert_to_weierstrauss(A)
         p = self.p                                  # The prime to use for the group acton
-        F = self.F                                  # Prime field with orer p
         l_primes = self.l_primes                    # List of small primes
-        k = 4
 
-        # Return the base curve if each e_i = 0
+        # Walk the primes with radical isogenies first, each with 2m steps of which e are real
+        for i in self.radical:
+            A = radical_walk_ct(A, l_primes[i], 2*self.bounds[i], e_list[i], 0, self.F)
+            e_list[i] = f_list[i] = 0
+        k = 4 * prod(l for i, (l, b) in enumerate(zip(l_primes, self.bounds)) if b == 0 or i in self.radical)
+
+        # Track the curve projectively so that no inversions are needed until the end
+        curve = curve_from_a(self.F(A), p)
         while True:
             # Ensure that real and/or dummy isogenies still need to be applied
             if all(e == 0 for e in e_list) and all(f == 0 for f in f_list):
                 break
+            if counters.active is not None:
+                counters.active.event("rounds")
+            steps = 0
 
-            # Get a random point on the curve
-            while True:
-                y = E.random_element()
-                if not y.is_zero():
-                    break
-            x = y.xy()[0]
-            P = E.lift_x(x)
-            P = k*P
+            # Get a random point on the curve with Elligator 2, discarding the point on the twist
+            with counters.phase("sampling"):
+                P, _ = elligator(curve, self.F)
+            with counters.phase("cofactor"):
+                P = xMUL(P, k, curve, p)
 
             # Compute the product of all l_primes for the isogeny computation
             S = []
@@ -83,30 +196,132 @@ class CSIDH_CT():
                 if e_list[i] != 0 or f_list[i] != 0:
                     S.append(i)
 
-            # Compute the real and/or dummy isogenies for each i in S
+            # Apply real and/or dummy isogenies at the leaves of the strategy
+            def leaf(curve, i, K, carried):
+                nonlocal steps
+                steps += 1
+                if counters.active is not None:
+                    counters.active.isogeny(l_primes[i], real=e_list[i] != 0)
+                if e_list[i] != 0:
+                    curve, carried = self.isogeny(curve, K[0], l_primes[i], carried)
+                    Discard = [xMUL_dac(Q, l_primes[i], self.chains[i], curve, p) for Q in carried]
+                    e_list[i] -= 1
+                else:
+                    Discard = self.isogeny(curve, K[0], l_primes[i], carried)
+                    carried = [xMUL_dac(Q, l_primes[i], self.chains[i], curve, p) for Q in carried]
+                    f_list[i] -= 1
+                return curve, carried
+
+            with counters.phase("isogenies"):
+                curve, _ = strategy_walk(curve, (P,), S, [], self.strategies, l_primes, p, leaf, self.chains)
+            if steps == 0 and counters.active is not None:
+                counters.active.event("idle_rounds")
+
+            # Primes whose real and dummy isogenies are all done no longer need to be kept in the points
+            for i in S:
+                if e_list[i] == 0 and f_list[i] == 0:
+                    k = k * l_primes[i]
+
+        # Convert back from the projective curve representation
+        with counters.phase("normalize"):
+            return int(normalize(curve, p))
+
+    # Apply the group action keeping a point on the curve and a point on the twist, for the "oayt" and "dummy_free"
+    # modes
+    # Every step computes an isogeny, pushes every carried point through it and multiplies the results by l; the
+    # private key only decides, through cswap, which point gives the kernel and whether the results are kept.
+    def group_action_two_point(self, key):
+        # Set up parameters
+        e_list = key["private"]                     # List of exponents in [0, 2 bounds[i]]
+        A = key["public"]                           # Coefficient for elliptic curve
+        p = self.p                                  # The prime to use for the group acton
+        l_primes = self.l_primes                    # List of small primes
+
+        # Count the isogenies with kernels on the curve and on the twist and the dummy isogenies for each degree
+        if self.mode == "oayt":
+            plus_list = [max(e - b, 0) for e, b in zip(e_list, self.bounds)]
+            minus_list = [max(b - e, 0) for e, b in zip(e_list, self.bounds)]
+            dummy_list = [b - abs(e - b) for e, b in zip(e_list, self.bounds)]
+        else:
+            plus_list = [e for e in e_list]
+            minus_list = [2*b - e for e, b in zip(e_list, self.bounds)]
+            dummy_list = [0 for e in e_list]
+
+        # Walk the primes with radical isogenies first, each with m steps on the curve or the twist of which |e - m|
+        # are real (only in the "oayt" mode, see gen_radical)
+        for i in self.radical:
+            b = self.bounds[i]
+            A = radical_walk_ct(A, l_primes[i], b, plus_list[i] + minus_list[i], int(minus_list[i] > 0), self.F)
+            plus_list[i] = minus_list[i] = dummy_list[i] = 0
+        k = 4 * prod(l for i, (l, b) in enumerate(zip(l_primes, self.bounds)) if b == 0 or i in self.radical)
+
+        # Track the curve projectively so that no inversions are needed until the end
+        curve = curve_from_a(self.F(A), p)
+        while True:
+            # Ensure that real and/or dummy isogenies still need to be applied
+            S = []
+            for i in range(0, len(l_primes)):
+                if plus_list[i] + minus_list[i] + dummy_list[i] != 0:
+                    S.append(i)
+            if len(S) == 0:
+                break
+            if counters.active is not None:
+                counters.active.event("rounds")
+            steps = 0
+
+            # Get a point on the curve and a point on the twist and remove the primes that are already done
+            with counters.phase("sampling"):
+                P_plus, P_minus = elligator(curve, self.F)
+            with counters.phase("cofactor"):
+                T = (xMUL(P_plus, k, curve, p), xMUL(P_minus, k, curve, p))
+
+            # Apply one real or dummy isogeny at each leaf of the strategy
+            def leaf(curve, i, K, carried):
+                nonlocal steps
+                l = l_primes[i]
+                real = int(plus_list[i] + minus_list[i] > 0)
+                twist = int(plus_list[i] == 0 and minus_list[i] > 0)
+                K, _ = cswap(K[0], K[1], twist, p)
+                if is_infinity(K, p):
+                    # The other point may still have order divisible by l, which must not reach later kernels
+                    if counters.active is not None:
+                        counters.active.event("kernel_skips")
+                    return curve, [xMUL_dac(Q, l, self.chains[i], curve, p) for Q in carried]
+                steps += 1
+                if counters.active is not None:
+                    counters.active.isogeny(l, real=bool(real))
+
+                # Dummy steps keep the curve and the points, then both kinds multiply the points by l
+                codomain, images = self.isogeny(curve, K, l, carried)
+                curve, _ = cswap(curve, codomain, real, p)
+                carried = [cswap(Q, image, real, p)[0] for Q, image in zip(carried, images)]
+                carried = [xMUL_dac(Q, l, self.chains[i], curve, p) for Q in carried]
+                plus_list[i] -= real * (1 - twist)
+                minus_list[i] -= real * twist
+                dummy_list[i] -= 1 - real
+                return curve, carried
+
+            with counters.phase("isogenies"):
+                curve, _ = strategy_walk(curve, T, S, [], self.strategies, l_primes, p, leaf, self.chains)
+            if steps == 0 and counters.active is not None:
+                counters.active.event("idle_rounds")
+
+            # Primes whose isogenies are all done no longer need to be kept in the points
             for i in S:
-                m = 1
-                for j in S:
-                    if j > i:
-                        m *= l_primes[j]
-                K = m*P
-
-                # Apply real and/or dummy isogenies in the same loop
-                if not K.is_zero():
-                    if e_list[i] != 0:
-                        phi = E.isogeny(K)
-                        E = phi.codomain()
-                        P = phi(P)
-                        Discard = l_primes[i]*P
-                        e_list[i] -= 1
-                    else:
-                        phi = E.isogeny(K)
-                        Discard = phi.codomain()
-                        Discard = phi(P)
-                        P = l_primes[i]*P
-                        f_list[i] -= 1
-                    if e_list[i] == 0 and f_list[i] == 0:
-                        k = k * l_primes[i]
-
-        # Convert back from Weierstrauss form
-        return self.convert_from_weierstrauss(E)
+                if plus_list[i] + minus_list[i] + dummy_list[i] == 0:
+                    k = k * l_primes[i]
+
+        # Convert back from the projective curve representation
+        with counters.phase("normalize"):
+            return int(normalize(curve, p))
+
+    # Apply the group action to many keys over a pool of worker processes that share this parameter set
+    # Yields results in order, or (index, result) pairs as they finish when ordered is False
+    def group_action_many(self, keys, processes=None, chunksize=1, ordered=True):
+        return batch.group_action_many(self, keys, processes, chunksize, ordered)
+
+    # Apply the group action to many keys in lockstep batches of at most lanes keys, vectorized with NumPy
+    # Returns the results in the order of keys; NumPy is only needed when this is called
+    def group_action_lockstep(self, keys, lanes=256):
+        import batch_ct
+        return batch_ct.group_action_lockstep(self, keys, lanes)
@@ -0,0 +1,153 @@
+from math import prod
+import os
+import random as rand
+
+# Prime field arithmetic backends for the group actions
+#
+# Field elements are plain integers reduced modulo p, so the x-only formulas in montgomery.py and
+# velusqrt.py run unchanged on any backend whose integers support +, -, *, % and three-argument pow.
+# IntField uses Python's built-in integers and needs nothing beyond the standard library. Gmpy2Field
+# uses gmpy2's mpz integers, which are several times faster for primes of a few hundred bits, and is
+# used by default when gmpy2 is installed. Set the CSIDH_BACKEND environment variable to "int" or
+# "gmpy2" to choose explicitly.
+
+try:
+    import gmpy2
+except ImportError:
+    gmpy2 = None
+
+# Bases for which Miller-Rabin is deterministic below 3.3 * 10^24
+_MR_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+
+# Check whether n is prime with the Miller-Rabin test, adding random bases for n beyond the deterministic range
+def is_prime(n, rounds=16):
+    if n < 2:
+        return False
+    for q in _MR_BASES:
+        if n % q == 0:
+            return n == q
+    if gmpy2 is not None:
+        return bool(gmpy2.is_prime(n, rounds + len(_MR_BASES)))
+    d = n - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    bases = list(_MR_BASES)
+    if n >= 3317044064679887385961981:
+        bases += [rand.randrange(2, n - 1) for _ in range(rounds)]
+    for a in bases:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+# Find the smallest prime greater than n
+def next_prime(n):
+    n = n + 1
+    while not is_prime(n):
+        n += 1
+    return n
+
+
+# List the first n primes
+def primes_first_n(n):
+    primes = []
+    q = 1
+    while len(primes) < n:
+        q = next_prime(q)
+        primes.append(q)
+    return primes
+
+
+# Compute the Jacobi symbol (a / n) for odd positive n with the binary algorithm
+def jacobi(a, n):
+    a = a % n
+    result = 1
+    while a != 0:
+        while a % 2 == 0:
+            a //= 2
+            if n % 8 in (3, 5):
+                result = -result
+        a, n = n, a
+        if a % 4 == 3 and n % 4 == 3:
+            result = -result
+        a = a % n
+    return result if n == 1 else 0
+
+
+class IntField():
+    name = "int"
+
+    def __init__(self, p):
+        self.p = int(p)
+
+    def __repr__(self):
+        return "Finite Field of size " + str(self.p) + " (" + self.name + ")"
+
+    # Convert an integer (or anything with __int__) into a reduced field element
+    def __call__(self, x):
+        return int(x) % self.p
+
+    def random_element(self):
+        return rand.randrange(self.p)
+
+    # Compute the Legendre symbol of a, returning 1, -1, or 0
+    def legendre(self, a):
+        return jacobi(a, self.p)
+
+    def inverse(self, a):
+        return pow(a, -1, self.p)
+
+    # Compute a square root of a square a, using that p = 3 mod 4 for every CSIDH prime
+    def sqrt(self, a):
+        return pow(a, (self.p + 1) // 4, self.p)
+
+
+class Gmpy2Field(IntField):
+    name = "gmpy2"
+
+    def __init__(self, p):
+        self.p = gmpy2.mpz(p)
+
+    def __call__(self, x):
+        return gmpy2.mpz(int(x)) % self.p
+
+    def random_element(self):
+        return gmpy2.mpz(rand.randrange(self.p))
+
+    def legendre(self, a):
+        return gmpy2.legendre(a, self.p)
+
+    def inverse(self, a):
+        return gmpy2.invert(a, self.p)
+
+
+BACKENDS = {"int": IntField, "gmpy2": Gmpy2Field}
+
+
+# Get the name of the backend to use when none is given explicitly
+def default_backend():
+    name = os.environ.get("CSIDH_BACKEND")
+    if name is not None:
+        return name
+    return "gmpy2" if gmpy2 is not None else "int"
+
+
+# Create the prime field F_p with the given backend
+def GF(p, backend=None):
+    if backend is None:
+        backend = default_backend()
+    if backend not in BACKENDS:
+        raise ValueError("Unknown field backend: " + str(backend))
+    if backend == "gmpy2" and gmpy2 is None:
+        raise ImportError("The gmpy2 backend requires the gmpy2 package")
+    return BACKENDS[backend](p)
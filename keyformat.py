@@ -0,0 +1,215 @@
+from math import ceil
+import hashlib
+import struct
+import mmap
+import os
+
+from params import load_params, find_params
+
+# A compact binary format for keys, and a store that reads files of them through a memory map
+#
+# A file starts with a header naming the parameter set, followed by fixed-size records, one per key:
+#   header:   magic b"CSKF", format version, bits per exponent, number of primes n, smallest and largest exponent,
+#             bytes of A, BLAKE2b digest of p (16 bytes), and the load_params key of the parameter set ("CSIDH-512",
+#             "74", ...)
+#   record:   the n exponents minus the smallest exponent, packed little-endian into the given number of bits each,
+#             then A as a little-endian integer of fixed width
+# A KeyFormat is made for a parameter set and a range of exponents: [-m, m] for CSIDH keys generated with
+# gen_key(m), or [0, 2 max(bounds)] for CSIDH_CT keys, see for_instance. For n = 74 and m = 5 a key takes 37 bytes
+# of exponents and 64 of A, against about 1 kB as indented JSON.
+#
+# write_keys writes a file, and KeyStore maps one into memory: indexing, slicing, and iterating decode records
+# straight from the map, one at a time, so batch jobs can stream any number of keys from disk, for example with
+# instance.group_action_many(KeyStore(path)).
+
+magic = b"CSKF"
+version = 2                                         # Format of the files, files of other versions are refused
+_header = struct.Struct("<4sBBHhhH16sB")            # Fixed part of the header, followed by the parameter set key
+
+
+# Get the load_params key of a parameter set, which the header stores
+def params_key(params):
+    return params.name if params.name else str(params.n)
+
+
+# Digest p, to check that a file belongs to the parameter set it names
+def params_digest(params):
+    return hashlib.blake2b(str(params.p).encode(), digest_size=16).digest()
+
+
+class KeyFormat():
+    def __init__(self, params, low, high):
+        if low > high:
+            raise ValueError("Empty exponent range")
+        self.params = load_params(params)
+        self.low = low                              # Smallest exponent
+        self.high = high                            # Largest exponent
+        self.width = max((high - low).bit_length(), 1)              # Bits per exponent
+        self.exponent_bytes = ceil(self.params.n * self.width / 8)
+        self.field_bytes = ceil(self.params.p.bit_length() / 8)     # Bytes of A
+        self.record_size = self.exponent_bytes + self.field_bytes
+        # When exponents do not straddle bytes, decode each byte of exponents with one table lookup
+        mask = (1 << self.width) - 1
+        self._table = None
+        if 8 % self.width == 0:
+            self._table = [tuple(((b >> (self.width * j)) & mask) + low for j in range(8 // self.width))
+                           for b in range(256)]
+
+    # Get the format for the keys of a CSIDH instance generated with gen_key(m), or of a CSIDH_CT instance
+    @classmethod
+    def for_instance(cls, instance, m=5):
+        if hasattr(instance, "bounds"):
+            return cls(instance.params, 0, 2 * max(instance.bounds))
+        return cls(instance.params, -m, m)
+
+    def __eq__(self, other):
+        return isinstance(other, KeyFormat) and (self.params, self.low, self.high) == (other.params, other.low, other.high)
+
+    def __repr__(self):
+        return "KeyFormat(" + params_key(self.params) + ", [" + str(self.low) + ", " + str(self.high) + "], " + \
+            str(self.record_size) + " bytes per key)"
+
+    def header(self):
+        name = params_key(self.params).encode()
+        return _header.pack(magic, version, self.width, self.params.n, self.low, self.high, self.field_bytes,
+                            params_digest(self.params), len(name)) + name
+
+    # Read the header at the start of buf, returning the format and the size of the header
+    # The parameter set must be a preset or one already built or cached, so that a crafted header cannot start a
+    # search for p, and must match the number of primes and the digest of p of the header.
+    @classmethod
+    def from_header(cls, buf):
+        if len(buf) < _header.size:
+            raise ValueError("Truncated key file header")
+        tag, file_version, width, n, low, high, field_bytes, digest, name_length = _header.unpack_from(buf)
+        if tag != magic:
+            raise ValueError("Not a key file")
+        if file_version != version:
+            raise ValueError("Unsupported key file version: " + str(file_version))
+        try:
+            name = bytes(buf[_header.size:_header.size + name_length]).decode()
+        except UnicodeDecodeError:
+            raise ValueError("Invalid parameter set name in the key file header")
+        params = find_params(int(name) if name.isdigit() else name)
+        if params is None:
+            raise ValueError("The parameter set " + name + " of the key file is not a preset or cached")
+        if params.n != n or params_digest(params) != digest:
+            raise ValueError("The key file does not match the parameter set " + name)
+        if low > high:
+            raise ValueError("Invalid exponent range in the key file header")
+        fmt = cls(params, low, high)
+        if fmt.width != width or fmt.field_bytes != field_bytes:
+            raise ValueError("The key file does not match the parameter set " + name)
+        return fmt, _header.size + name_length
+
+    # Encode a key {"private": exponents, "public": A} as one record
+    def encode(self, key):
+        private = key["private"]
+        if len(private) != self.params.n:
+            raise ValueError("Expected " + str(self.params.n) + " exponents")
+        values = [int(e) - self.low for e in private]
+        if min(values) < 0 or max(values) > self.high - self.low:
+            raise ValueError("Exponents outside of [" + str(self.low) + ", " + str(self.high) + "]")
+        if self._table is not None:
+            # Column j holds the exponents that go to bits width * j of each byte
+            per_byte = 8 // self.width
+            values += [0] * (self.exponent_bytes * per_byte - len(values))
+            columns = [[v << (self.width * j) for v in values[j::per_byte]] for j in range(per_byte)]
+            exponents = bytes(map(sum, zip(*columns)))
+        else:
+            packed = 0
+            for i, v in enumerate(values):
+                packed |= v << (self.width * i)
+            exponents = packed.to_bytes(self.exponent_bytes, "little")
+        return exponents + int(key["public"]).to_bytes(self.field_bytes, "little")
+
+    # Decode the record at offset in buf (bytes, a memoryview, or a memory map) into a key
+    def decode(self, buf, offset=0):
+        end = offset + self.exponent_bytes
+        if self._table is not None:
+            table = self._table
+            private = [e for b in buf[offset:end] for e in table[b]][:self.params.n]
+        else:
+            packed = int.from_bytes(buf[offset:end], "little")
+            mask = (1 << self.width) - 1
+            private = [((packed >> (self.width * i)) & mask) + self.low for i in range(self.params.n)]
+        return {"private": private, "public": int.from_bytes(buf[end:end + self.field_bytes], "little")}
+
+
+# Write keys to a new file in the given format, returning the number of keys written
+def write_keys(path, fmt, keys):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(fmt.header())
+        for key in keys:
+            f.write(fmt.encode(key))
+            count += 1
+    return count
+
+
+# Append keys to an existing file in its format, first dropping a last record cut off by an interrupted write
+def append_keys(path, keys):
+    with KeyStore(path) as store:
+        fmt = store.format
+        end = store._start + len(store) * fmt.record_size
+    with open(path, 'r+b') as f:
+        f.truncate(end)
+        f.seek(end)
+        for key in keys:
+            f.write(fmt.encode(key))
+
+
+class KeyStore():
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = b""
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            self.format, self._start = KeyFormat.from_header(self._map)
+        except BaseException:
+            self.close()
+            raise
+        self.params = self.format.params            # Parameter set named by the file
+        self._count = (len(self._map) - self._start) // self.format.record_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    # Number of complete records, ignoring a last one cut off by an interrupted write
+    def __len__(self):
+        return self._count
+
+    # Decode one key, or a list of keys for a slice
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("key index out of range")
+        return self.format.decode(self._map, self._start + index * self.format.record_size)
+
+    # Decode the keys one at a time, in order
+    def __iter__(self):
+        decode = self.format.decode
+        size = self.format.record_size
+        for offset in range(self._start, self._start + self._count * size, size):
+            yield decode(self._map, offset)
+
+    # Get the raw bytes of one record without decoding or copying it; the view must be released before close()
+    def record(self, index):
+        offset = self._start + index * self.format.record_size
+        return memoryview(self._map)[offset:offset + self.format.record_size]
@@ -0,0 +1,73 @@
+from multiprocessing import Pool
+import queue
+import threading
+
+# A pool of pre-generated key pairs for one parameter set
+#
+# Worker processes each build the implementation once and then run gen_key in the background, keeping up
+# to `depth` key pairs ready or in flight. take() hands out a ready key pair without waiting for a group
+# action (unless the pool has been drained faster than the workers can refill it) and immediately queues
+# a replacement.
+
+_instance = None                                    # The implementation built in each worker process
+
+
+# Build the implementation once per worker process
+def _init_worker(Implementation, n):
+    global _instance
+    _instance = Implementation(n)
+
+
+# Generate one key pair in a worker process, with the public key as a plain integer so it pickles cheaply
+def _generate(m):
+    key = _instance.gen_key(m)
+    return {"private": key["private"], "public": int(key["public"])}
+
+
+class KeyPool():
+    def __init__(self, Implementation, n, depth=8, m=5, processes=None):
+        self.depth = depth                          # Number of key pairs kept ready or in flight
+        self.m = m                                  # Exponent bound passed to gen_key
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._errors = []
+        self._closed = False
+        self._pool = Pool(processes, initializer=_init_worker, initargs=(Implementation, n))
+        for _ in range(depth):
+            self._submit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Number of key pairs that can be taken without waiting
+    def __len__(self):
+        return self._ready.qsize()
+
+    # Queue the generation of one more key pair
+    def _submit(self):
+        with self._lock:
+            if not self._closed:
+                self._pool.apply_async(_generate, (self.m,), callback=self._ready.put, error_callback=self._failed)
+
+    # Record a failure in a worker so that take() can raise it instead of blocking forever
+    def _failed(self, error):
+        self._errors.append(error)
+        self._ready.put(None)
+
+    # Take a ready key pair, waiting for one if the pool is empty, and queue its replacement
+    def take(self, timeout=None):
+        key = self._ready.get(timeout=timeout)
+        if key is None:
+            raise self._errors.pop(0)
+        self._submit()
+        return key
+
+    # Stop the workers, discarding any key pairs still being generated
+    def close(self):
+        with self._lock:
+            self._closed = True
+        self._pool.terminate()
+        self._pool.join()
@@ -0,0 +1,209 @@
+import random as rand
+from math import gcd
+
+import counters
+
+# x-only arithmetic on Montgomery curves y^2 = x^3 + Ax^2 + x over F_p
+#
+# Points are projective pairs (X, Z) with x = X/Z, and the point at infinity is any pair with Z = 0.
+# Curves are tracked as the projective pair (A + 2C, A - 2C) for A = A/C, which is exactly the pair of
+# twisted Edwards coefficients (a, d) used by the isogeny formulas, so an action never leaves this form.
+# Only the final conversion back to an affine coefficient in normalize() needs a field inversion.
+
+
+# Convert an affine Montgomery coefficient A to the projective curve representation
+def curve_from_a(A, p):
+    return (A + 2) % p, (A - 2) % p
+
+
+# Convert the projective curve representation back to the affine Montgomery coefficient A
+def normalize(curve, p):
+    a, d = curve
+    if counters.active is not None:
+        counters.active.field(mul=1, inv=1)
+    return 2 * (a + d) * pow(a - d, -1, p) % p
+
+
+# Check whether a projective point is the point at infinity
+def is_infinity(P, p):
+    return P[1] % p == 0
+
+
+# Swap two pairs (points or curves) when bit is 1, using arithmetic on bit instead of a branch
+def cswap(P, Q, bit, p):
+    dX = bit * (P[0] - Q[0])
+    dZ = bit * (P[1] - Q[1])
+    return ((P[0] - dX) % p, (P[1] - dZ) % p), ((Q[0] + dX) % p, (Q[1] + dZ) % p)
+
+
+# Double a point: [2]P
+def xDBL(P, curve, p):
+    X, Z = P
+    a, d = curve
+    if counters.active is not None:
+        counters.active.field(mul=4, sqr=2)
+    t0 = (X - Z) ** 2 % p
+    t1 = (X + Z) ** 2 % p
+    c24 = a - d
+    Z2 = c24 * t0 % p
+    X2 = Z2 * t1 % p
+    t1 = t1 - t0
+    Z2 = (Z2 + a * t1) * t1 % p
+    return X2, Z2
+
+
+# Differential addition: P + Q given P - Q
+def xADD(P, Q, PQ, p):
+    if counters.active is not None:
+        counters.active.field(mul=4, sqr=2)
+    U = (P[0] - P[1]) * (Q[0] + Q[1]) % p
+    V = (P[0] + P[1]) * (Q[0] - Q[1]) % p
+    return PQ[1] * (U + V) ** 2 % p, PQ[0] * (U - V) ** 2 % p
+
+
+# Combined ladder step: returns [2]P and P + Q given P - Q
+def xDBLADD(P, Q, PQ, curve, p):
+    return xDBL(P, curve, p), xADD(P, Q, PQ, p)
+
+
+# Montgomery ladder: [k]P
+def xMUL(P, k, curve, p):
+    if counters.active is not None:
+        counters.active.scalar(k)
+    if k == 0:
+        return 1, 0
+    if k == 1:
+        return P
+    R0, R1 = P, xDBL(P, curve, p)
+    for bit in bin(k)[3:]:
+        if bit == "1":
+            R1, R0 = xDBLADD(R1, R0, P, curve, p)
+        else:
+            R0, R1 = xDBLADD(R0, R1, P, curve, p)
+    return R0
+
+
+# Find a short differential addition chain for k > 2, as a string of steps for xMUL_dac
+# Each step turns the multiples (s, t) of a point, whose difference t - s is known, into (t, s + t) for "0" or into
+# (s, s + t) for "1", starting from (1, 2). Run backwards from (r, k), this is a subtractive Euclidean algorithm, so
+# every r coprime to k gives a chain, and the shortest over r is kept (Montgomery; Cervantes-Vazquez et al.). A chain
+# costs about 1.4 log2(k) differential additions, against log2(k) doublings and additions for the ladder.
+def dac_chain(k):
+    best = None
+    for r in range(k // 2 + 1, k):
+        if gcd(r, k) != 1:
+            continue
+        steps = []
+        s, t = r, k
+        while (s, t) != (1, 2) and (best is None or len(steps) < len(best)):
+            if 2 * s > t:
+                steps.append("0")
+                s, t = t - s, s
+            else:
+                steps.append("1")
+                t = t - s
+        if (s, t) == (1, 2) and (best is None or len(steps) < len(best)):
+            best = steps
+    return "".join(reversed(best))
+
+
+# [k]P with the differential addition chain for k from dac_chain
+# A chain only adds points whose difference is an earlier multiple of P, so it fails if one of those multiples is the
+# point at infinity, which happens when the order of P divides it; the ladder is used instead in that case.
+def xMUL_dac(P, k, chain, curve, p):
+    if is_infinity(P, p):
+        return xMUL(P, k, curve, p)
+    S, T, D = P, xDBL(P, curve, p), P
+    for step in chain:
+        if is_infinity(T, p):
+            return xMUL(P, k, curve, p)
+        if step == "0":
+            S, T, D = T, xADD(T, S, D, p), S
+        else:
+            S, T, D = S, xADD(T, S, D, p), T
+    if counters.active is not None:
+        counters.active.scalar(k)
+    return T
+
+
+# Compute the kernel points K, [2]K, ..., [(l-1)/2]K of an odd degree l isogeny
+def kernel_points(K, l, curve, p):
+    points = [K]
+    if l >= 5:
+        points.append(xDBL(K, curve, p))
+    for _ in range(3, (l + 1) // 2):
+        points.append(xADD(points[-1], K, points[-2], p))
+    return points
+
+
+# Compute the codomain of the isogeny with the given kernel points (Meyer and Reith's Edwards formulas)
+def isogeny_codomain(kernel, l, curve, p):
+    a, d = curve
+    prod_plus = 1
+    prod_minus = 1
+    for X, Z in kernel:
+        prod_plus = prod_plus * (X + Z) % p
+        prod_minus = prod_minus * (X - Z) % p
+    prod_plus = pow(prod_plus, 8, p)
+    prod_minus = pow(prod_minus, 8, p)
+    if counters.active is not None:
+        counters.active.field(mul=2 * len(kernel) + 2, sqr=6)
+        counters.active.power(l)
+        counters.active.power(l)
+    return pow(a, l, p) * prod_plus % p, pow(d, l, p) * prod_minus % p
+
+
+# Push a point through the isogeny with the given kernel points (Costello and Hisil's formulas)
+def isogeny_evaluate(kernel, P, p):
+    X, Z = P
+    minus = X - Z
+    plus = X + Z
+    X1 = 1
+    Z1 = 1
+    for Xi, Zi in kernel:
+        t0 = minus * (Xi + Zi) % p
+        t1 = plus * (Xi - Zi) % p
+        X1 = X1 * (t0 + t1) % p
+        Z1 = Z1 * (t0 - t1) % p
+    if counters.active is not None:
+        counters.active.field(mul=4 * len(kernel) + 4)
+    return X * X1 * X1 % p, Z * Z1 * Z1 % p
+
+
+# Compute the odd degree l isogeny with kernel generated by K, returning the codomain and the images of points
+def xISOG(curve, K, l, points, p):
+    kernel = kernel_points(K, l, curve, p)
+    codomain = isogeny_codomain(kernel, l, curve, p)
+    return codomain, [isogeny_evaluate(kernel, P, p) for P in points]
+
+
+# Get a random non-zero x-coordinate of F_p
+def random_x(p):
+    return rand.randrange(1, p)
+
+
+# Sample a point on the curve and a point on its twist for one Legendre symbol with Elligator 2
+# For A != 0 the x-coordinates A/(u^2 - 1) and -Au^2/(u^2 - 1) sum to -A, and exactly one of them lies on the
+# curve because -1 is a non-square mod p. For A = 0, x and -x lie on opposite sides for the same reason.
+def elligator(curve, F):
+    p = F.p
+    a, d = curve
+    A = 2 * (a + d) % p
+    C = (a - d) % p
+    while True:
+        u = rand.randrange(2, (p - 1) // 2)
+        u2 = u * u % p
+        if A == 0:
+            P, T = (u, 1), (p - u, 1)
+            s = F.legendre(u * (u2 + 1) % p)
+        else:
+            Z = C * (u2 - 1) % p
+            P, T = (A, Z), (-A * u2 % p, Z)
+            s = F.legendre((C * A * A + A * A * Z + C * Z * Z) * A * C * Z % p)
+        if counters.active is not None:
+            counters.active.field(mul=1 if A == 0 else 11, sqr=1)
+            counters.active.event("legendre")
+        if s == 1:
+            return P, T
+        if s == -1:
+            return T, P
@@ -0,0 +1,179 @@
+import json
+import os
+
+from fields import is_prime, next_prime, primes_first_n, prod
+from montgomery import dac_chain
+from strategy import strategy_costs, optimal_strategies
+from prime_search import search_primes
+from classgroup import relation_lattice
+
+# Parameter sets shared by CSIDH and CSIDH_CT
+#
+# A ParameterSet holds everything about p = 4 * prod(l_primes) - 1 that does not depend on the field backend or
+# the keys: the primes, p, the differential addition chain of each prime for xMUL_dac, the optimal strategy table,
+# and the reduced relation lattice of the class group once load_relations has computed it. Finding p takes
+# primality tests on numbers of hundreds of bits, so load_params builds each set once, keeps it in memory for the
+# process, and saves it as JSON in cache_dir, where later runs and worker processes read it back instead of
+# searching again. Sets are keyed by the number of primes n, by "optimized-n" for the n primes that search_primes
+# finds cheapest (see prime_search.py), or by the name of one of the PRESETS.
+
+PRESETS = {
+    "CSIDH-512": primes_first_n(74)[1:] + [587],    # The parameters of Castryck et al., p of 511 bits
+}
+
+cache_version = 3                                   # Format of the cache files, files of other versions are rebuilt
+cache_dir = os.environ.get("CSIDH_PARAMS_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "csidh-analysis"))
+
+_loaded = {}                                        # Parameter sets loaded by this process, by key
+
+
+class ParameterSet():
+    __slots__ = ("name", "n", "l_primes", "p", "chains", "strategies", "relations")
+
+    def __init__(self, name, l_primes, p, chains, strategies, relations=None):
+        self.name = name                            # Name of the preset, or None for a searched set
+        self.n = len(l_primes)                      # Number of primes
+        self.l_primes = tuple(l_primes)             # Odd primes dividing p + 1
+        self.p = p                                  # The prime 4 * prod(l_primes) - 1
+        self.chains = tuple(chains)                 # Differential addition chain of each prime, see dac_chain
+        self.strategies = tuple(strategies)         # Optimal strategy splits, see optimal_strategies
+        self.relations = relations                  # Reduced basis of the class group relations, see load_relations
+
+    # Compute the tables of a parameter set from its primes
+    @classmethod
+    def from_primes(cls, l_primes, name=None):
+        p = 4 * prod(l_primes) - 1
+        if not is_prime(p):
+            raise ValueError("4 * prod(l_primes) - 1 is not prime")
+        chains = [dac_chain(l) for l in l_primes]
+        strategies = optimal_strategies(len(l_primes), *strategy_costs(l_primes))
+        return cls(name, l_primes, p, chains, strategies)
+
+    # Search the parameter set of the first n odd primes, raising the last one until p is prime
+    @classmethod
+    def search(cls, n):
+        l_primes = primes_first_n(n + 1)[1:]
+        p = 4 * prod(l_primes) - 1
+        while not is_prime(p):
+            x = next_prime(l_primes[-1] + 1)
+            l_primes[-1] = x
+            p = 4 * prod(l_primes) - 1
+        return cls.from_primes(l_primes)
+
+    # Convert to a dictionary of plain values, for the cache files
+    def as_dict(self):
+        return {"version": cache_version, **{name: getattr(self, name) for name in self.__slots__}}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != cache_version:
+            raise ValueError("Unsupported parameter cache version")
+        if data["p"] != 4 * prod(data["l_primes"]) - 1:
+            raise ValueError("The cached p does not match the cached primes")
+        return cls(data["name"], data["l_primes"], data["p"], data["chains"], data["strategies"],
+                   data.get("relations"))
+
+    # Parameter sets are compared by their primes, the rest being derived from them
+    def __eq__(self, other):
+        return isinstance(other, ParameterSet) and self.l_primes == other.l_primes
+
+    def __hash__(self):
+        return hash(self.l_primes)
+
+    def __repr__(self):
+        return "ParameterSet(" + (self.name or "n=" + str(self.n)) + ", p of " + str(self.p.bit_length()) + " bits)"
+
+    # Instances and worker processes receive parameter sets by pickling, which needs explicit state with __slots__
+    def __getstate__(self):
+        return self.as_dict()
+
+    def __setstate__(self, state):
+        other = ParameterSet.from_dict(state)
+        for name in self.__slots__:
+            setattr(self, name, getattr(other, name))
+
+
+# Get the path of the cache file for a key
+def cache_path(key):
+    return os.path.join(cache_dir, "params_" + str(key) + ".json")
+
+
+# Read a parameter set from its cache file, or return None if it is missing or unreadable
+def read_cache(key):
+    try:
+        with open(cache_path(key)) as f:
+            return ParameterSet.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+# Write a parameter set to its cache file, through a temporary file so that concurrent readers never see half a file
+def write_cache(key, params):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        temporary = cache_path(key) + "." + str(os.getpid()) + ".tmp"
+        with open(temporary, 'w') as f:
+            json.dump(params.as_dict(), f)
+        os.replace(temporary, cache_path(key))
+    except OSError:
+        pass
+
+
+# Build the parameter set for a key of load_params
+def build_params(key):
+    if key in PRESETS:
+        return ParameterSet.from_primes(PRESETS[key], key)
+    if isinstance(key, str):
+        return ParameterSet.from_primes(search_primes(int(key[len("optimized-"):]), processes=1)["l_primes"], key)
+    return ParameterSet.search(key)
+
+
+# Get the parameter set for n primes, "optimized-n", or the name of a preset, from memory, the disk cache, or by
+# building it. With cache False, the disk cache is neither read nor written.
+def load_params(key, cache=True):
+    if isinstance(key, ParameterSet):
+        return key
+    if key not in PRESETS:
+        optimized = isinstance(key, str) and key.startswith("optimized-")
+        n = int(key[len("optimized-"):] if optimized else key)
+        if n < 1:
+            raise ValueError("A parameter set needs at least one prime")
+        key = "optimized-" + str(n) if optimized else n
+    if key in _loaded:
+        return _loaded[key]
+
+    params = read_cache(key) if cache else None
+    if params is None:
+        params = build_params(key)
+        if cache:
+            write_cache(key, params)
+    _loaded[key] = params
+    return params
+
+
+# Get the load_params key that a parameter set is cached under, or None for a custom set, such as one made with
+# ParameterSet.from_primes, that is not the set load_params gives for its name or number of primes
+def cached_key(params):
+    key = params.name if params.name else params.n
+    known = _loaded.get(key) or read_cache(key)
+    return key if known is not None and known == params else None
+
+
+# Get the parameter set for a key of load_params only if it is a preset or was already built by this process or
+# saved in the cache, or else None, so that a key read from an untrusted file never starts a search for p
+def find_params(key):
+    if key not in PRESETS and key not in _loaded and read_cache(key) is None:
+        return None
+    return load_params(key)
+
+
+# Get the reduced basis of the class group relation lattice of a parameter set (see classgroup.py), computing it the
+# first time and saving it with the set in the cache, unless it is a custom set. Only sets with p up to
+# classgroup.max_bits have one.
+def load_relations(params, cache=True):
+    if params.relations is None:
+        params.relations = relation_lattice(params.l_primes, params.p)
+        key = cached_key(params) if cache else None
+        if key is not None:
+            write_cache(key, params)
+    return params.relations
@@ -0,0 +1,179 @@
+from multiprocessing import Pool
+from math import gcd, log2, prod
+import heapq
+
+from fields import is_prime, next_prime, primes_first_n
+from montgomery import xISOG, dac_chain, xMUL_dac
+from velusqrt import xISOG_sqrt
+from counters import counting
+
+# Search for CSIDH primes p = 2^k * prod(l_primes) - 1 by expected group action cost
+#
+# ParameterSet.search takes the first n odd primes and raises the last one until p is prime, which can end far
+# past good candidates with one large prime that dominates the cost of every action. search_primes instead looks at
+# several shapes of candidates:
+#   swaps:      any n primes out of the first n + window odd primes, so that several primes can move a little
+#               instead of one moving far
+#   drops:      leaving out the smallest primes, since a round only finds a kernel point of order l with
+#               probability 1 - 1/l and the number of rounds is set by the smallest prime
+#   cofactors:  2^k with k > 2 instead of 4
+# Within a shape, the cost of a candidate is the sum of the costs of its primes plus a cost per round set by its
+# smallest prime, so candidates are enumerated in increasing order of cost. They are sieved by one gcd with the
+# product of the primes below sieve_limit, and the survivors are tested with Miller-Rabin by a pool of worker
+# processes in batches. The first prime of a shape is its cheapest, and shapes whose cheapest candidate costs more
+# than the best prime so far are skipped, so the result is the cheapest prime over every shape rather than the
+# first one found.
+#
+# The group actions work on the surface of Montgomery curves, which needs p = 3 mod 8, so only k = 2 gives parameter
+# sets that CSIDH and CSIDH_CT accept; other cofactors are only for comparing costs.
+
+sieve_limit = 1 << 16                               # Candidates with a prime factor below this are never tested
+
+
+# Count the field operations of one isogeny of degree l in an action on a parameter set of n primes
+# This is the cheaper of the classic and the square-root Velu formulas pushing one point, plus multiplying that
+# point by l with its addition chain about once per level of the strategy. The counts only depend on l, not on
+# the field, so they are taken on a fixed prime and arbitrary points.
+def isogeny_cost(l, n):
+    q = (1 << 127) - 1
+    curve, K, points = (3, 7), (5, 11), [(13, 1)]
+    with counting() as classic:
+        xISOG(curve, K, l, points, q)
+    operations = classic.ops["mul"] + classic.ops["sqr"]
+    if l > 100:
+        with counting() as sqrt_velu:
+            xISOG_sqrt(curve, K, l, points, q)
+        operations = min(operations, sqrt_velu.ops["mul"] + sqrt_velu.ops["sqr"])
+    with counting() as multiplication:
+        xMUL_dac((13, 1), l, dac_chain(l), curve, q)
+    return operations + (1 + log2(max(n, 1))) * (multiplication.ops["mul"] + multiplication.ops["sqr"])
+
+
+# Count the field operations of the fixed work of a round for a prime of the given bit length: sampling a point
+# and clearing a cofactor of about half of p with the ladder
+def round_cost(bits):
+    return 12 + 6 * bits
+
+
+# Estimate the field operations of a group action with exponents in [-m, m] for the given cost of each prime
+# Each exponent is |e| <= m isogenies, m(m + 1)/(2m + 1) on average, and the rounds continue until the smallest
+# prime, which fails most often, is done.
+def expected_cost(l_primes, costs, bits, m=5):
+    average = m * (m + 1) / (2 * m + 1)
+    smallest = min(l_primes)
+    return average * sum(costs) + m * smallest / (smallest - 1) * round_cost(bits)
+
+
+_sieve = None                                       # Product of the odd primes below sieve_limit, once computed
+
+
+# Compute the product of the odd primes below sieve_limit with the sieve of Eratosthenes
+def sieve_product():
+    global _sieve
+    if _sieve is None:
+        composite = bytearray(sieve_limit)
+        for q in range(3, int(sieve_limit ** 0.5) + 1, 2):
+            if not composite[q]:
+                composite[q * q::2 * q] = b"\x01" * len(range(q * q, sieve_limit, 2 * q))
+        _sieve = prod(q for q in range(3, sieve_limit, 2) if not composite[q])
+    return _sieve
+
+
+class _Shape():
+    def __init__(self, smallest, others, n, k, m):
+        self.n = n                                  # Number of primes in a candidate
+        self.k = k                                  # Exponent of the cofactor 2^k
+        self.m = m                                  # Exponent bound the cost is estimated for
+        costs = {l: isogeny_cost(l, n) for l in [smallest] + others}
+        self.smallest = smallest                    # Smallest prime, in every candidate of the shape
+        self.pool = sorted(others, key=costs.get)   # Primes to choose the n - 1 others from, cheapest first
+        self.costs = [costs[l] for l in self.pool]
+        self.bits = k + log2(smallest) + sum(log2(l) for l in self.pool[:n - 1])
+        self.fixed = expected_cost([smallest], [costs[smallest]], self.bits, m)
+        first = tuple(range(n - 1))
+        self.heap = [(self.cost(first), first)]
+        self.seen = {first}
+
+    # Estimate the cost of the candidate made of the smallest prime and the pool primes at the given indices
+    # Since the smallest prime is fixed, the cost per round is too, and the cost only grows along the pool.
+    def cost(self, indices):
+        average = self.m * (self.m + 1) / (2 * self.m + 1)
+        return self.fixed + average * sum(self.costs[i] for i in indices)
+
+    # Get the cost of the cheapest candidate that has not been enumerated yet, or None when there are none left
+    def lowest(self):
+        return self.heap[0][0] if self.heap else None
+
+    # Enumerate the next candidate in increasing order of cost
+    # The successors of a choice move one of its primes to the next pool prime that it does not use.
+    def next(self):
+        cost, indices = heapq.heappop(self.heap)
+        for j in range(len(indices)):
+            upper = indices[j + 1] if j + 1 < len(indices) else len(self.pool)
+            if indices[j] + 1 < upper:
+                successor = indices[:j] + (indices[j] + 1,) + indices[j + 1:]
+                if successor not in self.seen:
+                    self.seen.add(successor)
+                    heapq.heappush(self.heap, (self.cost(successor), successor))
+        return cost, sorted([self.smallest] + [self.pool[i] for i in indices])
+
+
+# Find the cheapest p = 2^k * prod(l_primes) - 1 with n odd primes, over the shapes of candidates described above
+# Up to max_drop of the smallest primes can be left out, primes are chosen among the next window primes, and k ranges
+# over cofactor_exponents. The Miller-Rabin tests run on processes worker processes (in this process if it is 1),
+# on batches of batch candidates. Returns a dictionary with the primes, p, k, the estimated cost, and the numbers
+# of candidates enumerated, sieved out, and tested.
+def search_primes(n, m=5, window=16, max_drop=2, cofactor_exponents=(2,), processes=None, batch=32):
+    primes = primes_first_n(n + max_drop + window + 1)[1:]
+    sieve = sieve_product()
+    shapes = [_Shape(primes[drop], primes[drop + 1:drop + n + window], n, k, m)
+              for k in cofactor_exponents for drop in range(max_drop + 1)]
+    best = None
+    candidates = sieved = tested = 0
+
+    pool = Pool(processes) if processes != 1 else None
+    try:
+        for shape in sorted(shapes, key=lambda shape: shape.lowest()):
+            found = False
+            while not found and shape.lowest() is not None and (best is None or shape.lowest() < best["cost"]):
+                # Take the next batch of candidates of this shape that survive the sieve and beat the best so far
+                chosen = []
+                while len(chosen) < batch and shape.lowest() is not None:
+                    if best is not None and shape.lowest() >= best["cost"]:
+                        break
+                    cost, l_primes = shape.next()
+                    candidates += 1
+                    p = (prod(l_primes) << shape.k) - 1
+                    if p < sieve_limit or gcd(p, sieve) == 1:
+                        chosen.append((cost, l_primes, p))
+                    else:
+                        sieved += 1
+
+                # The first prime of a batch is the cheapest of the shape
+                results = pool.map(is_prime, [p for _, _, p in chosen]) if pool else [is_prime(p) for _, _, p in chosen]
+                tested += len(chosen)
+                for (cost, l_primes, p), prime in zip(chosen, results):
+                    if prime:
+                        best = {"l_primes": l_primes, "p": p, "k": shape.k, "cost": cost}
+                        found = True
+                        break
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    if best is None:
+        raise ValueError("No prime found for n = " + str(n) + ", try a larger window")
+    best.update({"candidates": candidates, "sieved": sieved, "tested": tested})
+    return best
+
+
+# Estimate the cost of the parameter set that ParameterSet.search finds, to compare with search_primes
+def classic_cost(n, m=5):
+    l_primes = primes_first_n(n + 1)[1:]
+    p = 4 * prod(l_primes) - 1
+    while not is_prime(p):
+        l_primes[-1] = next_prime(l_primes[-1] + 1)
+        p = 4 * prod(l_primes) - 1
+    costs = [isogeny_cost(l, n) for l in l_primes]
+    return l_primes, expected_cost(l_primes, costs, log2(p + 1), m)
@@ -0,0 +1,197 @@
+from montgomery import curve_from_a, cswap, is_infinity, xMUL, elligator
+import counters
+
+# Chains of isogenies of degree 3 and 5 computed with radicals (Castryck, Decru, and Vercauteren)
+#
+# A curve with a point K of order l can be put in Tate normal form, with K at (0, 0):
+#   l = 3:  y^2 + a1 xy + a3 y = x^3
+#   l = 5:  y^2 + (1 - b) xy - by = x^3 - bx^2
+# The codomain of the l-isogeny with kernel <K> is again in this form, with coefficients that are rational functions
+# of an l-th root of a3 (l = 3) or of b (l = 5), and its point (0, 0) generates the kernel of the next step in the same
+# direction. So after one point of order l is sampled, each further step of a chain only costs one l-th root, which
+# is a single exponentiation since l divides p + 1 and so not p - 1, and no point sampling, cofactor multiplication,
+# or failed kernel point is needed. Converting back to Montgomery form costs a few more exponentiations per chain.
+# A rational point of order l gives the isogeny of the ideal (l, sqrt(-p) - 1), like the kernel points of positive
+# exponents in CSIDH.group_action; negative exponents take the chain on the quadratic twist, -A.
+#
+# Steps are computed on (a1, a3) for l = 3 and on b = bn/bd for l = 5, so that no step needs an inversion.
+
+degrees = (3, 5)                                    # Degrees that have radical formulas here
+# Smallest excess of an exponent (or a CSIDH_CT bound) over the rounds of the other primes at which radical="auto"
+# walks a chain of each degree: the operation counts of Tests/radical_benchmark.py for n = 10, 20, and 74 put the
+# crossover at about 1 for l = 3 and 2 to 3 for l = 5, where a chain still costs about as much as the rounds it saves
+margins = {3: 2, 5: 3}
+
+
+# Get the indices of the primes of l_primes that may be walked with radical isogenies, for the radical argument of
+# CSIDH and CSIDH_CT: "auto" for each of degrees in l_primes, None for none, or a list of degrees
+def radical_indices(l_primes, radical):
+    if radical is None:
+        return []
+    if radical != "auto":
+        for l in radical:
+            if l not in degrees or l not in l_primes:
+                raise ValueError("No radical isogenies of degree " + str(l) + " for this parameter set")
+    return [i for i, l in enumerate(l_primes) if l in degrees and (radical == "auto" or l in radical)]
+
+
+# Get the exponent that takes the unique l-th root of an element of F_p, for l dividing p + 1
+def root_exponent(l, p):
+    return pow(l, -1, p - 1)
+
+
+# Sample a point of order l on the Montgomery curve A, as an affine x-coordinate
+def sample_kernel(A, l, F):
+    p = F.p
+    curve = curve_from_a(F(A), p)
+    while True:
+        with counters.phase("sampling"):
+            P, _ = elligator(curve, F)
+        with counters.phase("cofactor"):
+            K = xMUL(P, (p + 1) // l, curve, p)
+        if not is_infinity(K, p):
+            if counters.active is not None:
+                counters.active.field(inv=1)
+            return K[0] * F.inverse(K[1]) % p
+        if counters.active is not None:
+            counters.active.event("kernel_skips")
+
+
+# Move the point (x, y) of the Montgomery curve A to (0, 0) and clear the coefficient of x, giving the coefficients
+# (a1, a2, a3) of y^2 + a1 xy + a3 y = x^3 + a2 x^2
+def tate_coefficients(A, x, F):
+    p = F.p
+    y = F.sqrt((x * x * x + A * x * x + x) % p)
+    a3 = 2 * y % p
+    lam = (3 * x * x + 2 * A * x + 1) * F.inverse(a3) % p
+    if counters.active is not None:
+        counters.active.field(mul=8, inv=1)
+        counters.active.power((p + 1) // 4)
+    return 2 * lam % p, (3 * x + A - lam * lam) % p, a3
+
+
+# Get the Tate normal form of the Montgomery curve A for the point of order l with x-coordinate x: (a1, a3) for l = 3
+# and (b, 1) for l = 5
+def to_tate(A, x, l, F):
+    p = F.p
+    a1, a2, a3 = tate_coefficients(A, x, F)
+    if l == 3:
+        return a1, a3
+    u = a3 * F.inverse(a2) % p
+    if counters.active is not None:
+        counters.active.field(mul=3, inv=2)
+    return -a2 * F.inverse(u * u) % p, 1
+
+
+# Get the Montgomery coefficient of y^2 + a1 xy + a3 y = x^3 + a2 x^2
+# Completing the square gives y^2 = x^3 + c2 x^2 + c1 x + c0, whose only root r in F_p is the point of order 2
+# (the curves of CSIDH have a single one), found with Cardano's formula: the square root it needs exists because the
+# discriminant is not a square, and cube roots in F_p are unique. Moving r to 0 gives y^2 = x^3 + Bx^2 + Cx, and
+# scaling x by the square root t of C that is itself a square gives A = B/t.
+def to_montgomery(a1, a2, a3, F):
+    p = F.p
+    inv2 = (p + 1) // 2
+    c2 = (a2 + a1 * a1 * inv2 * inv2) % p
+    c1 = a1 * a3 * inv2 % p
+    c0 = a3 * a3 * inv2 * inv2 % p
+    inv3 = F.inverse(3)
+    P = (c1 - c2 * c2 * inv3) % p
+    Q = (2 * c2 * c2 * c2 * inv3 * inv3 * inv3 - c2 * c1 * inv3 + c0) % p
+    s = F.sqrt((Q * Q * inv2 * inv2 + P * P * P * inv3 * inv3 * inv3) % p)
+    u = pow((-Q * inv2 + s) % p, root_exponent(3, p), p)
+    if u == 0:
+        u = pow((-Q * inv2 - s) % p, root_exponent(3, p), p)
+    r = (u - P * inv3 * F.inverse(u) - c2 * inv3) % p
+    B = (3 * r + c2) % p
+    t = F.sqrt((3 * r * r + 2 * c2 * r + c1) % p)
+    if F.legendre(t) != 1:
+        t = -t % p
+    if counters.active is not None:
+        counters.active.field(mul=30, inv=3)
+        counters.active.power((p + 1) // 4)
+        counters.active.power((p + 1) // 4)
+        counters.active.power(root_exponent(3, p))
+        counters.active.event("legendre")
+    return int(B * F.inverse(t) % p)
+
+
+# Take one step of a chain of 3-isogenies: the codomain of y^2 + a1 xy + a3 y = x^3 divided by <(0, 0)>, with
+# alpha = (-a3)^(1/3)
+def step_3(state, p, exponent):
+    a1, a3 = state
+    alpha = pow(-a3 % p, exponent, p)
+    if counters.active is not None:
+        counters.active.field(mul=4)
+        counters.active.power(exponent)
+    return (a1 - 6 * alpha) % p, (a1 * alpha * (3 * alpha - a1) + 9 * a3) % p
+
+
+# Take one step of a chain of 5-isogenies on b = bn/bd, with rho = b^(1/5) = r/bd for r = (bn bd^4)^(1/5):
+# b' = rho (rho^4 + 3 rho^3 + 4 rho^2 + 2 rho + 1)/(rho^4 - 2 rho^3 + 4 rho^2 - 3 rho + 1)
+def step_5(state, p, exponent):
+    bn, bd = state
+    d2 = bd * bd % p
+    r = pow(bn * d2 * d2 % p, exponent, p)
+    r2 = r * r % p
+    rd = r * bd % p
+    common = (r2 * r2 + 4 * r2 * d2 + d2 * d2) % p
+    numerator = (common + rd * (3 * r2 + 2 * d2)) % p
+    denominator = (common - rd * (2 * r2 + 3 * d2)) % p
+    if counters.active is not None:
+        counters.active.field(mul=14)
+        counters.active.power(exponent)
+    return r * numerator % p, bd * denominator % p
+
+
+_steps = {3: step_3, 5: step_5}
+
+
+# Get the Montgomery coefficient of a curve in Tate normal form for l
+def from_tate(state, l, F):
+    p = F.p
+    if l == 3:
+        return to_montgomery(state[0], 0, state[1], F)
+    b = state[0] * F.inverse(state[1]) % p
+    if counters.active is not None:
+        counters.active.field(mul=1, inv=1)
+    return to_montgomery(1 - b, -b, -b, F)
+
+
+# Apply e isogenies of degree l in the direction of the sign of e to the Montgomery curve A, returning the new A
+def radical_walk(A, l, e, F):
+    if e == 0:
+        return A
+    p = F.p
+    sign = 1 if e > 0 else -1
+    A = sign * A % p
+    exponent = root_exponent(l, p)
+    state = to_tate(A, sample_kernel(A, l, F), l, F)
+    step = _steps[l]
+    with counters.phase("isogenies"):
+        for _ in range(abs(e)):
+            state = step(state, p, exponent)
+            if counters.active is not None:
+                counters.active.isogeny(l)
+    return sign * from_tate(state, l, F) % p
+
+
+# Apply a chain of 3 or 5-isogenies of fixed length steps to the Montgomery curve A, of which only the first real
+# steps are kept, on the twist when twist is 1
+# Every step is computed and the key only decides, through cswap, which states are kept, so the sequence of field
+# operations does not depend on real or twist.
+def radical_walk_ct(A, l, steps, real, twist, F):
+    p = F.p
+    A, _ = cswap((A % p, 0), (-A % p, 0), twist, p)
+    A = A[0]
+    exponent = root_exponent(l, p)
+    state = to_tate(A, sample_kernel(A, l, F), l, F)
+    step = _steps[l]
+    with counters.phase("isogenies"):
+        for j in range(steps):
+            keep = int(j < real)
+            state, _ = cswap(state, step(state, p, exponent), keep, p)
+            if counters.active is not None:
+                counters.active.isogeny(l, real=bool(keep))
+    A = from_tate(state, l, F)
+    A, _ = cswap((A, 0), (-A % p, 0), twist, p)
+    return A[0]
@@ -0,0 +1,267 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque, Counter
+from time import perf_counter
+import asyncio
+import secrets
+import socket
+import stat
+import json
+import math
+import os
+
+# An asyncio key exchange service for one parameter set
+#
+# Clients connect over TCP or a Unix socket and send one JSON object per line; every request may carry an "id",
+# which is copied into its response, and requests on one connection are handled concurrently, so responses can
+# come back out of order:
+#   {"op": "keygen"}                                    -> {"key": handle, "public": A}
+#   {"op": "exchange", "key": handle, "public": B}      -> {"shared": S}
+#   {"op": "release", "key": handle}                    -> {}, forgetting the private key
+#   {"op": "stats"}                                     -> queue depth, counts, and latency percentiles
+# Private keys stay in the service and are only named by their handle. Group actions run in a pool of worker
+# processes that each build the implementation once, as in keypool.py, so the event loop never blocks on one.
+# At most max_keys private keys are kept, and keygen is refused with "key store full" until clients release some.
+# At most max_pending group actions are queued or running; further requests are refused at once with "busy" rather
+# than queued without bound. Every request has a deadline, by default the service's, in seconds ("deadline" in the
+# request); a request past its deadline gets an error, and its group action is cancelled if it has not started.
+# Every response has "ok", and "error" when it is false.
+
+_instance = None                                    # The implementation built in each worker process
+
+
+# Build the implementation once per worker process
+def _init_worker(Implementation, n):
+    global _instance
+    _instance = Implementation(n)
+
+
+# Generate one key pair in a worker process
+def _generate():
+    key = _instance.gen_key(5)
+    return {"private": key["private"], "public": int(key["public"])}
+
+
+# Apply the group action in a worker process; public keys that are not supersingular raise ValueError
+def _exchange(private, public):
+    return int(_instance.group_action({"public": public, "private": private}))
+
+
+# Get the p-th percentile of sorted values, or None if there are none
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+# Check whether a server accepts connections on the Unix socket at path
+def _listening(path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+class ExchangeService():
+    def __init__(self, Implementation, n, processes=None, max_pending=64, deadline=30.0, window=10000,
+                 max_keys=10000):
+        self.max_pending = max_pending              # Largest number of group actions queued or running
+        self.deadline = deadline                    # Default deadline of a request in seconds
+        self.pending = 0                            # Group actions queued or running
+        self.counts = Counter()                     # Requests by outcome
+        self.latencies = deque(maxlen=window)       # Seconds taken by the latest successful group actions
+        self.max_keys = max_keys                    # Largest number of private keys kept
+        self._keys = {}                             # Private keys by handle
+        self._servers = []
+        self._connections = set()                   # Tasks serving the open connections
+        self.processes = processes or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(self.processes, initializer=_init_worker, initargs=(Implementation, n))
+
+    # Listen on a TCP address
+    async def start_tcp(self, host="127.0.0.1", port=0):
+        server = await asyncio.start_server(self._serve, host, port)
+        self._servers.append(server)
+        return server.sockets[0].getsockname()
+
+    # Listen on a Unix socket, replacing a stale socket left at path but refusing to remove a live one or any other
+    # kind of file
+    async def start_unix(self, path):
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            mode = None
+        if mode is not None:
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError("Not a socket, refusing to replace it: " + path)
+            if _listening(path):
+                raise FileExistsError("Another server is listening on " + path)
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self._serve, path)
+        self._servers.append(server)
+        return path
+
+    # Stop listening, drop the open connections, and shut down the worker processes
+    async def close(self):
+        for server in self._servers:
+            server.close()
+        for task in self._connections:
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        for server in self._servers:
+            await server.wait_closed()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # Read requests from one connection and answer each one as soon as it is done
+    async def _serve(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+
+        async def answer(line):
+            response = await self.handle_line(line)
+            async with lock:
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(answer(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (ConnectionError, asyncio.CancelledError):
+            for task in tasks:
+                task.cancel()
+        finally:
+            self._connections.discard(connection)
+            writer.close()
+
+    # Answer one line of a connection
+    async def handle_line(self, line):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("A request must be a JSON object")
+        except ValueError as error:
+            self.counts["malformed"] += 1
+            return {"ok": False, "error": "malformed request: " + str(error)}
+        response = await self.handle(request)
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    # Answer one request
+    async def handle(self, request):
+        op = request.get("op")
+        if op == "stats":
+            return {"ok": True, **self.stats()}
+        if op == "keygen":
+            if len(self._keys) >= self.max_keys:
+                self.counts["full"] += 1
+                return {"ok": False, "error": "key store full"}
+            return await self._run(request, _generate)
+        if op == "release":
+            if self._keys.pop(request.get("key"), None) is None:
+                self.counts["unknown_key"] += 1
+                return {"ok": False, "error": "unknown key handle"}
+            self.counts["released"] += 1
+            return {"ok": True}
+        if op == "exchange":
+            private = self._keys.get(request.get("key"))
+            if private is None:
+                self.counts["unknown_key"] += 1
+                return {"ok": False, "error": "unknown key handle"}
+            try:
+                public = int(request["public"])
+            except (KeyError, TypeError, ValueError):
+                self.counts["malformed"] += 1
+                return {"ok": False, "error": "missing or invalid public key"}
+            return await self._run(request, _exchange, private, public)
+        self.counts["malformed"] += 1
+        return {"ok": False, "error": "unknown op: " + str(op)}
+
+    # Run a group action in the worker pool within the deadline of the request
+    # A group action that outlives its deadline keeps its place in pending until the worker is done with it, so that
+    # requests that time out cannot pile up work behind the limit.
+    async def _run(self, request, f, *args):
+        try:
+            deadline = float(request.get("deadline", self.deadline))
+        except (TypeError, ValueError):
+            self.counts["malformed"] += 1
+            return {"ok": False, "error": "invalid deadline"}
+        if self.pending >= self.max_pending:
+            self.counts["busy"] += 1
+            return {"ok": False, "error": "busy"}
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        start = perf_counter()
+        future = self._executor.submit(f, *args)
+        future.add_done_callback(lambda _: self._finished(loop))
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), deadline)
+        except asyncio.TimeoutError:
+            future.cancel()
+            self.counts["deadline"] += 1
+            return {"ok": False, "error": "deadline exceeded"}
+        except ValueError as error:
+            self.counts["rejected"] += 1
+            return {"ok": False, "error": str(error)}
+        except Exception as error:
+            self.counts["failed"] += 1
+            return {"ok": False, "error": "internal error: " + repr(error)}
+
+        elapsed = perf_counter() - start
+        self.latencies.append(elapsed)
+        self.counts["ok"] += 1
+        if f is _generate:
+            # Keys generated concurrently can fill the store after the check in handle
+            if len(self._keys) >= self.max_keys:
+                self.counts["full"] += 1
+                return {"ok": False, "error": "key store full"}
+            handle = secrets.token_hex(16)
+            self._keys[handle] = result["private"]
+            return {"ok": True, "key": handle, "public": result["public"], "latency": elapsed}
+        return {"ok": True, "shared": result, "latency": elapsed}
+
+    # Free the place of a finished group action, from the thread that completes the future
+    def _finished(self, loop):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            pass
+
+    def _release(self):
+        self.pending -= 1
+
+    # Report the queue depth, the requests by outcome, and percentiles of the latest latencies in seconds
+    def stats(self):
+        ordered = sorted(self.latencies)
+        return {
+            "pending": self.pending,
+            "queued": max(self.pending - self.processes, 0),
+            "max_pending": self.max_pending,
+            "processes": self.processes,
+            "keys": len(self._keys),
+            "max_keys": self.max_keys,
+            "counts": dict(self.counts),
+            "latency": {"p50": percentile(ordered, 50), "p90": percentile(ordered, 90), "p99": percentile(ordered, 99),
+                        "samples": len(ordered)},
+        }
+
+
+# Run a service until it is interrupted
+async def serve(Implementation, n, host="127.0.0.1", port=8765, unix=None, **options):
+    service = ExchangeService(Implementation, n, **options)
+    address = await service.start_unix(unix) if unix else await service.start_tcp(host, port)
+    print("Serving " + Implementation.__name__ + " with n = " + str(n) + " on " + str(address))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.close()
+
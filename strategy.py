@@ -0,0 +1,75 @@
+from montgomery import is_infinity, xMUL, xMUL_dac
+import counters
+
+# Strategies for computing the kernel points of a round of isogenies
+#
+# In a round, a point T has order dividing the product of the primes l_i for i in S, and each isogeny needs
+# the kernel point [prod of the other primes]T. Recomputing each kernel point from T costs O(|S|^2)
+# scalar multiplications by small primes. A strategy instead splits S into a left and a right part: the
+# left part is handled recursively from [prod of the right primes]T while T itself is pushed through the
+# left isogenies, and the right part is then handled from the image of T. With a good split this costs
+# O(|S| log |S|) multiplications and point evaluations.
+#
+# As in SIDH, the best split only depends on the number of leaves once every prime is given the same
+# average multiplication and evaluation cost, so one table covers every round of every action for a
+# parameter set.
+
+
+# Estimate the cost in field multiplications of multiplying a point by a prime and of pushing a point
+# through an isogeny, averaged over the primes of a parameter set
+def strategy_costs(l_primes):
+    mul_cost = 10 * sum(l.bit_length() for l in l_primes) / len(l_primes)
+    eval_cost = 2 * sum(l - 1 for l in l_primes) / len(l_primes)
+    return mul_cost, eval_cost
+
+
+# Compute optimal splits for every number of leaves up to n (the dynamic programme of Jao, De Feo and Plut)
+# splits[k] is the number of leaves in the left part of the optimal strategy with k leaves
+def optimal_strategies(n, mul_cost, eval_cost):
+    costs = [0, 0]
+    splits = [0, 0]
+    for k in range(2, n + 1):
+        best = None
+        for i in range(1, k):
+            cost = costs[i] + costs[k - i] + (k - i) * mul_cost + i * eval_cost
+            if best is None or cost < best:
+                best = cost
+                split = i
+        costs.append(best)
+        splits.append(split)
+    return splits
+
+
+# Walk a strategy over the indices in S, starting from the points in T whose orders divide the product of their primes
+# The points in T are multiplied and carried together, so a strategy can follow a point on the curve and a point on
+# the twist at once. At each leaf, leaf(curve, i, K, points) is called with the kernel points K for degree
+# l_primes[i] and the list of points that still need to be carried through the round, and returns the new curve
+# and the new carried points. If every point of a subtree is the point at infinity, none of its primes can be
+# handled this round and it is skipped. With the differential addition chain of each prime in chains, the points are
+# multiplied one prime at a time with xMUL_dac instead of by the product with the ladder. Returns the final curve and
+# the carried points.
+def strategy_walk(curve, T, S, points, splits, l_primes, p, leaf, chains=None):
+    if all(is_infinity(P, p) for P in T):
+        if counters.active is not None:
+            counters.active.event("kernel_skips", len(S))
+        return curve, points
+    if len(S) == 1:
+        return leaf(curve, S[0], T, points)
+
+    # Handle the left primes from [prod of the right primes]T, carrying T along
+    i = splits[len(S)]
+    left, right = S[:i], S[i:]
+    if chains is None:
+        k = 1
+        for j in right:
+            k *= l_primes[j]
+        T_left = tuple(xMUL(P, k, curve, p) for P in T)
+    else:
+        T_left = T
+        for j in right:
+            T_left = tuple(xMUL_dac(P, l_primes[j], chains[j], curve, p) for P in T_left)
+    curve, points = strategy_walk(curve, T_left, left, list(T) + points, splits, l_primes, p, leaf, chains)
+
+    # The images of T now have orders dividing the product of the right primes
+    w = len(T)
+    return strategy_walk(curve, tuple(points[:w]), right, points[w:], splits, l_primes, p, leaf, chains)
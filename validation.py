@@ -0,0 +1,58 @@
+from montgomery import curve_from_a, is_infinity, xMUL, random_x
+
+# Public key validation: checking that y^2 = x^3 + Ax^2 + x is supersingular
+#
+# A supersingular curve over F_p has p + 1 = 4 * prod(l_primes) points, and so does its twist, so every point
+# has order dividing p + 1. Conversely, a point whose order divides p + 1 and exceeds 4 sqrt(p) can only exist
+# on a supersingular curve, since the Hasse interval then contains a single multiple of the order. The order
+# of [4]P is found one prime at a time with a product tree: each half of the primes is handled from the point
+# multiplied by the primes of the other half, so the n points [(p + 1) / l]P cost O(n log n) multiplications
+# by small primes instead of n full ladders (Castryck, Lange, Martindale, Panny and Renes; Doliskani).
+
+
+# Find the product of the primes l_primes[i] for i in S that divide the order of Q, whose order divides their product
+# Returns None if some [(p + 1) / l]P is not killed by l, which proves the curve is ordinary. Stops early once the
+# product found so far squared exceeds bound.
+def tree_order(curve, Q, S, l_primes, p, d, bound):
+    if is_infinity(Q, p) or d * d > bound:
+        return d
+    if len(S) == 1:
+        l = l_primes[S[0]]
+        if not is_infinity(xMUL(Q, l, curve, p), p):
+            return None
+        return d * l
+
+    # Handle each half from Q multiplied by the primes of the other half
+    middle = len(S) // 2
+    left, right = S[:middle], S[middle:]
+    k_left = 1
+    for i in left:
+        k_left *= l_primes[i]
+    k_right = 1
+    for i in right:
+        k_right *= l_primes[i]
+    d = tree_order(curve, xMUL(Q, k_right, curve, p), left, l_primes, p, d, bound)
+    if d is None:
+        return None
+    return tree_order(curve, xMUL(Q, k_left, curve, p), right, l_primes, p, d, bound)
+
+
+# Check whether y^2 = x^3 + Ax^2 + x over the field F is a supersingular curve for the primes l_primes
+# Each attempt takes a random point and either proves the curve ordinary, proves it supersingular, or (rarely, when
+# the point's order is too small) is inconclusive; after attempts inconclusive tries the curve is rejected.
+def is_supersingular(A, F, l_primes, attempts=32):
+    p = F.p
+    A = int(A)
+    if not 0 <= A < p or A == 2 or A == p - 2:
+        return False
+    curve = curve_from_a(F(A), p)
+    bound = 16 * p
+    S = list(range(len(l_primes)))
+    for _ in range(attempts):
+        Q = xMUL((F(random_x(p)), 1), 4, curve, p)
+        d = tree_order(curve, Q, S, l_primes, p, 1, bound)
+        if d is None:
+            return False
+        if d * d > bound:
+            return True
+    return False
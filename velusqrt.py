@@ -0,0 +1,220 @@
+from math import isqrt
+
+from montgomery import xDBL, xADD, xMUL
+import counters
+
+# Square-root Velu isogenies for Montgomery curves (Bernstein, De Feo, Leroux and Smith)
+#
+# For a kernel point K of odd prime order l, the classic formulas in montgomery.py walk over all
+# (l - 1) / 2 multiples of K. Here the odd multiples {1, 3, ..., l - 2} are split into I +- J and a
+# small remainder set, and the products over I +- J are computed as resultants of the polynomial with
+# roots x([i]K) for i in I against a product of biquadratic polynomials over J, which needs only about
+# sqrt(l) points. Polynomials are lists of coefficients mod p with the lowest degree first.
+
+KARATSUBA_CUTOFF = 8                                # Below this length polynomials are multiplied directly
+
+
+# Multiply two polynomials, using Karatsuba's method for long inputs
+def poly_mul(f, g, p):
+    if len(f) < len(g):
+        f, g = g, f
+    if len(g) == 0:
+        return []
+    if len(g) < KARATSUBA_CUTOFF:
+        if counters.active is not None:
+            counters.active.field(mul=len(f) * len(g))
+        h = [0] * (len(f) + len(g) - 1)
+        for i, c in enumerate(g):
+            if c:
+                for j, d in enumerate(f):
+                    h[i + j] += c * d
+        return [c % p for c in h]
+
+    # Split both polynomials at m and recombine the three half-size products
+    m = len(f) // 2
+    f0, f1 = f[:m], f[m:]
+    if len(g) <= m:
+        low = poly_mul(f0, g, p)
+        high = poly_mul(f1, g, p)
+        h = low + [0] * (len(f) + len(g) - 1 - len(low))
+        for i, c in enumerate(high):
+            h[m + i] += c
+        return [c % p for c in h]
+    g0, g1 = g[:m], g[m:]
+    z0 = poly_mul(f0, g0, p)
+    z2 = poly_mul(f1, g1, p)
+    z1 = poly_mul(poly_add(f0, f1), poly_add(g0, g1), p)
+    h = [0] * (len(f) + len(g) - 1)
+    for i, c in enumerate(z0):
+        h[i] += c
+        h[m + i] -= c
+    for i, c in enumerate(z2):
+        h[2 * m + i] += c
+        h[m + i] -= c
+    for i, c in enumerate(z1):
+        h[m + i] += c
+    return [c % p for c in h]
+
+
+# Add two polynomials without reducing the coefficients
+def poly_add(f, g):
+    if len(f) < len(g):
+        f, g = g, f
+    return [c + g[i] if i < len(g) else c for i, c in enumerate(f)]
+
+
+# Reduce f modulo a monic polynomial g by long division
+def poly_rem(f, g, p):
+    m = len(g) - 1
+    r = list(f)
+    if counters.active is not None:
+        counters.active.field(mul=max(len(r) - m, 0) * m)
+    for k in range(len(r) - 1, m - 1, -1):
+        c = r[k] % p
+        if c:
+            for t in range(m):
+                r[k - m + t] -= c * g[t]
+    return [c % p for c in r[:m]]
+
+
+# Multiply a list of polynomials together with a balanced product tree, returning every level of the tree
+def product_tree(leaves, p):
+    tree = [leaves]
+    while len(tree[-1]) > 1:
+        level = tree[-1]
+        tree.append([poly_mul(level[i], level[i + 1], p) if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)])
+    return tree
+
+
+# Compute the resultant of the product tree's root (monic, with known roots) against f as the product of f at the roots
+def tree_resultant(tree, f, p):
+    remainders = [poly_rem(f, tree[-1][0], p)]
+    for level in reversed(tree[:-1]):
+        remainders = [poly_rem(remainders[i // 2], g, p) for i, g in enumerate(level)]
+    if counters.active is not None:
+        counters.active.field(mul=len(remainders))
+    result = 1
+    for r in remainders:
+        result = result * (r[0] if r else 0) % p
+    return result
+
+
+# Invert a list of non-zero field elements with a single inversion (Montgomery's trick)
+def batch_invert(values, p):
+    if counters.active is not None:
+        counters.active.field(mul=3 * len(values), inv=1)
+    prefix = [1]
+    for v in values:
+        prefix.append(prefix[-1] * v % p)
+    inv = pow(prefix[-1], -1, p)
+    result = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        result[i] = prefix[i] * inv % p
+        inv = inv * values[i] % p
+    return result
+
+
+# Split the odd multiples 1, 3, ..., l - 2 into the index sets I, J and K
+def sqrt_velu_sizes(l):
+    b = isqrt(l - 1) // 2
+    b_prime = (l - 1) // (4 * b)
+    return b, b_prime
+
+
+# Precompute everything about the kernel that does not depend on the points being evaluated
+def sqrt_velu_kernel(curve, K, l, p):
+    a, d = curve
+    b, b_prime = sqrt_velu_sizes(l)
+    K2 = xDBL(K, curve, p)
+
+    # J = {1, 3, ..., 2b - 1}
+    J = [K]
+    if b > 1:
+        J.append(xADD(K2, K, K, p))
+    while len(J) < b:
+        J.append(xADD(J[-1], K2, J[-2], p))
+
+    # I = {2b, 6b, 10b, ...}, stepping by [4b]K
+    I = [xMUL(K, 2 * b, curve, p)]
+    K4b = xDBL(I[0], curve, p)
+    if b_prime > 1:
+        I.append(xADD(K4b, I[0], I[0], p))
+    while len(I) < b_prime:
+        I.append(xADD(I[-1], K4b, I[-2], p))
+
+    # K = {4bb' + 1, ..., l - 2}, the multiples not covered by I +- J
+    rest = []
+    start = 4 * b * b_prime + 1
+    if start <= l - 2:
+        previous = xMUL(K, start - 2, curve, p)
+        rest.append(xMUL(K, start, curve, p))
+        for _ in range(start + 2, l - 1, 2):
+            rest.append(xADD(rest[-1], K2, previous, p))
+            previous = rest[-2]
+
+    # The polynomial with roots x([i]K) for i in I, as a product tree for the resultants
+    roots = [X * z % p for (X, _), z in zip(I, batch_invert([Z for _, Z in I], p))]
+    tree = product_tree([[-x % p, 1] for x in roots], p)
+
+    # Coefficients of the biquadratic polynomials for each j in J, scaled by (a - d) * Zj^2
+    c = a - d
+    if counters.active is not None:
+        counters.active.field(mul=len(I) + 4 * len(J), sqr=2 * len(J))
+    biquadratics = []
+    for Xj, Zj in J:
+        XZ = Xj * Zj % p
+        biquadratics.append((Xj, Zj, c * XZ % p, (c * (Xj * Xj + Zj * Zj) + 4 * (a + d) * XZ) % p))
+    return tree, biquadratics, rest, c
+
+
+# Compute the product over I +- J and K that stands in for prod (alpha - x([s]K)) at alpha = X/Z, and its reversal
+def sqrt_velu_products(kernel, P, p, reverse=True):
+    tree, biquadratics, rest, c = kernel
+    X, Z = P
+    XZ = X * Z % p
+    XXZZ = (X * X + Z * Z) % p
+    if counters.active is not None:
+        counters.active.field(mul=1 + 8 * len(biquadratics) + 3 * len(rest) * (2 if reverse else 1),
+                              sqr=2 + 2 * len(biquadratics))
+
+    # E_J(W) = prod_j (F0(W, xj) alpha^2 + F1(W, xj) alpha + F2(W, xj)); the reversed polynomial gives alpha = Z/X
+    factors = []
+    for Xj, Zj, u, v in biquadratics:
+        factors.append([c * (X * Xj - Z * Zj) ** 2 % p, -2 * (u * XXZZ + v * XZ) % p, c * (X * Zj - Z * Xj) ** 2 % p])
+    E = product_tree(factors, p)[-1][0]
+    H = tree_resultant(tree, E, p)
+    for Xk, Zk in rest:
+        H = H * (X * Zk - Z * Xk) % p
+    if not reverse:
+        return H, None
+    H_rev = tree_resultant(tree, E[::-1], p)
+    for Xk, Zk in rest:
+        H_rev = H_rev * (Z * Zk - X * Xk) % p
+    return H, H_rev
+
+
+# Compute the codomain of the degree l isogeny with the precomputed kernel
+def sqrt_velu_codomain(kernel, l, curve, p):
+    a, d = curve
+    H_plus, _ = sqrt_velu_products(kernel, (1, 1), p, reverse=False)
+    H_minus, _ = sqrt_velu_products(kernel, (-1, 1), p, reverse=False)
+    if counters.active is not None:
+        counters.active.field(mul=2, sqr=6)
+        counters.active.power(l)
+        counters.active.power(l)
+    return pow(a, l, p) * pow(H_minus, 8, p) % p, pow(d, l, p) * pow(H_plus, 8, p) % p
+
+
+# Push a point through the degree l isogeny with the precomputed kernel
+def sqrt_velu_evaluate(kernel, P, p):
+    H, H_rev = sqrt_velu_products(kernel, P, p)
+    if counters.active is not None:
+        counters.active.field(mul=4)
+    return P[0] * H_rev * H_rev % p, P[1] * H * H % p
+
+
+# Compute the odd degree l isogeny with kernel generated by K, returning the codomain and the images of points
+def xISOG_sqrt(curve, K, l, points, p):
+    kernel = sqrt_velu_kernel(curve, K, l, p)
+    codomain = sqrt_velu_codomain(kernel, l, curve, p)
+    return codomain, [sqrt_velu_evaluate(kernel, P, p) for P in points]